@@ -0,0 +1,304 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# bench.py
+# benchmarks of the hot paths of the tools, on fixed synthetic inputs
+# (seeded: same inputs on each run), offline (no network, no Tk display)
+#
+#   tracker : calcDistm/calcDistKm, one tracking cycle (parseData, fed by
+#             synthfeed.py), savePilotTable/loadPilotTable, pilotOrdering,
+#             makeSnapshot (a tenth of the pilots changed)
+#   extractCFD: parse of the CFD xml data (sortData), csvOutput, htmlOutput
+#
+# results in a JSON file, compared with a baseline: timings of another
+# machine mean nothing, make your own baseline first (-save)
+#      bench.py [-o bench.json] [-baseline bench.baseline.json]
+#               [-threshold 0.5] [-quick] [-only NAME] [-save]
+#   -threshold: slowdown ratio (best runs) over which a benchmark is a
+#               regression, widened by the noise of the benchmark (spread
+#               median/best of its runs, in the baseline or now)
+#   -quick    : small sizes only
+#   -only     : benchmarks whose name starts with NAME
+#   -save     : the results become the baseline
+# exit code 2 if a regression is found
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import io
+import gc
+import json
+import time
+import random
+import tempfile
+import platform
+import contextlib
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'tracker'))
+sys.path.insert(0, HERE)
+
+SIZES      = [100, 1000, 5000]          # pilots in the feed
+CFDSIZES   = [1000, 10000, 100000]      # flights in the CFD data
+QUICK      = ([100, 1000], [1000, 10000])
+CYCLES     = 30                         # tracking cycles (one per minute)
+THRESHOLD  = 0.5                        # +50%: regression (disk timings vary)
+MINDELTA   = 20e-6                      # differences below 20us are noise
+MINRUN     = 0.2                        # seconds per timed run, at least
+REPEATIO   = 11                         # runs of the disk and parse bound ones
+SEED       = 1
+
+
+# ------------------------------------------------------------------------------
+# timing utilities
+# ------------------------------------------------------------------------------
+# seconds per call of fn, for each of the repeat runs of number calls
+# (number None: enough calls for a run of at least MINRUN), garbage
+# collector off during the runs (as the timeit module)
+def timeit(fn, number=None, repeat=7):
+    if number is None:
+        number = 1
+        while True:
+            t0 = time.perf_counter()
+            for i in range(number): fn()
+            if time.perf_counter()-t0 >= MINRUN: break
+            number *= 2
+    times = []
+    for r in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            for i in range(number): fn()
+            times.append((time.perf_counter()-t0) / number)
+        finally:
+            gc.enable()
+    return(times)
+
+# entry of the results: seconds per call, best run (compared) and median
+def entry(times, **info):
+    s = sorted(times)
+    res = {'best': s[0], 'median': s[len(s)//2], 'runs': len(s)}
+    res.update(info)
+    return(res)
+
+
+# ------------------------------------------------------------------------------
+# distance functions (seconds per call)
+# ------------------------------------------------------------------------------
+def benchDist(results):
+
+    import engine
+    rnd = random.Random(SEED)
+    pairs = [(45 + rnd.uniform(-1, 1), 6 + rnd.uniform(-1, 1), rnd.uniform(0, 3000), \
+              45 + rnd.uniform(-1, 1), 6 + rnd.uniform(-1, 1), rnd.uniform(0, 3000)) for i in range(10000)]
+
+    def distm():
+        for (a, b, c, d, e, f) in pairs: engine.calcDistm(a, b, c, d, e, f)
+    def distkm():
+        for (a, b, c, d, e, f) in pairs: engine.calcDistKm(a, b, d, e)
+
+    results['calcDistm'] = entry([t/len(pairs) for t in timeit(distm, 1, 7)], calls=len(pairs))
+    results['calcDistKm'] = entry([t/len(pairs) for t in timeit(distkm, 1, 7)], calls=len(pairs))
+
+
+# ------------------------------------------------------------------------------
+# engine in a temporary HOME, no filter (all the pilots of the feed are
+# tracked), alert decisions kept in memory (see replay.py)
+# ------------------------------------------------------------------------------
+def startEngine():
+
+    os.environ['HOME'] = tempfile.mkdtemp(prefix='tracker-bench-')
+    import engine
+    import logs
+    import replay
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.initEngine()
+    logs.setup(engine.FILES['log'], level='WARNING', console=0)
+    engine.config['parameters']['Filtrage']['value'] = 'Aucun'
+    engine.startSession()
+    engine.Alerts.stop()
+    engine.Alerts = replay.DecisionLog()
+    return(engine)
+
+# ------------------------------------------------------------------------------
+# one tracking cycle (mean seconds per cycle), then the pilot table
+# ------------------------------------------------------------------------------
+def benchTracker(results, sizes, only):
+
+    import ingest
+    import replay
+    import synthfeed
+    engine = startEngine()
+    spots = [(float(sp['Latitude']), float(sp['Longitude']), float(sp.get('Altitude') or 0)) \
+        for sp in engine.config['spots'].values() if sp.get('Latitude') not in (None, '')]
+
+    for n in sizes:
+        feed = []
+        for (t, records) in synthfeed.cycles(n, spots, CYCLES*60, 60, SEED):
+            fixes = [f for f in map(ingest.makeFix, records) if f is not None]
+            feed.append((t, fixes))
+        # whole feed replayed from an empty table, several times
+        runs = []
+        for r in range(3):
+            engine.resetPilotStatus()
+            clock = replay.ReplayClock(feed[0][0])
+            engine.Clock = clock
+            t0 = time.perf_counter()
+            for (t, fixes) in feed:
+                clock.set(t)
+                with engine.stateLock:
+                    engine.parseGroups(engine.dispatchFixes(fixes))
+            runs.append((time.perf_counter()-t0) / len(feed))
+        nlogs = sum(len(fixes) for (t, fixes) in feed)
+        npilots = len(engine.PilotsStatus)
+        if match('parseData', only):
+            results['parseData/%d' % n] = entry(runs, pilots=npilots, logs=nlogs, cycles=len(feed))
+
+        with engine.stateLock:
+            changed = set(list(engine.PilotsStatus)[:max(1, npilots//10)])
+            if match('savePilotTable', only):
+                results['savePilotTable/%d' % n] = entry(timeit(engine.savePilotTable, repeat=REPEATIO), \
+                    pilots=npilots)
+                results['savePilotTable.changed/%d' % n] = entry( \
+                    timeit(lambda: engine.savePilotTable(changed), repeat=REPEATIO), \
+                    pilots=npilots, changed=len(changed))
+            if match('loadPilotTable', only):
+                results['loadPilotTable/%d' % n] = entry(timeit(engine.loadPilotTable, repeat=REPEATIO), \
+                    pilots=npilots)
+            if match('pilotOrdering', only):
+                results['pilotOrdering/%d' % n] = entry(timeit(engine.pilotOrdering), pilots=npilots)
+            if match('makeSnapshot', only):
+                # steady state: a tenth of the pilots changed since the last snapshot
+                engine.makeSnapshot()
+                def snapshot():
+                    engine.markDirty(changed)
+                    engine.makeSnapshot()
+                results['makeSnapshot/%d' % n] = entry(timeit(snapshot), pilots=npilots, changed=len(changed))
+    engine.Clock = time.time
+
+
+# ------------------------------------------------------------------------------
+# CFD data as returned by the FFVL site (?xml=1): n flights over two seasons
+# ------------------------------------------------------------------------------
+def cfdXml(n, season):
+
+    rnd = random.Random(SEED)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<cfd><vols><liste>']
+    for i in range(n):
+        year = season - rnd.randint(0, 1)
+        date = "%d-%02d-%02d" % (year, rnd.randint(1, 12), rnd.randint(1, 28))
+        lines.append('<vol id="%d" date="%s" pilote="pilote %d" distance="%.2f" points="%.2f"/>' % \
+            (i, date, rnd.randint(1, 2000), rnd.expovariate(1/35), rnd.expovariate(1/50)))
+    lines.append('</liste></vols></cfd>')
+    return("\n".join(lines))
+
+def benchCFD(results, sizes, only):
+
+    import extractCFD
+    tmp = tempfile.mkdtemp(prefix='cfd-bench-')
+    (extractCFD.deco, extractCFD.deconame) = (extractCFD.DECOLIST[10], extractCFD.DECONAMES[10])
+    (extractCFD.season, extractCFD.minkm, extractCFD.minfl) = (2023, '30', 1)
+    extractCFD.outfile = os.path.join(tmp, 'cfd')
+
+    for n in sizes:
+        data = cfdXml(n, extractCFD.season)
+        def parse():
+            extractCFD.dateTab = {}
+            extractCFD.sortData(data)
+        if match('sortData', only):
+            results['sortData/%d' % n] = entry(timeit(parse, repeat=REPEATIO), flights=n)
+        parse()
+        ndays = len(extractCFD.dateTab)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if match('csvOutput', only):
+                results['csvOutput/%d' % n] = entry(timeit(extractCFD.csvOutput, repeat=REPEATIO), days=ndays)
+            if match('htmlOutput', only):
+                results['htmlOutput/%d' % n] = entry(timeit(extractCFD.htmlOutput, repeat=REPEATIO), days=ndays)
+
+
+# ------------------------------------------------------------------------------
+# comparison with the baseline
+# returns (text lines, number of regressions)
+# ------------------------------------------------------------------------------
+def compare(base, new, threshold):
+
+    lines = []
+    nreg = 0
+    for name in new:
+        cur = new[name]['best']
+        if name not in base:
+            lines.append("%-28s %10.1fus   (not in baseline)" % (name, cur*1e6))
+            continue
+        ref = base[name]['best']
+        ratio = cur/ref if ref else 1
+        # noise of this benchmark: spread of its runs, in both results
+        noise = max(base[name]['median']/ref if ref else 1, new[name]['median']/cur if cur else 1)
+        limit = (1+threshold) * noise
+        status = 'ok'
+        if ratio > limit and cur-ref > MINDELTA:
+            status = 'REGRESSION'
+            nreg += 1
+        elif ratio < 1/limit and ref-cur > MINDELTA:
+            status = 'faster'
+        lines.append("%-28s %10.1fus %10.1fus  x%5.2f  %s" % (name, ref*1e6, cur*1e6, ratio, status))
+    return((lines, nreg))
+
+def match(name, only):
+    return(only is None or name.startswith(only) or only.startswith(name))
+
+def run(quick=False, only=None):
+
+    (sizes, cfdsizes) = QUICK if quick else (SIZES, CFDSIZES)
+    results = {}
+    if match('calcDist', only): benchDist(results)
+    if any(match(b, only) for b in ('parseData', 'savePilotTable', 'loadPilotTable', 'pilotOrdering', \
+            'makeSnapshot')):
+        benchTracker(results, sizes, only)
+    if any(match(b, only) for b in ('sortData', 'csvOutput', 'htmlOutput')):
+        benchCFD(results, cfdsizes, only)
+    if only is not None:
+        results = {k: v for (k, v) in results.items() if k.startswith(only)}
+    meta = {'date': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'machine': platform.machine(), 'node': platform.node(), 'quick': quick}
+    return({'meta': meta, 'results': results})
+
+
+# ------------------------------------------------------------------------------
+# -----------------------------
+#   MAIN PROGRAM
+# -----------------------------
+# ------------------------------------------------------------------------------
+def option(name, default=None):
+    if name in sys.argv:
+        return(sys.argv[sys.argv.index(name)+1])
+    return(default)
+
+if __name__ == '__main__':
+    out = option('-o', 'bench.json')
+    basefile = option('-baseline', os.path.join(HERE, 'bench.baseline.json'))
+    threshold = float(option('-threshold', str(THRESHOLD)))
+    res = run('-quick' in sys.argv, option('-only'))
+    with open(out, 'w') as out_file:
+        json.dump(res, out_file, indent=1)
+    print("%d benchmarks, results in %s" % (len(res['results']), out))
+    if '-save' in sys.argv:
+        with open(basefile, 'w') as out_file:
+            json.dump(res, out_file, indent=1)
+        print("baseline saved in " + basefile)
+        exit(0)
+    base = {}
+    if os.path.isfile(basefile):
+        with open(basefile, 'r') as in_file:
+            base = json.load(in_file)['results']
+        print("%-28s %12s %12s  ratio   (baseline %s)" % ('', 'baseline', 'now', basefile))
+    (lines, nreg) = compare(base, res['results'], threshold)
+    for l in lines: print(l)
+    if nreg:
+        print("%d regression(s) over +%d%% (and the noise of the benchmark)" % (nreg, threshold*100))
+        exit(2)
@@ -19,7 +19,6 @@ import sys
 import os
 import time
 import re
-from requests_html import HTMLSession
 import xml.etree.ElementTree as ET
 import csv
 
@@ -166,8 +165,15 @@ def getCFDat(year,site):
 # ------------------------------------------------------------------------------
 def getAndSortData(year):
     
-    global dateTab
     htmlContent = getCFDat(year,deco)
+    sortData(htmlContent)
+
+# ------------------------------------------------------------------------------
+# count the flights of each day in xml data (no network, see bench.py)
+# ------------------------------------------------------------------------------
+def sortData(htmlContent):
+    
+    global dateTab
     tree = ET.fromstring(htmlContent)
     # sort data
     # -----------------------------
@@ -275,40 +281,42 @@ def htmlOutput():
 #   MAIN PROGRAM
 # -----------------------------
 # ------------------------------------------------------------------------------
-readArgs()
+if __name__ == '__main__':
+    readArgs()
 
-# get data
-# -----------------------------
-session = HTMLSession()
-dateTab={}
-# we need to parse 2 CFD seasons to gather a civil year
-getAndSortData(season-1)
-getAndSortData(season)
-
-if csv:
-    csvOutput()
-
-
-if (html or pdf):
-    html_content=htmlOutput()
-    if html:
-        f = open(outfile+'.html', 'w', newline='')
-        print(html_content, file=f)
-        f.close
-        print("HTML file generated") 
+    # get data
+    # -----------------------------
+    from requests_html import HTMLSession
+    session = HTMLSession()
+    dateTab={}
+    # we need to parse 2 CFD seasons to gather a civil year
+    getAndSortData(season-1)
+    getAndSortData(season)
+
+    if csv:
+        csvOutput()
+
+
+    if (html or pdf):
+        html_content=htmlOutput()
+        if html:
+            f = open(outfile+'.html', 'w', newline='')
+            print(html_content, file=f)
+            f.close
+            print("HTML file generated") 
     
-    if pdf:
-        pdf_file = outfile + '.pdf'
-        try:
-            from xhtml2pdf import pisa
-        except ModuleNotFoundError:
-            print("You need to install an extra lib with: pip3 install xhtml2pdf")
-            exit(0)
+        if pdf:
+            pdf_file = outfile + '.pdf'
+            try:
+                from xhtml2pdf import pisa
+            except ModuleNotFoundError:
+                print("You need to install an extra lib with: pip3 install xhtml2pdf")
+                exit(0)
             
-        # Generate PDF
-        with open(pdf_file, "wb") as f:
-            pisa_status = pisa.CreatePDF(html_content, dest=f)
-            print("PDF file generated") 
+            # Generate PDF
+            with open(pdf_file, "wb") as f:
+                pisa_status = pisa.CreatePDF(html_content, dest=f)
+                print("PDF file generated") 
 
          
 # ------------------------------------------------------------------------------
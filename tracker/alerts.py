@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# alerts.py
+# alert dispatch of the tracker
+#
+# The tracking cycle gives the pilots in alarm (submit) and goes on:
+# messages are delivered by a pool of worker threads.
+#   - deduplication per (group, pilot, channel): an alarm is sent at once,
+#     then repeated after the escalation intervals (the last one repeats)
+#     while the pilot is not cleared; a pilot cleared and in alarm again
+#     is sent at once
+#   - one message per channel and cycle, naming all the pilots due
+#   - global rate limit (token bucket) over all the sends
+#   - retries with exponential backoff when a sender fails
+#
+# senders: { channel: function(message, recipients) }, raising on failure
+#          (DeliveryError: only its recipients are retried)
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import time
+import queue
+import random
+import threading
+
+
+# some recipients were not reached
+class DeliveryError(Exception):
+    def __init__(self, failed, mess=''):
+        Exception.__init__(self, mess or "failed for " + " ".join(failed))
+        self.failed = list(failed)
+
+
+class Dispatcher:
+    def __init__(self, senders, workers=2, rateMax=10, ratePeriod=60, retries=3, backoff=2.0, log=print):
+        self.senders = senders
+        self.retries = retries
+        self.backoff = backoff
+        self.log = log
+        self.jobs = queue.Queue()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.state = {}             # (group, pilot, channel) -> [next send time, sends]
+        # token bucket
+        self.rateMax = rateMax
+        self.ratePeriod = ratePeriod
+        self.tokens = float(rateMax)
+        self.tstamp = time.monotonic()
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0}
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self.work, name="tracker-alert-%d" % i, daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    # --------------------------------------------------------------------------
+    # alarms of a group for this cycle
+    # alarms  : { pilot: text describing the pilot }
+    # channels: { channel: recipients } enabled for this group
+    # repeat  : escalation intervals (s)
+    # returns the number of messages queued
+    # --------------------------------------------------------------------------
+    def submit(self, group, alarms, channels, repeat=(300,), title="ALERT"):
+        now = time.monotonic()
+        due = {}
+        with self.lock:
+            # pilots no more in alarm: forget them
+            for key in [k for k in self.state if k[0] == group and (k[1] not in alarms or k[2] not in channels)]:
+                del self.state[key]
+            for p in alarms:
+                for ch in channels:
+                    st = self.state.get((group, p, ch))
+                    if st is not None and now < st[0]: continue
+                    sends = 0 if st is None else st[1]
+                    delay = repeat[min(sends, len(repeat)-1)] if repeat else 0
+                    self.state[(group, p, ch)] = [now + delay if delay > 0 else float('inf'), sends+1]
+                    due.setdefault(ch, []).append(p)
+        for ch in due:
+            pilots = due[ch]
+            mess = title + ": " + str(len(pilots)) + " pilot(s): " + ", ".join(alarms[p] for p in sorted(pilots))
+            self.jobs.put((ch, channels[ch], mess, 0))
+            self.count('queued')
+        return(len(due))
+
+    # counters (submit and the workers), under the lock
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    # copy of the counters
+    def counters(self):
+        with self.lock:
+            return(dict(self.stats))
+
+    # wait for a token of the rate limit, False if stopping
+    def take(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rateMax, self.tokens + (now-self.tstamp) * self.rateMax / self.ratePeriod)
+                self.tstamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return(True)
+                wait = (1-self.tokens) * self.ratePeriod / self.rateMax
+            self.stopping.wait(wait)
+        return(False)
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None: return
+            (ch, recipients, mess, attempt) = job
+            if not self.take(): return
+            t0 = time.monotonic()
+            try:
+                self.senders[ch](mess, recipients)
+                self.count('sent')
+                self.log("alert %s sent in %.2fs: %s" % (ch, time.monotonic()-t0, mess))
+            except Exception as e:
+                if isinstance(e, DeliveryError):
+                    recipients = e.failed
+                if attempt < self.retries and not self.stopping.is_set():
+                    delay = self.backoff * 2**attempt * (1 + random.random()/2)
+                    self.log("alert %s failed (%s), retry in %.0fs" % (ch, e, delay))
+                    timer = threading.Timer(delay, self.jobs.put, ((ch, recipients, mess, attempt+1),))
+                    timer.daemon = True
+                    timer.start()
+                else:
+                    self.count('failed')
+                    self.log("alert %s failed (%s), given up: %s" % (ch, e, mess))
+
+    # stop the workers (jobs not started are dropped)
+    def stop(self):
+        self.stopping.set()
+        for t in self.threads:
+            self.jobs.put(None)
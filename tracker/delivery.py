@@ -0,0 +1,405 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# delivery.py
+# delivery backends of the alerts (email, SMS)
+#
+# A backend keeps its session open between alerts (SMTP connection,
+# authorized router client), sends a message to all its recipients at
+# once and reports, per recipient: (ok, seconds, error).
+#   SmtpBackend    : smtplib, persistent connection (STARTTLS/SSL, login)
+#   MsmtpBackend   : msmtp, one process per message for all recipients
+#   RouterSmsBackend: SMS through the TP-Link router (tplinkrouterc6u)
+#
+# Local stand-ins, to test delivery offline:
+#   FakeRouter     : router client with latency and failures
+#   SinkSmtpServer : debugging SMTP server (messages kept in memory,
+#                    recipients matching 'reject' refused)
+#
+# throughput test on the stand-ins:
+#      delivery.py [-n 200] [-rcpt 3]
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import sys
+import time
+import random
+import smtplib
+import threading
+import subprocess
+import socketserver
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+
+# ------------------------------------------------------------------------------
+# email through a persistent SMTP connection
+# ------------------------------------------------------------------------------
+class SmtpBackend:
+    def __init__(self, host='localhost', port=25, user='', password='', sender='tracker@localhost', \
+            tls='none', timeout=20):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender
+        self.tls = tls                  # 'none', 'starttls' or 'ssl'
+        self.timeout = timeout
+        self.smtp = None
+        self.lock = threading.Lock()
+        self.connects = 0
+
+    def connect(self):
+        if self.tls == 'ssl':
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.tls == 'starttls':
+                smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password)
+        self.smtp = smtp
+        self.connects += 1
+
+    def message(self, mess, recipients):
+        msg = EmailMessage()
+        msg['From'] = self.sender
+        msg['To'] = ", ".join(recipients)
+        msg['Subject'] = mess
+        msg['Date'] = formatdate(localtime=True)
+        msg['Message-ID'] = make_msgid()
+        msg.set_content(mess + "\n")
+        return(msg)
+
+    # one SMTP transaction for all the recipients
+    def send(self, mess, recipients):
+        msg = self.message(mess, recipients)
+        with self.lock:
+            t0 = time.monotonic()
+            for attempt in (0, 1):
+                try:
+                    if self.smtp is None: self.connect()
+                    refused = self.smtp.send_message(msg, self.sender, list(recipients))
+                    break
+                except smtplib.SMTPRecipientsRefused as e:
+                    refused = e.recipients
+                    break
+                except smtplib.SMTPServerDisconnected as e:
+                    # connection closed by the server while idle: reconnect once
+                    self.drop()
+                    if attempt:
+                        dt = time.monotonic()-t0
+                        return({r: (False, dt, str(e)) for r in recipients})
+                except smtplib.SMTPException as e:
+                    # rejected by the server (auth, sender, data): no resend
+                    # (before OSError: SMTPException is an OSError too)
+                    self.drop()
+                    dt = time.monotonic()-t0
+                    return({r: (False, dt, str(e)) for r in recipients})
+                except OSError as e:
+                    # socket error: reconnect once
+                    self.drop()
+                    if attempt:
+                        dt = time.monotonic()-t0
+                        return({r: (False, dt, str(e)) for r in recipients})
+            dt = time.monotonic()-t0
+        report = {}
+        for r in recipients:
+            if r in refused:
+                report[r] = (False, dt, str(refused[r]))
+            else:
+                report[r] = (True, dt, '')
+        return(report)
+
+    def drop(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.close()
+            except OSError:
+                pass
+            self.smtp = None
+
+    def close(self):
+        with self.lock:
+            if self.smtp is not None:
+                try:
+                    self.smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self.drop()
+
+
+# ------------------------------------------------------------------------------
+# email through msmtp (its own configuration, ~/.msmtprc)
+# ------------------------------------------------------------------------------
+class MsmtpBackend:
+    def __init__(self, command='msmtp', timeout=60):
+        self.command = command
+        self.timeout = timeout
+
+    def send(self, mess, recipients):
+        message = "To: " + ", ".join(recipients) + "\n"
+        message += "Subject: " + mess + "\n\n"
+        message += mess + "\n"
+        t0 = time.monotonic()
+        try:
+            res = subprocess.run([self.command] + list(recipients), input=message.encode(), \
+                capture_output=True, timeout=self.timeout)
+            err = '' if res.returncode == 0 else res.stderr.decode(errors='replace').strip()
+        except (OSError, subprocess.SubprocessError) as e:
+            err = str(e)
+        dt = time.monotonic()-t0
+        return({r: (err == '', dt, err) for r in recipients})
+
+    def close(self):
+        pass
+
+
+# ------------------------------------------------------------------------------
+# SMS through the router, authorized session kept open
+# factory: returns a router client (authorize, send_sms, logout)
+# sessionErrors: errors of the session (expired, router restarted), after
+# which it logs in again and sends once more; any other error is reported
+# at once (SMS refused, or maybe sent: not sent twice)
+# ------------------------------------------------------------------------------
+class RouterSmsBackend:
+    def __init__(self, factory, sessionErrors=(ConnectionError, OSError)):
+        self.factory = factory
+        self.sessionErrors = sessionErrors
+        self.router = None
+        self.lock = threading.Lock()
+        self.logins = 0
+
+    def login(self):
+        router = self.factory()
+        router.authorize()
+        self.router = router
+        self.logins += 1
+
+    def send(self, mess, recipients):
+        report = {}
+        with self.lock:
+            for num in recipients:
+                t0 = time.monotonic()
+                err = ''
+                for attempt in (0, 1):
+                    try:
+                        if self.router is None: self.login()
+                    except Exception as e:
+                        # router unreachable or login refused: once more
+                        err = str(e) or e.__class__.__name__
+                        self.drop()
+                        continue
+                    try:
+                        self.router.send_sms(num, mess)
+                        err = ''
+                        break
+                    except self.sessionErrors as e:
+                        # session expired or router restarted: log in again once
+                        err = str(e) or e.__class__.__name__
+                        self.drop()
+                    except Exception as e:
+                        err = str(e) or e.__class__.__name__
+                        break
+                report[num] = (err == '', time.monotonic()-t0, err)
+        return(report)
+
+    def drop(self):
+        if self.router is not None:
+            try:
+                self.router.logout()
+            except Exception:
+                pass
+            self.router = None
+
+    def close(self):
+        with self.lock:
+            self.drop()
+
+# client of the real router (library loaded at the first SMS)
+def tplinkFactory(host, password):
+    def factory():
+        try:
+            from tplinkrouterc6u import TplinkRouterProvider
+        except ImportError:
+            raise RuntimeError("tplinkrouterc6u lib missing, cannot send SMS")
+        return(TplinkRouterProvider.get_client(host, password))
+    return(factory)
+
+# session errors of the real router: the connection ones, and the
+# authorization error of the library (if it has one)
+def tplinkErrors():
+    errors = (ConnectionError, OSError)
+    try:
+        from tplinkrouterc6u.common import exception
+    except ImportError:
+        return(errors)
+    auth = getattr(exception, 'AuthorizeError', None)
+    if auth is not None: errors += (auth,)
+    return(errors)
+
+
+# ------------------------------------------------------------------------------
+# stand-in of the router client
+# latency: seconds per call, failrate: probability a send fails,
+# expire: sends before the session expires (0: never)
+# ------------------------------------------------------------------------------
+class FakeRouter:
+    sent = []                   # (number, message) of all the instances
+
+    def __init__(self, latency=0.05, failrate=0.0, expire=0, seed=None):
+        self.latency = latency
+        self.failrate = failrate
+        self.expire = expire
+        self.rnd = random.Random(seed)
+        self.logged = False
+        self.count = 0
+
+    def authorize(self):
+        time.sleep(self.latency * 5)         # login is the slow part
+        self.logged = True
+        self.count = 0
+
+    def send_sms(self, num, mess):
+        time.sleep(self.latency)
+        if not self.logged:
+            raise ConnectionError("not authorized")
+        if self.expire and self.count >= self.expire:
+            self.logged = False
+            raise ConnectionError("session expired")
+        if self.rnd.random() < self.failrate:
+            raise RuntimeError("sms refused")
+        self.count += 1
+        FakeRouter.sent.append((num, mess))
+
+    def logout(self):
+        self.logged = False
+
+
+# ------------------------------------------------------------------------------
+# debugging SMTP server: accepts everything but recipients holding 'reject'
+# messages are kept in server.messages as (sender, recipients, data)
+# ------------------------------------------------------------------------------
+class SinkSmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 sink ready")
+        (sender, rcpts) = (None, [])
+        while True:
+            line = self.rfile.readline()
+            if not line: return
+            cmd = line.decode(errors='replace').strip()
+            verb = cmd[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply("250 sink")
+            elif verb == 'MAIL':
+                (sender, rcpts) = (cmd[10:].strip(' <>'), [])
+                self.reply("250 ok")
+            elif verb == 'RCPT':
+                rcpt = cmd[8:].strip(' <>')
+                if 'reject' in rcpt:
+                    self.reply("550 no such user")
+                else:
+                    rcpts.append(rcpt)
+                    self.reply("250 ok")
+            elif verb == 'DATA':
+                self.reply("354 end with .")
+                data = []
+                while True:
+                    dl = self.rfile.readline()
+                    if not dl or dl in (b'.\r\n', b'.\n'): break
+                    data.append(dl)
+                with self.server.lock:
+                    self.server.messages.append((sender, rcpts, b''.join(data)))
+                self.reply("250 queued")
+            elif verb in ('RSET', 'NOOP'):
+                self.reply("250 ok")
+            elif verb == 'QUIT':
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+class SinkSmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr=('127.0.0.1', 0)):
+        socketserver.ThreadingTCPServer.__init__(self, addr, SinkSmtpHandler)
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return(self.server_address[1])
+
+
+# ------------------------------------------------------------------------------
+# throughput of the backends on the stand-ins:
+# persistent sessions vs one session per message (previous behaviour)
+# ------------------------------------------------------------------------------
+def bench(n, nrcpt):
+
+    rcpts = ["pilot%d@example.org" % i for i in range(nrcpt)]
+    nums = ["06000000%02d" % i for i in range(nrcpt)]
+
+    server = SinkSmtpServer()
+    port = server.start()
+
+    t0 = time.monotonic()
+    for i in range(n):
+        b = SmtpBackend('127.0.0.1', port)
+        b.send("alert %d" % i, rcpts)
+        b.close()
+    tnew = time.monotonic()-t0
+
+    b = SmtpBackend('127.0.0.1', port)
+    t0 = time.monotonic()
+    for i in range(n):
+        rep = b.send("alert %d" % i, rcpts)
+    tkeep = time.monotonic()-t0
+    b.close()
+    print("smtp  %4d messages x %d rcpt: new connection %7.3fs   persistent %7.3fs (%d connection)" % \
+        (n, nrcpt, tnew, tkeep, b.connects))
+
+    rep = SmtpBackend('127.0.0.1', port).send("refused", rcpts[:1] + ["reject@example.org"])
+    print("smtp  per recipient:", {r: (v[0], round(v[1], 4), v[2]) for (r, v) in rep.items()})
+    server.shutdown()
+
+    m = max(1, n // 10)
+    t0 = time.monotonic()
+    for i in range(m):
+        b = RouterSmsBackend(lambda: FakeRouter(latency=0.01))
+        b.send("alert %d" % i, nums)
+        b.close()
+    tnew = time.monotonic()-t0
+    b = RouterSmsBackend(lambda: FakeRouter(latency=0.01, failrate=0.1, expire=20, seed=1))
+    t0 = time.monotonic()
+    failed = 0
+    for i in range(m):
+        rep = b.send("alert %d" % i, nums)
+        failed += len([r for r in rep if not rep[r][0]])
+    tkeep = time.monotonic()-t0
+    b.close()
+    print("sms   %4d messages x %d rcpt: new session    %7.3fs   persistent %7.3fs (%d logins, %d failed)" % \
+        (m, nrcpt, tnew, tkeep, b.logins, failed))
+
+
+# ------------------------------------------------------------------------------
+# -----------------------------
+#   MAIN PROGRAM
+# -----------------------------
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    n = 200
+    nrcpt = 3
+    if '-n' in sys.argv:
+        n = int(sys.argv[sys.argv.index('-n')+1])
+    if '-rcpt' in sys.argv:
+        nrcpt = int(sys.argv[sys.argv.index('-rcpt')+1])
+    bench(n, nrcpt)
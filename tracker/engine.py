@@ -0,0 +1,2258 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# engine.py
+# tracking engine of tracker.py (no GUI):
+#      fetch FFVL tracker data, follow pilots status,
+#      rise alerts when a pilot is not moving
+# 
+# can be imported by a front end (tracker.py GUI) or run as a daemon:
+#      engine.py --headless
+# 
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+# 
+# requires:
+#   
+#    sudo apt install mpg321
+#    sudo apt install msmtp         (EmailBackend msmtp, or smtp without it)
+# 
+#    pip3 install tplinkrouterc6u
+#    pip3 install numpy            (optional, faster cycles with many pilots)
+# 
+
+
+import sys
+import os
+from datetime import datetime
+import time
+import csv
+import json
+import re
+import signal
+import logging
+import threading
+from types import MappingProxyType
+from math import *
+import feedclient
+import ingest
+import journal
+import history
+import kinematics
+import spatial
+import params
+import logs
+import alerts
+import delivery
+import replay
+import metrics
+import pilot
+import scheduler
+import webapi
+import shards
+from pilot import Status
+
+
+# ------------------------------------------------------------------------------
+# load pilot list from input csv file
+# ------------------------------------------------------------------------------
+def loadPilotList():
+    
+    global FILES, PilotsFilter
+    
+    PilotsFilter = {}
+    if P.Filtrage != 'Fichier':
+        printlog("not using pilot list to filter")
+        return()
+        
+    if FILES['pilotsFilter']=='' or FILES['pilotsFilter']=='select a file' or not os.path.isfile(FILES['pilotsFilter']):
+        printlog("pilot list undefined or missing")
+        return()
+    
+    with open(FILES['pilotsFilter'], newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in list(reader):
+            PilotsFilter[row['Pseudo']]={"Name": row['Prenom'], "Surname": row['Nom']}
+        csvfile.close()
+    
+    debuglog("%s", PilotsFilter)
+
+
+
+# ------------------------------------------------------------------------------
+# get info from FFVL tracker database
+# returns the list of positions (ingest.Fix) received, None on failure
+# (the payload is parsed while it is received, never held as a whole)
+# ------------------------------------------------------------------------------
+def fetchDatabase(frm, to=None):
+    
+    url = P.ffvl_url+str(frm)
+    if to is not None:
+        url += P.ffvl_url_to+str(to)
+
+    stats = {}
+    body = [] if FeedRecorder is not None else None
+    try:
+        fixes = list(ingest.iterFixes(keepChunks(session.stream(url), body), stats))
+    except ValueError as e:
+        warnlog('Invalid data received: '+str(e))
+        return(None)
+    except Exception as e:
+        warnlog('Request failure: '+str(e))
+        return(None)
+    if session.status != 200:
+        warnlog('Request failure: HTTP '+str(session.status))
+        return(None)
+    if stats.get('bad'):
+        printlog(str(stats['bad'])+" unusable records skipped")
+    if body is not None:
+        FeedRecorder.write(int(Clock()), frm, to, b''.join(body))
+    countCycle('records', len(fixes))
+    return(fixes)
+
+# chunks of the payload, also kept in body when recording (replay.py)
+# (time waiting for a chunk: fetch, time until the next one is asked: decode)
+def keepChunks(chunks, body):
+    
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        t0 = lap('fetch', t0)
+        countCycle('bytes', len(chunk))
+        if body is not None: body.append(chunk)
+        yield(chunk)
+        t0 = lap('decode', t0)
+    lap('fetch', t0)
+
+
+# ------------------------------------------------------------------------------
+# time windows to request: from the feed cursor (high-water mark of 
+# the positions already received) up to now.
+# A long gap (first start, restart after a crash) is bounded to 
+# CatchUpMax and split in chunks of CatchUpChunk seconds.
+# ------------------------------------------------------------------------------
+def fetchWindows(now):
+    
+    if FeedCursor is None:
+        return([(now-60, None)])     # take position from last minute
+    
+    # a cursor in the future (saved by an older version) is brought back
+    start = min(FeedCursor, now) - P.FeedOverlap
+    start = max(start, now - P.CatchUpMax)
+    chunk = P.CatchUpChunk
+    windows = []
+    while now - start > chunk:
+        windows.append((start, start+chunk))
+        start += chunk
+    windows.append((start, None))
+    return(windows)
+
+
+# ------------------------------------------------------------------------------
+# move the feed cursor after a successful request
+# wend: end of the requested window
+# ------------------------------------------------------------------------------
+def advanceCursor(fixes, wend):
+    
+    global FeedCursor
+    
+    # nothing in the window: the cursor still moves (nobody flying)
+    # a tracker with a bad clock (positions dated in the future) must 
+    # not move it past the window: the others would not be asked for
+    now = int(Clock())
+    hwm = wend - P.FeedOverlap
+    for fix in fixes:
+        if fix.ts > now: continue
+        hwm = max(hwm, min(fix.ts, wend))
+    if FeedCursor is None or hwm > FeedCursor or FeedCursor > now:
+        FeedCursor = hwm
+    t0 = time.perf_counter()
+    saveCursor()
+    lap('persist', t0)
+
+
+# ------------------------------------------------------------------------------
+# parse data from database
+# update status for each pilot of the current watch group
+# fixes: positions received (ingest.Fix), filtered for this group
+#        by dispatchFixes()
+# dists: distance to the landing spot of each fix (None if not known)
+# ------------------------------------------------------------------------------
+def parseData(fixes, dists=None):
+    
+    global PilotsStatus, PilotsFilter
+    
+    t0 = time.perf_counter()
+    changed = set()
+    if dists is None: dists = [None]*len(fixes)
+    
+    # 0. already received (windows overlap), nothing new
+    selected = []; seldists = []
+    for i in range(len(fixes)):
+        el = fixes[i]
+        if el.pseudo in PilotsStatus:
+            if el.ts <= PilotsStatus[el.pseudo].postime:
+                continue
+        selected.append(el); seldists.append(dists[i])
+    (fixes, dists) = (selected, seldists)
+    countCycle('kept', len(fixes))
+    
+    # distances and flags of the whole cycle at once (numpy)
+    kin = None
+    if P.BatchMin and len(fixes) >= P.BatchMin and kinematics.available():
+        kin = batchKinematics(fixes)
+    
+    # 1. recording pilot info from data received
+    for i in range(len(fixes)):
+        el = fixes[i]
+        pseudo=el.pseudo
+        
+        # recent fixes of this pilot
+        if pseudo not in PilotsHistory:
+            PilotsHistory[pseudo] = history.FixHistory(P.HistorySize, P.FenetrePose)
+        hist = PilotsHistory[pseudo]
+        hist.push(el.ts, el.lat, el.lon, el.alt, el.speed)
+        
+        # create new item if needed
+        if pseudo not in PilotsStatus: 
+            name='-'; surname='-'
+            # infos coming from filter file
+            debuglog("==  ITEM  NEW===============================\n%s", el)
+            if pseudo in PilotsFilter:
+                name = PilotsFilter[pseudo]['Name']
+                surname = PilotsFilter[pseudo]['Surname']
+            distkm = dists[i]
+            if distkm is None:
+                if kin is not None and kin['d2km'] is not None:
+                    distkm = kin['d2km'][i]
+                else:
+                    distkm = spotDistance(el)
+            ps = pilot.Pilot(name, surname, el.lat, el.lon, el.alt, el.ts, el.speed, distkm)
+        
+        # update an existing item
+        else:
+            ps = PilotsStatus[pseudo]
+        
+            # evaluate status of this pilot
+            debuglog("==  ITEM  ==================================\n%s", el)
+            pre = None
+            if kin is not None and pseudo not in changed:
+                pre = (kin['step'][i], kin['tof'][i], kin['lan'][i])
+            updatePilotInfo(ps,el,hist,pre)
+        
+        # nearest known landing spot
+        ps.spot = nearestSpot(el)
+        
+        # recording
+        PilotsStatus[pseudo] = ps
+        changed.add(pseudo)
+    t0 = lap('parse', t0)
+
+
+    # 2. evaluate warnings: pilots with a new log, then the timers 
+    #    due (log delay over, pilots gone for too long: archived)
+    now = int(Clock())
+    for p in changed:
+        watchPilot(p, PilotsStatus[p])
+    late = [p for p in LateTimers.expired(now - P.delaiLogMax) if p in PilotsStatus]
+    for p in late:
+        PilotsStatus[p].late = 1
+    changed |= evictPilots(now)
+    markDirty(changed)
+    markDirty(late)
+    alarms = {}
+    for p in sorted(Alarmed):
+        ps = PilotsStatus[p]
+        printlog("ALARM ! Pilot "+p+" "+ps.name+" "+ps.surname)
+        alarms[p] = alarmText(p, ps)
+    countCycle('alarms', len(alarms))
+    t0 = lap('evaluate', t0)
+
+    # save changes in backup file
+    savePilotTable(changed)
+    t0 = lap('persist', t0)
+    
+    # alerts are delivered by the workers of alerts.py (no wait here),
+    # once per pilot and channel, repeated after the AlerteRepeat delays
+    sendAlerts(alarms)
+    lap('alert', t0)
+    
+
+# ------------------------------------------------------------------------------
+# queue the alerts of the current group
+# alarms: { pseudo: text }
+# ------------------------------------------------------------------------------
+def sendAlerts(alarms):
+
+    if Alerts is None: return()
+    channels = {}
+    if P.AlerteSonore: channels['sound'] = [P.soundCmd]
+    if P.AlerteSMS:    channels['sms'] = P.TelPourAlerte.split()
+    if P.AlerteEmail:  channels['email'] = P.EmailPourAlerte.split()
+    title = "ALERT tracker" if CurGroup == DEFAULT else "ALERT tracker "+CurGroup
+    Alerts.submit(CurGroup, alarms, channels, P.AlerteRepeat, title)
+
+# pilot named in an alert message
+def alarmText(p, ps):
+
+    text = p
+    if ps.name != '-' or ps.surname != '-':
+        text += " (" + ps.name + " " + ps.surname + ")"
+    text += " last log " + datetime.fromtimestamp(ps.postime).strftime("%H:%M:%S")
+    text += " at " + str(ps.lat) + "," + str(ps.lon)
+    return(text)
+
+
+# ------------------------------------------------------------------------------
+# Accessories to send alert (called by the alert workers, raise on failure)
+# mess: message, dests: recipients (sound: the player command)
+# ------------------------------------------------------------------------------
+def sendSoundAlert(mess, dests):
+    command=dests[0]+execpath+"/sound.mp3"
+    debuglog("sound command: %s", command)
+    if os.system(command):
+        raise RuntimeError("sound command failed")
+    
+# ------------------------------------------------------------------------------
+def sendSmsAlert(mess, numlist):
+    deliver('sms', mess, numlist)
+
+# ------------------------------------------------------------------------------
+def sendEmailAlert(mess, dests):
+    deliver('email', mess, dests)
+
+# ------------------------------------------------------------------------------
+# send through a backend of delivery.py, log each recipient
+# ------------------------------------------------------------------------------
+def deliver(channel, mess, dests):
+    report = Backends[channel].send(mess, dests)
+    failed = []
+    for r in report:
+        (ok, dt, err) = report[r]
+        if ok:
+            printlog("%s alert to %s: ok (%.2fs)", channel, r, dt)
+        else:
+            warnlog("%s alert to %s: failed (%.2fs) %s", channel, r, dt, err)
+            failed.append(r)
+    if failed:
+        raise alerts.DeliveryError(failed)
+
+
+# ------------------------------------------------------------------------------
+# update info of a pilot
+# ps : state of the pilot (pilot.Pilot), updated
+# cur: current position (ingest.Fix)
+# hist: recent fixes of this pilot (history.FixHistory), cur included
+# 
+# TakeOff : take off or not
+# Landed  : has landed (no more moving after take off)
+# 
+# ------------------------------------------------------------------------------
+def updatePilotInfo(ps,cur,hist=None,pre=None):
+    
+    tof = 0; lan = 0; 
+    if pre is None:
+        # rough distance calculation (in meter) from gps dec coord and altitude    
+        distm = calcDistm(ps.lat, ps.lon, ps.alt, cur.lat, cur.lon, cur.alt)
+    else:
+        # step and flags already evaluated for the whole cycle (kinematics.py)
+        (distm, tof, lan) = pre
+    debuglog("Step= %s", distm)
+    
+    deltaTime=cur.ts-ps.postime
+    debuglog("DeltaT= %s", deltaTime)
+
+    if ps.new:            
+        #first log, do not check.
+        ps.new = 0
+        debuglog("first log, skip check")
+    else:   
+        if deltaTime==0:
+            debuglog("log not new, skip check")
+        else:
+            if cur.speed is not None:
+                ps.speed = cur.speed
+                debuglog("Speed= %s", cur.speed)
+            
+            if pre is None:
+                (tof, lan) = detectFlags(ps.takeoff, distm, cur.speed)
+                
+            # when the window is set and observed, it decides:
+            # little move over the last FenetrePose seconds
+            if ps.takeoff and hist is not None and hist.covered():
+                (t0,lat0,lon0,alt0,sp0) = hist.windowStart()
+                move = calcDistm(lat0, lon0, alt0, cur.lat, cur.lon, cur.alt)
+                debuglog("Move over window= %s", move)
+                lan = 1 if move < P.DistMaxPose else 0
+                # sometimes step is null but speed is not
+                if cur.speed is not None:
+                    if cur.speed > P.VitMinDeco: lan = 0
+            
+            if tof:
+                ps.takeoff = 1
+                printlog("Pilot TakeOff "+cur.pseudo)
+             
+            if lan:
+
+                ps.landed = 1
+                printlog("Pilot Landed "+cur.pseudo)
+
+
+    (ps.lat, ps.lon, ps.alt, ps.step, ps.postime) = (cur.lat, cur.lon, cur.alt, distm, cur.ts)
+                 
+    return(ps)       
+
+
+# ------------------------------------------------------------------------------
+# evaluate the cycle in one pass (kinematics.py)
+# ------------------------------------------------------------------------------
+def batchKinematics(fixes):
+
+    spot = None
+    if P.Latitude is not None and P.Longitude is not None:
+        spot = (P.Latitude, P.Longitude)
+    thr = { 'VitMinDeco':  P.VitMinDeco,
+            'StepMinDeco': P.StepMinDeco,
+            'StepMaxPose': P.StepMaxPose }
+    return(kinematics.cycle(fixes, PilotsStatus, spot, thr))
+
+
+# ------------------------------------------------------------------------------
+# takeoff / landing detection from one step
+# takeoff: TakeOff flag of the pilot
+# distm  : step (m) from the previous log
+# speed  : horizontal speed (None if not reported)
+# returns (tof, lan), mirrored by kinematics.cycle() for a whole cycle
+# ------------------------------------------------------------------------------
+def detectFlags(takeoff, distm, speed):
+
+    tof = 0; lan = 0
+    if takeoff==0:
+        # detect takeoff: speed of 10km/h (if speed is available)
+        if speed is not None:
+            if (speed > P.VitMinDeco): tof = 1
+        # in addition use distance from last record
+        # detect takeoff: move of 10m
+        if (distm > P.StepMinDeco): tof = 1
+    
+    else:
+        if (distm < P.StepMaxPose): lan = 1
+        
+        # sometimes step is null but speed is not
+        if speed is not None:
+            if speed > P.VitMinDeco: lan = 0
+    
+    return((tof, lan))
+
+
+# -----------------------------------------------
+# check a pilot (monitors status, log delay...)
+# evaluate pilot or log time warnings            
+# 
+# -----------------------------------------------
+def checkPilot(ps):
+
+    alarm = 0
+    ps.status = Status.GROUND
+    if ps.takeoff:
+        ps.status = Status.FLYING
+    
+    if (ps.takeoff and ps.landed and (not ps.cleared)):
+        ps.status = Status.ALERT
+    
+    if ps.cleared:
+        ps.status = Status.SAFE
+
+    # delta time between now and last log
+    now = int(Clock())  
+    ps.late = 1 if now-ps.postime > P.delaiLogMax else 0
+
+    # pilot landed but not cleared
+    if (ps.landed and ps.cleared==0):
+        alarm = 1
+
+    return((ps,alarm))       
+
+# -----------------------------------------------
+# evaluate a pilot (new log, cleared) and set
+# its timers, keyed on the last log:
+#  log delay  : late after postime+delaiLogMax
+#               (LateTimers holds postime, the 
+#               delay is the one of the cycle)
+#  eviction   : archived EvictCleared after the
+#               last log or the clear (Safe),
+#               EvictHorizon after the last log
+#               when still on the ground; never
+#               in flight or in alarm (0: never)
+# pilots in alarm are kept in Alarmed
+# -----------------------------------------------
+def watchPilot(p, ps):
+
+    (ps,alarm) = checkPilot(ps)
+    if alarm: Alarmed.add(p)
+    else:     Alarmed.discard(p)
+    
+    if ps.late: LateTimers.cancel(p)
+    else:       LateTimers.set(p, ps.postime)
+    
+    due = 0
+    if alarm: pass
+    elif ps.status is Status.SAFE and P.EvictCleared:
+        due = max(ps.postime, int(Clock())) + P.EvictCleared
+    elif ps.status is Status.GROUND and P.EvictHorizon:
+        due = ps.postime + P.EvictHorizon
+    if due: EvictTimers.set(p, due)
+    else:   EvictTimers.cancel(p)
+    return(alarm)
+
+# -----------------------------------------------
+# archive and remove the pilots whose eviction
+# time is over (appended to the archive file of 
+# the group, one JSON line per pilot)
+# returns the pilots removed
+# -----------------------------------------------
+def evictPilots(now):
+
+    gone = [p for p in EvictTimers.expired(now) if p in PilotsStatus]
+    if not gone: return(set())
+    try:
+        with open(FILES['pilotsStatus']+'.archive', 'a') as out_file:
+            for p in gone:
+                out_file.write(json.dumps({'t': now, 'p': p, 's': PilotsStatus[p].saved()})+"\n")
+    except OSError as e:
+        warnlog("pilot archive not written: "+str(e))
+    for p in gone:
+        del PilotsStatus[p]
+        PilotsHistory.pop(p, None)
+        LateTimers.cancel(p)
+    printlog(str(len(gone))+" pilot(s) archived ("+CurGroup+")")
+    return(set(gone))
+
+
+# -----------------------------------------------
+# distance to the landing spot of the current 
+# watch group, None if undefined
+# -----------------------------------------------
+def spotDistance(elem):
+   
+    if WatchIndex is None or CurGroup not in WatchIndex.spots:
+        return(None)
+    (name, lat, lon) = WatchIndex.spots[CurGroup][:3]
+    return(calcDistKm(lat, lon, elem.lat, elem.lon))
+
+
+# -----------------------------------------------
+# nearest spot of config['spots'] within MaxDistance,
+# None if none
+# -----------------------------------------------
+def nearestSpot(elem):
+   
+    if SpotsIndex is None: return(None)
+    near = SpotsIndex.nearest(elem.lat, elem.lon)
+    if near is None: return(None)
+    return(near[0])
+
+
+# -----------------------------------------------
+# build the index of the spots of config['spots']
+# (radius MaxDistance), and the one of the landing
+# spots of the watch groups (their own MaxDistance)
+# -----------------------------------------------
+def buildSpotsIndex():
+   
+    global SpotsIndex, WatchIndex
+    
+    SpotsIndex = spatial.SpotIndex()
+    radius = P.MaxDistance
+    for name in config['spots']:
+        sp = config['spots'][name]
+        addSpot(SpotsIndex, name, sp.get('Latitude',''), sp.get('Longitude',''), radius)
+    
+    WatchIndex = spatial.SpotIndex()
+    for g in Groups:
+        selectGroup(g)
+        addSpot(WatchIndex, g, P.Latitude, P.Longitude, P.MaxDistance)
+    selectGroup(DEFAULT)
+
+def addSpot(index, name, lat, lon, radius):
+   
+    try:
+        index.add(name, float(str(lat).strip()), float(str(lon).strip()), radius)
+    except (TypeError, ValueError):
+        # coordinates undefined (custom spot)
+        pass
+
+
+# -----------------------------------------------
+# distance calc between 2 gps coordinates
+# in decimal degrees and z in meter (numbers), for small distances
+# return in m
+# -----------------------------------------------
+def calcDistm(x1,y1,z1,x2,y2,z2):
+
+    k1 = 111000           # 1 deg is roughly 111km
+    k2 = 111000*cos(6.3*x1/360)   # 1 deg is roughly 111km at equator
+    dist= sqrt(\
+        ((x1-x2)*k1)**2 +\
+        ((y1-y2)*k2)**2 +\
+         (z1-z2)**2 )
+    return(int(dist))
+
+
+# -----------------------------------------------
+# distance calc between 2 lat/lon coordinates
+# in decimal degrees (numbers), for long distance
+# return in km
+# -----------------------------------------------
+def calcDistKm(x1,y1,x2,y2):
+
+    R = 6373.0
+    lat1 = radians(x1)
+    lon1 = radians(y1)
+    lat2 = radians(x2)
+    lon2 = radians(y2)
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    distance = R * c
+    return(int(distance))
+    
+# -----------------------------------------------
+# load pilot table from backup file
+# (snapshot + journal of changes)
+# -----------------------------------------------
+def loadPilotTable():   
+    
+    global FILES, PilotsStatus
+    
+    jrn = getJournal(1)
+    try:
+        saved = jrn.load()
+    except (ValueError, KeyError):
+        warnlog("pilot backup file unreadable, starting from an empty table")
+        saved = {}
+    if jrn.torn:
+        warnlog(str(jrn.torn)+" torn line(s) ignored in pilot journal")
+
+    PilotsStatus = {}
+    resetTimers()
+    for p in saved:
+        try:
+            ps = pilot.fromSaved(saved[p])
+        except (ValueError, TypeError, KeyError):
+            warnlog("pilot "+p+" unreadable in backup file, ignored")
+            continue
+        # status and log delay are not saved, evaluate them
+        PilotsStatus[p] = ps
+        watchPilot(p, ps)
+
+    # start with a fresh snapshot and an empty journal
+    savePilotTable()
+
+   
+# -----------------------------------------------
+# save pilot table in backup file
+# changed: pilots to record in the journal,
+#          None to rewrite the whole snapshot
+# -----------------------------------------------
+def savePilotTable(changed=None):   
+    
+    global FILES, PilotsStatus
+    
+    jrn = getJournal()
+    if changed is None:
+        jrn.compact(persistentTable())
+        return()
+    
+    for p in changed:
+        if p in PilotsStatus:
+            jrn.record(p, PilotsStatus[p].saved())
+        else:
+            jrn.record(p, None)
+    jrn.commit(persistentTable)
+
+# -----------------------------------------------
+# journal of the pilot table (opened at first use)
+# -----------------------------------------------
+def getJournal(reopen=0):   
+    
+    global pilotJournal
+    
+    if reopen and pilotJournal is not None:
+        pilotJournal.close()
+        pilotJournal = None
+    if pilotJournal is None:
+        pilotJournal = journal.Journal(FILES['pilotsStatus'], sync=P.JournalSync, \
+            maxLines=P.JournalMaxLines)
+    return(pilotJournal)
+
+# -----------------------------------------------
+# saved form of the pilot table (status and log 
+# delay are evaluated by checkPilot)
+# -----------------------------------------------
+def persistentTable():   
+    
+    table = {}
+    for p in PilotsStatus:
+        table[p] = PilotsStatus[p].saved()
+    return(table)
+    
+# -----------------------------------------------
+# load/save feed cursor (timestamp of the last 
+# position received from the feed)
+# -----------------------------------------------
+def loadCursor():   
+    
+    global FeedCursor
+    
+    FeedCursor = None
+    if os.path.isfile(FILES['cursor']):
+        try:
+            with open(FILES['cursor'], 'r') as in_file:
+                FeedCursor = json.load(in_file)['cursor']
+        except (ValueError, KeyError):
+            warnlog("feed cursor file unreadable, ignored")
+
+def saveCursor():   
+    
+    tmp = FILES['cursor']+'.tmp'
+    with open(tmp, 'w') as out_file:
+        json.dump({'cursor': FeedCursor}, out_file)
+    os.replace(tmp, FILES['cursor'])
+        
+
+# # # -----------------------------------------------
+# # # Calculate status
+# # # -----------------------------------------------
+# # def calcStatus(elem):
+# # 
+# #     print("Calc")
+# #     print(elem)
+# #     status = '-'
+# #     color = defaultbg         # default color #d9d9d9
+# #     if elem['TakeOff']:
+# #         status='En vol'
+# #         color='green'
+# #     if (elem['TakeOff'] and elem['Landed'] and (not elem['Cleared'])):
+# #         status='ALERT'
+# #         color='red'
+# #     if elem['Cleared']:
+# #         status='Safe'
+# #         color=defaultbg
+# # 
+# #     # delta time between now and last log
+# #     now = int(time.time())  
+# #     deltat = now-int(elem['last_postime'])
+# #     color2 = defaultbg
+# #     if (deltat > int(getParam('delaiLogMax'))): color2="yellow"
+# #     
+# #     return((status,color,deltat,color2))
+
+# -----------------------------------------------
+# clear pilot status (Clear/Undo button)
+# returns the new snapshot
+# -----------------------------------------------
+def clearPilotStatus(p):   
+    
+    pool = Shards
+    reports = None
+    if pool is not None:
+        reports = pool.clear(p, Clock())
+    with stateLock:
+        if pool is None:
+            togglePilotClear(p)
+        elif pool is Shards:
+            mergeShards(reports)
+        return(makeSnapshot())
+
+def togglePilotClear(p):   
+    
+    elem=PilotsStatus[p]        
+
+    if elem.cleared:
+        if elem.landed:
+            elem.cleared=0
+            elem.landed=0
+        
+    else:
+        if elem.landed: elem.cleared=1
+        else: elem.landed=1
+
+    # now reevaluate status and store
+    watchPilot(p, elem)
+    markDirty([p])
+    savePilotTable([p])
+        
+
+# ----------------------------------------------------------
+# 
+# proc loadConfig
+#   read from the config file
+# 
+# ----------------------------------------------------------
+def loadConfig():
+
+    global FILES, config, DefConfig, Schema, P, ConfigStamp
+
+    defconfig = \
+{
+    "parameters": {
+        "Filtrage": {
+            "method": "radio",
+            "list": ["Fichier", "Distance", "Aucun"],
+            "descr": "Filtrage par fichier, par la distance a l'atterrissage, ou pas de filtre",
+            "def": "Aucun",
+            "value": "Aucun"
+        },
+        "MaxDistance": {
+            "method": "entry",
+            "descr": "Filtrage des pilotes a une distance inferieure a cette valeur en km",
+            "def": "50",
+            "value": "50"
+        },
+        "VitMinDeco": {
+            "method": "entry",
+            "descr": "Vitesse minimale pour detecter le deco (si vitesse reportee)",
+            "def": "10",
+            "value": "10"
+        },
+        "StepMinDeco": {
+            "method": "entry",
+            "descr": "Variation de position (en m) minimale pour detecter le mode vol",
+            "def": "10",
+            "value": "10"
+        },
+        "StepMaxPose": {
+            "method": "entry",
+            "descr": "Variation de position (en m) maximale pour detecter le mode sol",
+            "def": "5",
+            "value": "5"
+        },
+        "FenetrePose": {
+            "method": "entry",
+            "descr": "Fenetre (s) d'observation pour detecter le mode sol (0: pas de fenetre)",
+            "def": "0",
+            "value": "0"
+        },
+        "DistMaxPose": {
+            "method": "entry",
+            "descr": "Deplacement (en m) maximal sur la fenetre pour detecter le mode sol",
+            "def": "30",
+            "value": "30"
+        },
+        "delaiLogMax": {
+            "method": "entry",
+            "descr": "Delai (s) depuis le dernier log au-dela duquel on emet un Warning",
+            "def": "300",
+            "value": "300"
+        },
+        "AlerteSonore": {
+            "method": "chkb",
+            "descr": "Emettre l'alerte par un son",
+            "def": "0",
+            "value": "0"
+        },
+        "AlerteSMS": {
+            "method": "chkb",
+            "descr": "Emettre l'alerte par un SMS",
+            "def": "0",
+            "value": "0"
+        },
+        "AlerteEmail": {
+            "method": "chkb",
+            "descr": "Emettre l'alerte par un email",
+            "def": "0",
+            "value": "0"
+        },
+        "TelPourAlerte": {
+            "method": "entry",
+            "descr": "Nos de Tel auxquels envoyer un SMS d'alerte",
+            "def": "",
+            "value": ""
+        },
+        "EmailPourAlerte": {
+            "method": "entry",
+            "descr": "Email(s) auxquels envoyer une alerte",
+            "def": "",
+            "value": ""
+        },
+        "RefreshPeriod": {
+            "method": "entry",
+            "descr": "Periode de recuperation des donnees de tracking (s)",
+            "def"  : "60",
+            "value": "60"
+        },
+        "Editeur": {
+            "method": "entry",
+            "descr": "Outil pour editer les fichiers texte",
+            "def": "nedit",
+            "value": "nedit"
+        },
+        "soundCmd": {
+            "visib": 0,
+            "descr": "Tool to play sound",
+            "def": "mpg321 --frames 50 ",
+            "value": "mpg321 --frames 50 "
+        },
+        "pilotfile": {
+            "visib": 0,
+            "descr": "Fichier csv des pilotes",
+            "def": "select a file",
+            "value": "select a file"
+        },
+        "ffvl_url": {
+            "visib": 0,
+            "descr": "URL data",
+            "def"  : "https://data.ffvl.fr/api/?mode=json&key=79ef8d9f57c10b394b8471deed5b25e7&ffvl_tracker_key=all&from_utc_timestamp=",
+            "value": "https://data.ffvl.fr/api/?mode=json&key=79ef8d9f57c10b394b8471deed5b25e7&ffvl_tracker_key=all&from_utc_timestamp="
+        },
+        "ffvl_url_to": {
+            "visib": 0,
+            "descr": "URL data, borne haute des requetes de rattrapage",
+            "def"  : "&to_utc_timestamp=",
+            "value": "&to_utc_timestamp="
+        },
+        "HttpConnectTimeout": {
+            "visib": 0,
+            "descr": "Timeout (s) de connexion au serveur de tracking",
+            "def"  : "5",
+            "value": "5"
+        },
+        "HttpReadTimeout": {
+            "visib": 0,
+            "descr": "Timeout (s) de lecture des donnees de tracking",
+            "def"  : "20",
+            "value": "20"
+        },
+        "HttpRetries": {
+            "visib": 0,
+            "descr": "Nombre de nouvelles tentatives si une requete echoue",
+            "def"  : "2",
+            "value": "2"
+        },
+        "BatchMin": {
+            "visib": 0,
+            "descr": "Nombre de positions a partir duquel le calcul est vectorise (numpy, 0: jamais)",
+            "def"  : "0",
+            "value": "0"
+        },
+        "HistorySize": {
+            "visib": 0,
+            "descr": "Nombre de positions gardees en memoire par pilote",
+            "def"  : "32",
+            "value": "32"
+        },
+        "JournalSync": {
+            "visib": 0,
+            "descr": "Ecriture disque du journal des pilotes: always, cycle ou never",
+            "def"  : "cycle",
+            "value": "cycle"
+        },
+        "JournalMaxLines": {
+            "visib": 0,
+            "descr": "Taille (lignes) du journal des pilotes avant compaction",
+            "def"  : "5000",
+            "value": "5000"
+        },
+        "FeedOverlap": {
+            "visib": 0,
+            "descr": "Recouvrement (s) entre deux requetes (logs publies en retard)",
+            "def"  : "20",
+            "value": "20"
+        },
+        "CatchUpMax": {
+            "visib": 0,
+            "descr": "Rattrapage maximal (s) apres un arret",
+            "def"  : "10800",
+            "value": "10800"
+        },
+        "CatchUpChunk": {
+            "visib": 0,
+            "descr": "Duree (s) couverte par chaque requete de rattrapage",
+            "def"  : "900",
+            "value": "900"
+        },
+        "AlerteRepeat": {
+            "visib": 0,
+            "descr": "Delais (s) avant de repeter une alerte non acquittee (le dernier se repete, 0: pas de repetition)",
+            "def"  : "300 900 1800",
+            "value": "300 900 1800"
+        },
+        "AlerteRateMax": {
+            "visib": 0,
+            "descr": "Nombre max d'envois d'alertes par periode (tous canaux)",
+            "def"  : "10",
+            "value": "10"
+        },
+        "AlerteRatePeriod": {
+            "visib": 0,
+            "descr": "Periode (s) de la limite d'envois d'alertes",
+            "def"  : "60",
+            "value": "60"
+        },
+        "AlerteRetries": {
+            "visib": 0,
+            "descr": "Nombre de nouvelles tentatives si un envoi d'alerte echoue",
+            "def"  : "3",
+            "value": "3"
+        },
+        "AlerteWorkers": {
+            "visib": 0,
+            "descr": "Nombre de taches d'envoi des alertes en parallele",
+            "def"  : "2",
+            "value": "2"
+        },
+        "EmailBackend": {
+            "visib": 0,
+            "descr": "Envoi des emails: smtp (connexion gardee ouverte) ou msmtp",
+            "def"  : "msmtp",
+            "value": "msmtp"
+        },
+        "SmtpHost": {
+            "visib": 0,
+            "descr": "Serveur SMTP",
+            "def"  : "localhost",
+            "value": "localhost"
+        },
+        "SmtpPort": {
+            "visib": 0,
+            "descr": "Port du serveur SMTP",
+            "def"  : "25",
+            "value": "25"
+        },
+        "SmtpTls": {
+            "visib": 0,
+            "descr": "Chiffrement SMTP: none, starttls ou ssl",
+            "def"  : "none",
+            "value": "none"
+        },
+        "SmtpUser": {
+            "visib": 0,
+            "descr": "Utilisateur SMTP (vide: pas d'authentification)",
+            "def"  : "",
+            "value": ""
+        },
+        "SmtpPassword": {
+            "visib": 0,
+            "descr": "Mot de passe SMTP",
+            "def"  : "",
+            "value": ""
+        },
+        "SmtpFrom": {
+            "visib": 0,
+            "descr": "Expediteur des emails d'alerte",
+            "def"  : "tracker@localhost",
+            "value": "tracker@localhost"
+        },
+        "SmsBackend": {
+            "visib": 0,
+            "descr": "Envoi des SMS: router (routeur TP-Link) ou fake (simulation, pour les tests)",
+            "def"  : "router",
+            "value": "router"
+        },
+        "RouterHost": {
+            "visib": 0,
+            "descr": "Adresse du routeur TP-Link pour les SMS",
+            "def"  : "192.168.1.1",
+            "value": "192.168.1.1"
+        },
+        "RouterPassword": {
+            "visib": 0,
+            "descr": "Mot de passe du routeur TP-Link",
+            "def"  : "tplPc1unegr-",
+            "value": "tplPc1unegr-"
+        },
+        "FeedRecord": {
+            "visib": 0,
+            "descr": "Enregistrement des reponses du serveur de tracking (fichier .jsonl ou .jsonl.gz, vide: non), voir replay.py",
+            "def"  : "",
+            "value": ""
+        },
+        "RefreshFast": {
+            "visib": 0,
+            "descr": "Periode (s) quand un pilote en vol semble pose ou n'emet plus (0: RefreshPeriod)",
+            "def"  : "20",
+            "value": "20"
+        },
+        "RefreshSlow": {
+            "visib": 0,
+            "descr": "Periode (s) quand aucun pilote n'est en vol (0: RefreshPeriod)",
+            "def"  : "180",
+            "value": "180"
+        },
+        "EvictCleared": {
+            "visib": 0,
+            "descr": "Delai (s) apres le dernier log avant d'archiver un pilote Safe (0: jamais)",
+            "def"  : "1800",
+            "value": "1800"
+        },
+        "EvictHorizon": {
+            "visib": 0,
+            "descr": "Delai (s) apres le dernier log avant d'archiver un pilote au sol (0: jamais)",
+            "def"  : "14400",
+            "value": "14400"
+        },
+        "WebPort": {
+            "visib": 0,
+            "descr": "Port du tableau de bord web et de l'API JSON des pilotes (reseau local), 0: pas de serveur",
+            "def"  : "0",
+            "value": "0"
+        },
+        "WebAddress": {
+            "visib": 0,
+            "descr": "Adresse d'ecoute du tableau de bord (0.0.0.0: tout le reseau local, 127.0.0.1: cette machine)",
+            "def"  : "0.0.0.0",
+            "value": "0.0.0.0"
+        },
+        "Shards": {
+            "visib": 0,
+            "descr": "Nombre de processus de suivi, les pilotes etant partages entre eux (0 ou 1: un seul)",
+            "def"  : "0",
+            "value": "0"
+        },
+        "ShardTimeout": {
+            "visib": 0,
+            "descr": "Delai (s) de reponse d'un processus de suivi, au-dela il est relance",
+            "def"  : "60",
+            "value": "60"
+        },
+        "MetricsPort": {
+            "visib": 0,
+            "descr": "Port local des metriques des cycles (format Prometheus, /metrics), 0: pas de serveur",
+            "def"  : "9108",
+            "value": "9108"
+        },
+        "MetricsHistory": {
+            "visib": 0,
+            "descr": "Nombre de cycles gardes en memoire pour les metriques",
+            "def"  : "360",
+            "value": "360"
+        },
+        "LogLevel": {
+            "visib": 0,
+            "descr": "Niveau du log: DEBUG (traces par pilote), INFO, WARNING",
+            "def"  : "INFO",
+            "value": "INFO"
+        },
+        "LogMaxBytes": {
+            "visib": 0,
+            "descr": "Taille max du fichier de log avant rotation (octets, 0: pas de rotation)",
+            "def"  : "5000000",
+            "value": "5000000"
+        },
+        "LogBackups": {
+            "visib": 0,
+            "descr": "Nombre de fichiers de log gardes apres rotation",
+            "def"  : "5",
+            "value": "5"
+        },
+        "LogRotateWhen": {
+            "visib": 0,
+            "descr": "Rotation du log dans le temps: midnight, H, D... (vide: par la taille)",
+            "def"  : "",
+            "value": ""
+        },
+        "LogJson": {
+            "visib": 0,
+            "descr": "Log au format JSON (une ligne par message): 0/1",
+            "def"  : "0",
+            "value": "0"
+        },
+        "LogConsole": {
+            "visib": 0,
+            "descr": "Copie du log sur la sortie standard: 0/1",
+            "def"  : "1",
+            "value": "1"
+        },
+        "spot": {
+            "visib": 0,
+            "descr": "Pre-selection du spot",
+            "def": "custom",
+            "value": "custom"
+        },
+        "Latitude": {
+            "visib": 0,
+            "descr": "Latitude du spot",
+            "def": "",
+            "value": " "
+        },
+        "Longitude": {
+            "visib": 0,
+            "descr": "Longitude du spot",
+            "def": "",
+            "value": " "
+        },
+        "Altitude": {
+            "visib": 0,
+            "descr": "Altitude du spot",
+            "def": "",
+            "value": " "
+        }
+    },
+    "spots": {
+        "custom": {
+            "Longitude":  "",
+            "Latitude":  "",
+            "Altitude":  "",
+            "descr": "Spot custom"
+        },    
+        "Arbas Attero": {
+            "Longitude":  0.904557,
+            "Latitude":  42.990937,
+            "Altitude":  420,
+            "descr": "Atterrissage Arbas"
+        },
+        "Val Louron Attero": {
+            "Longitude":  0.405442,
+            "Latitude":  42.802246,
+            "Altitude":  951,
+            "descr": "Atterrissage VL"
+        },
+        "Doussard": {
+            "Longitude":  6.222322,
+            "Latitude":  45.781463,
+            "Altitude":  466,
+            "descr": "Atterrissage Anncey"
+        },
+        "Lumbin": {
+            "Longitude":  5.906357,
+            "Latitude":  45.302509,
+            "Altitude":  230,
+            "descr": "Atterrissage St Hil"
+        }
+    },
+    "groups": {
+    }
+        }
+
+    f = FILES['config']
+    if (os.path.isfile(f) and os.path.getsize(f)>0):
+        # read the config file
+        with open(f, 'r') as in_file:
+            config = json.load(in_file)
+            in_file.close()
+        # sections and parameters added since this config file was written
+        addDefaults(config, defconfig)
+    
+    else:
+        config = defconfig
+    
+    # typed parameters, checked against the defaults
+    DefConfig = defconfig
+    Schema = params.schema(defconfig['parameters'], PARAMTYPES)
+    P = compileGroup(config, DEFAULT)[0]
+    ConfigStamp = configStamp()
+    
+def addDefaults(conf, defconfig):
+
+    for sec in defconfig:
+        if sec not in conf:
+            conf[sec] = json.loads(json.dumps(defconfig[sec]))
+    for par in defconfig['parameters']:
+        if par not in conf['parameters']:
+            conf['parameters'][par] = dict(defconfig['parameters'][par])
+
+# ----------------------------------------------------------
+# compile the parameters of a group (over: its overrides)
+# a bad value is logged and replaced by its default
+# returns (params.Params, errors)
+# ----------------------------------------------------------
+def compileGroup(conf, name, over=None):
+
+    (obj, errors) = params.compileParams(conf['parameters'], Schema, over)
+    for e in errors:
+        warnlog("config "+name+": "+e+", default used")
+    return((obj, errors))
+
+def configStamp():
+
+    try:
+        st = os.stat(FILES['config'])
+        return((st.st_mtime_ns, st.st_size))
+    except OSError:
+        return(None)
+
+# ----------------------------------------------------------
+# reload the config file if it changed on disk
+# (called at each cycle by the worker)
+# a config holding a bad value is rejected as a whole
+# ----------------------------------------------------------
+def reloadConfig():
+
+    global config, ConfigStamp
+
+    # not tracking yet: startSession compiles the config
+    if not Groups: return()
+    stamp = configStamp()
+    if stamp is None or stamp == ConfigStamp: return()
+    ConfigStamp = stamp
+    try:
+        with open(FILES['config'], 'r') as in_file:
+            newconf = json.load(in_file)
+        addDefaults(newconf, DefConfig)
+    except (OSError, ValueError, KeyError, AttributeError) as e:
+        warnlog("config file unreadable, not reloaded: "+str(e))
+        return()
+    
+    # check everything before using anything
+    compiled = {}
+    bad = 0
+    for g in Groups:
+        over = {}
+        if g != DEFAULT:
+            if g not in newconf['groups']: continue
+            over = groupOverrides(newconf, g)
+        (obj, errors) = params.compileParams(newconf['parameters'], Schema, over)
+        for e in errors: warnlog("config "+g+": "+e)
+        bad += len(errors)
+        compiled[g] = (over, obj)
+    if bad:
+        warnlog("config file not reloaded ("+str(bad)+" bad values)")
+        return()
+    if set(newconf['groups']) != set(Groups) - {DEFAULT}:
+        warnlog("watch groups changed, restart tracking to apply")
+    
+    printlog("config file reloaded")
+    with stateLock:
+        config = newconf
+        logpar = logParams()
+        for g in compiled:
+            (Groups[g]['params'], Groups[g]['P']) = compiled[g]
+        for g in Groups:
+            selectGroup(g)
+            FILES['pilotsFilter'] = P.pilotfile
+            loadPilotList()
+        selectGroup(DEFAULT)
+        buildSpotsIndex()
+        if logParams() != logpar: initLog()
+        if backendParams() != BackendsKey and ShardOf is None: startBackends()
+        if max(P.Shards, 1) != (Shards.n if Shards is not None else 1):
+            warnlog("number of shards changed, restart tracking to apply")
+        startMetrics()
+        startWeb()
+    
+# ----------------------------------------------------------
+# 
+# proc writeConfig
+#   store confid into config file
+# 
+# ----------------------------------------------------------
+def writeConfig():
+
+    global FILES, config
+
+    # write the status file
+    with open(FILES['config'], 'w') as out_file:
+        json.dump(config, out_file, indent = 4, sort_keys=True)
+        out_file.close()
+
+# -----------------------------------------------
+# Utility to get a param value
+#    if param is not saved, get default from config
+# -----------------------------------------------   
+def getParam(parname):   
+
+    global config
+    
+    # parameters of the watch group processed by this thread
+    over = getattr(Active, 'params', None)
+    if over and parname in over:
+        return(str(over[parname]))
+    
+    elem = config['parameters'][parname]
+    val = elem['def']
+    if len(elem['value']): val = elem['value']
+    return(val)
+    
+# -----------------------------------------------
+# fetch data and parse
+# -----------------------------------------------
+def fetchAndParse():
+
+    printlog('\n' + '+'*50 + '\n')
+    reloadConfig()
+    cycle = Metrics.begin(Period or P.RefreshPeriod)
+    Active.cycle = cycle
+    try:
+        now = int(Clock())
+        windows = fetchWindows(now)
+        if len(windows) > 1:
+            printlog("catching up "+str(now-windows[0][0])+"s in "+str(len(windows))+" requests")
+            
+        for (frm,to) in windows:
+            # begin to grab info (network, no lock held)
+            infolist = fetchDatabase(frm, to)
+            if infolist is None: 
+                warnlog("fetch is void")    
+                # still review the pilots (log delay), retry the window next time
+                trackFixes([])
+                break
+            
+            # filter and parse data
+            trackFixes(infolist)
+            with stateLock:
+                advanceCursor(infolist, now if to is None else to)
+    finally:
+        Active.cycle = None
+        with stateLock:
+            cycle.counts['pilots'] = pilotsTracked()
+        Metrics.end(cycle)
+        printlog(cycle.text())
+
+# -----------------------------------------------
+# track the fixes received: in this process, or
+# by the shard processes (Shards parameter)
+# (takes stateLock: not held while the shards work)
+# -----------------------------------------------
+def trackFixes(fixes):
+
+    pool = Shards
+    if pool is None:
+        with stateLock:
+            parseGroups(dispatchFixes(fixes))
+        return()
+    t0 = time.perf_counter()
+    reports = pool.cycle(fixes, Clock())
+    lap('parse', t0)
+    with stateLock:
+        if pool is Shards: mergeShards(reports, 1)
+
+# -----------------------------------------------
+# records changed by the shard processes copied 
+# in the tables of this process (read only: GUI,
+# dashboard, cycle period), their alarms merged 
+# and sent (cycle=1)
+# stage times: those of the slowest shard
+# -----------------------------------------------
+def mergeShards(reports, cycle=0):
+
+    global PilotsStatus
+    
+    alarms = {}
+    slowest = {}
+    for (k, al, recs, stages, counts) in reports:
+        for g in recs:
+            if g not in Groups: continue
+            selectGroup(g)
+            (full, items) = recs[g]
+            if full:
+                gone = [p for p in PilotsStatus if shards.shardOf(p, Shards.n) == k]
+                for p in gone: del PilotsStatus[p]
+                markDirty(gone)
+            for (p, saved, st, late) in items:
+                if saved is None:
+                    PilotsStatus.pop(p, None)
+                    continue
+                PilotsStatus[p] = pilot.fromList(saved, st, late)
+            markDirty([item[0] for item in items])
+        for g in al:
+            alarms.setdefault(g, {}).update(al[g])
+        for s in stages:
+            slowest[s] = max(slowest.get(s, 0.0), stages[s])
+        for c in ('kept', 'alarms'):
+            if c in counts: countCycle(c, counts[c])
+    cur = getattr(Active, 'cycle', None)
+    if cur is not None:
+        for s in slowest: cur.add(s, slowest[s])
+    if cycle:
+        t0 = time.perf_counter()
+        for g in Groups:
+            selectGroup(g)
+            sendAlerts(dict(sorted(alarms.get(g, {}).items())))
+        lap('alert', t0)
+    selectGroup(DEFAULT)
+
+# -----------------------------------------------
+# instrumentation of the cycles (metrics.py):
+# time spent in a stage of the current cycle 
+# since t0, returns the new t0
+# -----------------------------------------------
+def lap(stage, t0):
+
+    t = time.perf_counter()
+    cycle = getattr(Active, 'cycle', None)
+    if cycle is not None: cycle.add(stage, t-t0)
+    return(t)
+
+def countCycle(name, n):
+
+    cycle = getattr(Active, 'cycle', None)
+    if cycle is not None: cycle.count(name, n)
+
+# pilots of all the groups
+def pilotsTracked():
+
+    n = len(PilotsStatus)
+    for g in Groups:
+        if g != CurGroup: n += len(Groups[g]['status'])
+    return(n)
+
+# -----------------------------------------------
+# watch groups: several spots/events followed 
+# from the same feed.
+# config['groups'] = { name: { param: value, ... } }
+#   param: any name of config['parameters'] (own 
+#   thresholds, Filtrage, pilotfile, TelPourAlerte...)
+#   or "spot": a name of config['spots']
+# The default group uses config['parameters'] as is
+# (GUI). Each group has its own pilot table and
+# backup file (tracker.<name>.pilots).
+# -----------------------------------------------
+def loadGroups():
+    
+    global Groups
+    
+    Groups = { DEFAULT: newGroup(DEFAULT, {}, FILES['pilotsStatus']) }
+    home = os.path.dirname(FILES['config'])
+    for name in config.get('groups', {}):
+        if name == DEFAULT:
+            warnlog("group name "+name+" is reserved, ignored")
+            continue
+        fname = re.sub(r'[^\w.-]', '_', name)
+        Groups[name] = newGroup(name, groupOverrides(config, name), home+"/tracker."+fname+".pilots")
+
+# parameters overridden by a group
+def groupOverrides(conf, name):
+    
+    over = {}
+    for (par, val) in conf['groups'][name].items():
+        if par == 'spot':
+            if val in conf['spots']:
+                for item in ['Latitude', 'Longitude', 'Altitude']:
+                    over[item] = conf['spots'][val].get(item, '')
+            else:
+                warnlog("group "+name+": unknown spot "+str(val))
+        elif par in conf['parameters']:
+            over[par] = val
+        else:
+            warnlog("group "+name+": unknown parameter "+par+", ignored")
+    return(over)
+
+def newGroup(name, over, pilotsfile):
+    
+    return({ 'params': over, 'P': compileGroup(config, name, over)[0],
+             'files': { 'pilotsStatus': pilotsfile, 'pilotsFilter': "select a file" },
+             'status': {}, 'filter': {}, 'history': {}, 'journal': None,
+             'late': scheduler.Timers(), 'evict': scheduler.Timers(), 'alarmed': set(),
+             'dirty': None, 'snap': None })
+
+# -----------------------------------------------
+# make a group current: its tables become the 
+# engine tables (PilotsStatus...), and its 
+# parameters are seen by getParam in this thread
+# (to be called with stateLock held)
+# -----------------------------------------------
+def selectGroup(name):
+    
+    global PilotsStatus, PilotsFilter, PilotsHistory, pilotJournal, CurGroup, P
+    global LateTimers, EvictTimers, Alarmed, Dirty, LastSnap
+    
+    if CurGroup in Groups:
+        cur = Groups[CurGroup]
+        (cur['status'], cur['filter'], cur['history'], cur['journal']) = \
+            (PilotsStatus, PilotsFilter, PilotsHistory, pilotJournal)
+        (cur['late'], cur['evict'], cur['alarmed']) = (LateTimers, EvictTimers, Alarmed)
+        (cur['dirty'], cur['snap']) = (Dirty, LastSnap)
+        cur['files']['pilotsStatus'] = FILES['pilotsStatus']
+        cur['files']['pilotsFilter'] = FILES['pilotsFilter']
+    
+    grp = Groups[name]
+    (PilotsStatus, PilotsFilter, PilotsHistory, pilotJournal) = \
+        (grp['status'], grp['filter'], grp['history'], grp['journal'])
+    (LateTimers, EvictTimers, Alarmed) = (grp['late'], grp['evict'], grp['alarmed'])
+    (Dirty, LastSnap) = (grp['dirty'], grp['snap'])
+    FILES['pilotsStatus'] = grp['files']['pilotsStatus']
+    FILES['pilotsFilter'] = grp['files']['pilotsFilter']
+    Active.params = grp['params']
+    P = grp['P']
+    CurGroup = name
+
+# -----------------------------------------------
+# share the fixes received between the groups
+# (each fix is looked at once, whatever the 
+# number of groups)
+# returns { group: (fixes, distances) }
+# -----------------------------------------------
+def dispatchFixes(fixes):
+    
+    t0 = time.perf_counter()
+    parts = {}
+    roster = {}          # pseudo -> groups filtering on a pilot list
+    neargrp = set()      # groups filtering on the distance
+    takeall = []         # groups without filter
+    for g in Groups:
+        selectGroup(g)
+        parts[g] = ([], [])
+        mode = P.Filtrage
+        if mode == 'Fichier':
+            for p in PilotsFilter: roster.setdefault(p, []).append(g)
+        elif mode == 'Distance' and g in WatchIndex.spots:
+            neargrp.add(g)
+        else:
+            # no filter (or landing spot undefined)
+            takeall.append(g)
+    selectGroup(DEFAULT)
+    
+    for el in fixes:
+        for g in takeall:
+            parts[g][0].append(el); parts[g][1].append(None)
+        for g in roster.get(el.pseudo, ()):
+            parts[g][0].append(el); parts[g][1].append(None)
+        if neargrp:
+            for (g, d) in WatchIndex.query(el.lat, el.lon):
+                if g in neargrp:
+                    parts[g][0].append(el); parts[g][1].append(d)
+    
+    for g in parts:
+        printlog(g+": "+str(len(parts[g][0]))+" of "+str(len(fixes))+" logs kept")
+    lap('parse', t0)
+    return(parts)
+
+# -----------------------------------------------
+# parse the fixes of each group (missing: none)
+# -----------------------------------------------
+def parseGroups(parts):
+    
+    try:
+        for g in Groups:
+            selectGroup(g)
+            if len(Groups) > 1: printlog("==  GROUP "+g+" ==")
+            (fixes, dists) = parts.get(g, ([], []))
+            parseData(fixes, dists)
+    finally:
+        selectGroup(DEFAULT)
+    
+# -----------------------------------------------
+# make a copy of the pilot table for the front
+# end (records copied: the worker never changes
+# them, to be read only)
+# only the pilots of the dirty set are copied 
+# again, the others are the records of the last
+# snapshot (same objects: unchanged)
+#  'dirty': pilots changed since the last 
+#           snapshot (None: all of them)
+# (to be called with stateLock held)
+# -----------------------------------------------
+def makeSnapshot():
+
+    global Dirty, LastSnap
+    
+    if Dirty is None or LastSnap is None:
+        pilots = {}
+        for p in PilotsStatus:
+            pilots[p] = PilotsStatus[p].copy()
+        (dirty, order) = (None, tuple(pilotOrdering()))
+    else:
+        pilots = dict(LastSnap['pilots'])
+        for p in Dirty:
+            if p in PilotsStatus: pilots[p] = PilotsStatus[p].copy()
+            else: pilots.pop(p, None)
+        dirty = frozenset(Dirty)
+        order = tuple(pilotOrdering()) if dirty else LastSnap['order']
+    now = Clock()
+    snap = { 'time': datetime.fromtimestamp(now).strftime("%H:%M:%S"),
+             'now': int(now),
+             'order': order,
+             'dirty': dirty,
+             'pilots': MappingProxyType(pilots) }
+    Dirty = set()
+    LastSnap = MappingProxyType(snap)
+    if WebHttp is not None and CurGroup == DEFAULT:
+        WebHttp.publish(LastSnap)
+    return(LastSnap)
+
+# -----------------------------------------------
+# pilots to copy again in the next snapshot:
+# new log, status, warning (late timer), 
+# removed; the log delay shown is computed by 
+# the front end from 'now' (not a change)
+# -----------------------------------------------
+def markDirty(pilots):
+
+    global Dirty
+    
+    if Dirty is None: return()
+    Dirty.update(pilots)
+    # group never shown: a whole copy at the next snapshot, not a growing set
+    if len(Dirty) > len(PilotsStatus): Dirty = None
+
+# -----------------------------------------------
+# Background worker: fetch, parse and publish
+# snapshots to the front end
+# publish : optional callable(kind, data) receiving
+#           ('busy', None) then ('snap', snapshot)
+# -----------------------------------------------
+def workerLoop(publish=None):
+
+    global Period
+    
+    sched = scheduler.Scheduler()
+    with stateLock:
+        Period = cyclePeriod()
+    while not stopEvent.is_set():
+        sched.begin()
+        if publish: publish('busy', None)
+        try:
+            fetchAndParse()
+        except Exception as e:
+            warnlog("cycle failure: "+str(e))
+        if publish or WebHttp is not None:
+            t0 = time.perf_counter()
+            with stateLock:
+                snap = makeSnapshot()
+            Metrics.note('render', time.perf_counter()-t0)
+            if publish: publish('snap', snap)
+        
+        # next cycle on the cadence of the period (scheduler.py)
+        with stateLock:
+            period = cyclePeriod()
+        if period != Period:
+            printlog("refresh period "+str(period)+"s")
+            Period = period
+        skipped = sched.skipped
+        delay = sched.delay(period)
+        if sched.skipped > skipped:
+            warnlog("cycle overrun, "+str(sched.skipped-skipped)+" cycle(s) skipped")
+        stopEvent.wait(delay)
+
+# -----------------------------------------------
+# period of the next cycle (adaptive polling):
+#  RefreshFast while a pilot in flight may have 
+#   landed (steps near StepMaxPose) or has just
+#   stopped logging (late, for less than 
+#   NEWLATE*delaiLogMax: then, the signal is 
+#   known as lost)
+#  RefreshSlow when nobody is flying (on the 
+#   ground or cleared)
+#  RefreshPeriod otherwise (0 for RefreshFast or
+#   RefreshSlow: RefreshPeriod)
+# (to be called with stateLock held)
+# -----------------------------------------------
+def cyclePeriod():
+
+    if DEFAULT not in Groups: return(P.RefreshPeriod)
+    par = Groups[DEFAULT]['P']
+    (flying, alert) = (Status.FLYING, Status.ALERT)
+    now = int(Clock())
+    watched = 0
+    for g in Groups:
+        table = PilotsStatus if g == CurGroup else Groups[g]['status']
+        near = NEARPOSE * Groups[g]['P'].StepMaxPose
+        newlate = NEWLATE * Groups[g]['P'].delaiLogMax
+        for ps in table.values():
+            if ps.status is flying:
+                if (ps.late and now-ps.postime < newlate) or ps.step < near:
+                    return(par.RefreshFast or par.RefreshPeriod)
+                watched = 1
+            elif ps.status is alert:
+                watched = 1
+    if not watched:
+        return(par.RefreshSlow or par.RefreshPeriod)
+    return(par.RefreshPeriod)
+
+def startWorker(publish=None):
+
+    global worker
+    
+    if worker is not None and worker.is_alive():
+        printlog("tracking already running")
+        return()
+    stopEvent.clear()
+    worker = threading.Thread(target=workerLoop, args=(publish,), name="tracker-worker", daemon=True)
+    worker.start()
+
+def stopWorker():
+
+    stopEvent.set()
+
+# -----------------------------------------------
+# reset pilot status files (all the groups)
+# -----------------------------------------------
+def resetPilotStatus ():
+    
+    global PilotsStatus
+    
+    global FeedCursor
+    
+    pool = Shards
+    reports = None
+    if pool is not None:
+        reports = pool.reset(Clock())
+    with stateLock:
+        if pool is None:
+            emptyGroups()
+        elif pool is Shards:
+            mergeShards(reports)
+        FeedCursor = None
+        saveCursor()
+        return(makeSnapshot())
+
+def emptyGroups():
+    
+    for g in Groups:
+        selectGroup(g)
+        emptyPilotTable()
+    selectGroup(DEFAULT)
+
+def emptyPilotTable():
+    
+    global PilotsStatus
+    
+    PilotsStatus = {}
+    PilotsHistory.clear()
+    resetTimers()
+    savePilotTable()  
+
+
+# timers of the current group, empty (whole copy 
+# at the next snapshot)
+def resetTimers():
+
+    global LateTimers, EvictTimers, Alarmed, Dirty
+    
+    (LateTimers, EvictTimers, Alarmed) = (scheduler.Timers(), scheduler.Timers(), set())
+    Dirty = None
+
+
+# ------------------------------------------------------------------------------
+# orders the list of ID wrt to criteria (alert first, alphabetic...)
+# ------------------------------------------------------------------------------
+def pilotOrdering():   
+
+    global PilotsStatus
+    
+    alertlist = list()
+    warnlist = list()
+    traillist = list()
+    
+    alert = Status.ALERT
+    for p in PilotsStatus:
+        item = PilotsStatus[p]
+        if item.status is alert:
+            alertlist.append(p)
+        elif item.late:
+            warnlist.append(p)
+        else:
+            traillist.append(p)
+    
+    return(alertlist+warnlist+traillist)
+
+# -----------------------------------------------
+# utility for drop down list
+# -----------------------------------------------
+def getSpotList():
+    
+    global config
+    
+    outlist = []
+    for elem in config['spots']:
+        outlist.append(elem)
+    return(outlist)
+
+# -----------------------------------------------
+# return coord (lat lon alt) of a spot
+# -----------------------------------------------
+def getCoord(spot):
+    
+    global config
+    
+    if spot in config['spots']:
+        return(config['spots'][spot])
+    else:
+        return()
+
+# -----------------------------------------------
+# manage log messages
+# -----------------------------------------------
+# (written by a background thread, see logs.py; 
+#  args are formatted only if the level is on:
+#  printlog("Step= %s", distm))
+# -----------------------------------------------
+def printlog(mess, *args, level=logging.INFO):
+
+    logs.LOG.log(level, mess, *args)
+
+def debuglog(mess, *args):
+
+    logs.LOG.debug(mess, *args)
+
+def warnlog(mess, *args):
+
+    logs.LOG.warning(mess, *args)
+
+def logParams():
+
+    return(tuple(getattr(P, k) for k in \
+        ('LogLevel', 'LogMaxBytes', 'LogBackups', 'LogRotateWhen', 'LogJson', 'LogConsole')))
+
+# -----------------------------------------------
+# start the log backend, with the log parameters
+# when the config is loaded (defaults before)
+# -----------------------------------------------
+def initLog():
+
+    logFile = FILES['log']
+    if P is None:
+        logs.setup(logFile)
+    else:
+        (level, console) = (P.LogLevel, P.LogConsole)
+        if LogOverride is not None: (level, console) = LogOverride
+        logs.setup(logFile, level=level, maxBytes=P.LogMaxBytes, backups=P.LogBackups, \
+            when=P.LogRotateWhen, jsonl=P.LogJson, console=console)
+    
+    
+# -----------------------------------------------
+# initiate working dirs
+# -----------------------------------------------
+def initDirs():
+    
+    global FILES
+    
+    toolHomeDir = os.environ['HOME'] + "/.config/tracker"
+    logFile     = toolHomeDir + "/tracker.log"
+    FILES = {}
+    FILES['config']  = toolHomeDir + "/tracker.config"
+    FILES['pilotsStatus'] = toolHomeDir + "/tracker.pilots"
+    FILES['cursor'] = toolHomeDir + "/tracker.cursor"
+    FILES['pilotsFilter'] = "select a file"
+
+    # toolHomeDir
+    if not os.path.isdir(toolHomeDir):
+        print("toolHomeDir does not exist, creating : "+toolHomeDir)
+        try: os.makedirs(toolHomeDir)
+        except: 
+            print("Cannot write to "+toolHomeDir)
+            exit(1)
+    else: print("toolHomeDir : "+toolHomeDir)
+
+    # the log file is kept between runs (rotated by logs.py)
+    FILES['log'] = logFile
+    initLog()
+
+# -----------------------------------------------
+# start tracking session: load pilot filter and
+# backup of pilot status (restart after a crash)
+# -----------------------------------------------
+def startSession():
+
+    global PilotsStatus
+    
+    with stateLock:
+        loadGroups()
+        nshards = max(Groups[DEFAULT]['P'].Shards, 1)
+        for g in Groups:
+            selectGroup(g)
+            if len(Groups) > 1: printlog("watch group "+g)
+            FILES['pilotsFilter'] = P.pilotfile
+            loadPilotList()
+            splitPilotTable(nshards)
+            if nshards == 1:
+                loadPilotTable()
+            else:
+                PilotsStatus = {}
+                resetTimers()
+        selectGroup(DEFAULT)
+        buildSpotsIndex()
+        loadCursor()
+        startRecorder()
+        startMetrics()
+        startWeb()
+        startShards(nshards)
+        return(makeSnapshot())
+
+# -----------------------------------------------
+# shard processes (shards.py), n > 1
+# (to be called with stateLock held)
+# -----------------------------------------------
+def startShards(n):
+
+    global Shards
+    
+    if Shards is not None:
+        Shards.stop()
+        Shards = None
+    if n > 1:
+        Shards = shards.Pool(n, FILES, config, Clock(), P.ShardTimeout, warnlog)
+        mergeShards(Shards.reports)
+        printlog("tracking shared by "+str(n)+" processes")
+
+# -----------------------------------------------
+# session of a shard process (shards.py): the 
+# tables of the pilots of shard k only
+# -----------------------------------------------
+def startShardSession(k):
+
+    loadGroups()
+    for g in Groups:
+        selectGroup(g)
+        FILES['pilotsFilter'] = P.pilotfile
+        loadPilotList()
+        FILES['pilotsStatus'] = FILES['pilotsStatus'] + ".shard" + str(k)
+        loadPilotTable()
+    selectGroup(DEFAULT)
+    buildSpotsIndex()
+
+# -----------------------------------------------
+# backups of the pilot table of the current group
+# shared between n shard files (FILE.shardK), or 
+# back in one file (n=1), when the number of 
+# shards changed since the last session
+# -----------------------------------------------
+def splitPilotTable(n):
+
+    base = FILES['pilotsStatus']
+    (folder, name) = os.path.split(base)
+    olds = [os.path.join(folder, f) for f in os.listdir(folder or '.') \
+        if re.fullmatch(re.escape(name)+r'\.shard\d+', f)]
+    targets = [base] if n == 1 else [base+".shard"+str(k) for k in range(n)]
+    if n == 1 and not olds: return()
+    if n > 1 and sorted(olds) == sorted(targets) and not os.path.isfile(base): return()
+    
+    table = {}
+    for path in [base] + sorted(olds):
+        jrn = journal.Journal(path)
+        try:
+            saved = jrn.load()
+        except (ValueError, KeyError):
+            warnlog("pilot backup file "+path+" unreadable, ignored")
+            continue
+        for p in saved:
+            try:
+                ps = pilot.fromSaved(saved[p])
+            except (ValueError, TypeError, KeyError):
+                continue
+            if p not in table or ps.postime > table[p][0]:
+                table[p] = (ps.postime, saved[p])
+    parts = [{} for t in targets]
+    for p in table:
+        parts[shards.shardOf(p, len(targets))][p] = table[p][1]
+    for (path, part) in zip(targets, parts):
+        journal.Journal(path).compact(part)
+    for path in [base] + olds:
+        if path in targets: continue
+        for f in (path, path+'.journal'):
+            if os.path.isfile(f): os.remove(f)
+    printlog(str(len(table))+" pilot(s) of "+name+" shared in "+str(len(targets))+" file(s)")
+
+# -----------------------------------------------
+# record the feed responses (FeedRecord parameter,
+# see replay.py)
+# -----------------------------------------------
+def startRecorder():
+
+    global FeedRecorder
+    
+    if FeedRecorder is not None:
+        FeedRecorder.close()
+        FeedRecorder = None
+    if P.FeedRecord:
+        FeedRecorder = replay.Recorder(os.path.expanduser(P.FeedRecord))
+        printlog("recording the feed in "+P.FeedRecord)
+    
+# -----------------------------------------------
+# metrics of the cycles on http://127.0.0.1:MetricsPort/metrics
+# (Prometheus text format, see metrics.py)
+# -----------------------------------------------
+def startMetrics():
+
+    global MetricsHttp
+    
+    if ShardOf is not None: return()
+    Metrics.resize(P.MetricsHistory)
+    if MetricsHttp is not None:
+        if MetricsHttp.server_address[1] == P.MetricsPort: return()
+        MetricsHttp.shutdown()
+        MetricsHttp.server_close()
+        MetricsHttp = None
+    if P.MetricsPort:
+        try:
+            MetricsHttp = metrics.MetricsServer(Metrics, ('127.0.0.1', P.MetricsPort))
+            printlog("metrics on "+MetricsHttp.start())
+        except OSError as e:
+            warnlog("metrics endpoint not started (port "+str(P.MetricsPort)+"): "+str(e))
+    
+# -----------------------------------------------
+# API and dashboard of the pilot table for the 
+# field LAN (WebPort parameter, see webapi.py)
+# -----------------------------------------------
+def startWeb():
+
+    global WebHttp
+    
+    if ShardOf is not None: return()
+    addr = (P.WebAddress, P.WebPort)
+    if WebHttp is not None:
+        if WebHttp.server_address[:2] == addr: return()
+        WebHttp.stop()
+        WebHttp = None
+    if P.WebPort:
+        try:
+            WebHttp = webapi.WebServer(addr)
+            printlog("dashboard on "+WebHttp.start())
+            if LastSnap is not None: WebHttp.publish(LastSnap)
+        except OSError as e:
+            warnlog("dashboard not started (port "+str(P.WebPort)+"): "+str(e))
+    
+# -----------------------------------------------
+# init engine: dirs, log, config, http session
+# -----------------------------------------------
+def initEngine():
+
+    global session
+    
+    initDirs()
+    printlog('='*80+'\nStarting '+datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    loadConfig()
+    initLog()
+    session = feedclient.FeedClient(connectTimeout=P.HttpConnectTimeout, \
+        readTimeout=P.HttpReadTimeout, retries=P.HttpRetries)
+    startAlerts()
+
+# -----------------------------------------------
+# alert workers (alerts.py) and delivery backends
+# (delivery.py, sessions kept open)
+# -----------------------------------------------
+def startAlerts():
+
+    global Alerts
+    
+    startBackends()
+    if Alerts is not None: Alerts.stop()
+    Alerts = alerts.Dispatcher({'sound': sendSoundAlert, 'sms': sendSmsAlert, 'email': sendEmailAlert}, \
+        workers=P.AlerteWorkers, rateMax=P.AlerteRateMax, ratePeriod=P.AlerteRatePeriod, \
+        retries=P.AlerteRetries, log=printlog)
+
+def startBackends():
+
+    global Backends, BackendsKey
+    
+    for b in Backends.values(): b.close()
+    if P.EmailBackend == 'smtp':
+        email = delivery.SmtpBackend(P.SmtpHost, P.SmtpPort, P.SmtpUser, P.SmtpPassword, \
+            P.SmtpFrom, P.SmtpTls)
+    else:
+        email = delivery.MsmtpBackend()
+    if P.SmsBackend == 'fake':
+        sms = delivery.RouterSmsBackend(delivery.FakeRouter)
+    else:
+        sms = delivery.RouterSmsBackend(delivery.tplinkFactory(P.RouterHost, P.RouterPassword), \
+            delivery.tplinkErrors())
+    Backends = {'email': email, 'sms': sms}
+    BackendsKey = backendParams()
+
+def backendParams():
+
+    return(tuple(getattr(P, k) for k in ('EmailBackend', 'SmtpHost', 'SmtpPort', 'SmtpUser', \
+        'SmtpPassword', 'SmtpFrom', 'SmtpTls', 'SmsBackend', 'RouterHost', 'RouterPassword')))
+
+# -----------------------------------------------
+# daemon mode: run the tracking loop without GUI
+# -----------------------------------------------
+def runHeadless():
+
+    initEngine()
+    startSession()
+    signal.signal(signal.SIGTERM, lambda sig, frame: stopWorker())
+    printlog("headless tracking started, period "+str(P.RefreshPeriod)+"s")
+    try:
+        workerLoop()
+    except KeyboardInterrupt:
+        pass
+    printlog("headless tracking stopped")
+    if WebHttp is not None: WebHttp.stop()
+    if Shards is not None: Shards.stop()
+    Alerts.stop()
+    for b in Backends.values(): b.close()
+    logs.stop()
+
+
+# ------------------------------------------------------------------------------
+# engine state
+# ------------------------------------------------------------------------------
+execpath     = os.path.dirname(os.path.abspath(__file__))
+FILES        = {}
+config       = {}
+session      = None
+PilotsStatus = {}
+PilotsFilter = {}
+PilotsHistory = {}                # pseudo -> history.FixHistory (not saved)
+pilotJournal = None               # journal.Journal of the pilot table
+FeedCursor   = None               # last position timestamp received from the feed
+stateLock    = threading.RLock()  # protects PilotsStatus and the backup file
+stopEvent    = threading.Event()
+worker       = None
+Alerts       = None               # alerts.Dispatcher
+Backends     = {}                 # channel -> delivery backend (delivery.py)
+FeedRecorder = None               # replay.Recorder of the feed responses
+Clock        = time.time          # engine clock (replaced by replay.py)
+BackendsKey  = None               # their parameters
+SpotsIndex   = None               # spatial.SpotIndex of config['spots']
+WatchIndex   = None               # spatial.SpotIndex of the groups landing spots
+DEFAULT      = 'default'          # watch group of config['parameters'] (GUI)
+Groups       = {}                 # name -> watch group (see loadGroups)
+CurGroup     = DEFAULT            # group of the engine tables
+Active       = threading.local()  # .params: overrides seen by getParam
+DefConfig    = {}                 # default config (loadConfig)
+Schema       = {}                 # kinds of the parameters (params.schema)
+P            = None               # compiled parameters of the current group
+ConfigStamp  = None               # mtime/size of the config file loaded
+Metrics      = metrics.Metrics()  # rolling history of the cycles
+MetricsHttp  = None               # metrics.MetricsServer
+WebHttp      = None               # webapi.WebServer
+Shards       = None               # shards.Pool (Shards parameter)
+ShardOf      = None               # (k, n) in a shard process
+LogOverride  = None               # (level, console) of the engine process, in a shard
+Period       = None               # period of the current cycle (cyclePeriod)
+LateTimers   = scheduler.Timers() # pseudo -> last log, until late (current group)
+EvictTimers  = scheduler.Timers() # pseudo -> eviction time (current group)
+Alarmed      = set()              # pilots in alarm (current group)
+Dirty        = None               # pilots changed since LastSnap (None: all)
+LastSnap     = None               # last snapshot of the current group (makeSnapshot)
+NEARPOSE     = 2                  # step under NEARPOSE*StepMaxPose: may have landed
+NEWLATE      = 2                  # late for less than NEWLATE*delaiLogMax: just lost
+
+# parameters whose kind is not the one of their default value
+PARAMTYPES   = { 'MaxDistance':     ('float', 0),
+                 'Latitude':        ('coord', 90),
+                 'Longitude':       ('coord', 180),
+                 'Altitude':        ('coord', 9000),
+                 'JournalSync':     ('choice', ('always', 'cycle', 'never')),
+                 'RefreshPeriod':   ('int', 1),
+                 'RefreshFast':     ('int', 0),
+                 'RefreshSlow':     ('int', 0),
+                 'EvictCleared':    ('int', 0),
+                 'EvictHorizon':    ('int', 0),
+                 'HistorySize':     ('int', 2),
+                 'CatchUpChunk':    ('int', 1),
+                 'JournalMaxLines': ('int', 1),
+                 'LogLevel':        ('choice', ('DEBUG', 'INFO', 'WARNING', 'ERROR')),
+                 'LogRotateWhen':   ('choice', ('', 'S', 'M', 'H', 'D', 'midnight')),
+                 'LogJson':         ('bool', None),
+                 'LogConsole':      ('bool', None),
+                 'AlerteRepeat':    ('ints', 0),
+                 'AlerteRateMax':   ('int', 1),
+                 'AlerteRatePeriod': ('int', 1),
+                 'AlerteWorkers':   ('int', 1),
+                 'EmailBackend':    ('choice', ('msmtp', 'smtp')),
+                 'SmtpTls':         ('choice', ('none', 'starttls', 'ssl')),
+                 'SmsBackend':      ('choice', ('router', 'fake')),
+                 'WebPort':         ('int', 0),
+                 'Shards':          ('int', 0),
+                 'ShardTimeout':    ('int', 1),
+                 'MetricsPort':     ('int', 0),
+                 'MetricsHistory':  ('int', 1) }
+
+
+# ------------------------------------------------------------------------------
+# -----------------------------
+#   MAIN PROGRAM
+# -----------------------------
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if '--headless' in sys.argv or '-headless' in sys.argv:
+        runHeadless()
+    else:
+        print("usage: %s --headless" % sys.argv[0])
@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# feedclient.py
+# light HTTP client used by the tracker poll loop (replaces requests_html,
+# which drags a headless browser stack for a simple JSON GET)
+#
+#  - keep-alive: one persistent connection per host, reused every cycle
+#  - gzip/deflate negotiation
+#  - strict connect and read timeouts
+#  - bounded retries with exponential backoff and jitter
+#  - http.client/ssl are only imported at the first request
+#  - stream(): body delivered by chunks, decompressed on the fly
+#
+# compare with the previous path (startup time and per-poll latency):
+#      feedclient.py <url> [-n <nbr of polls>]
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import sys
+import time
+import random
+from urllib.parse import urlsplit
+
+
+# ------------------------------------------------------------------------------
+# Response of a GET: decoded body + a few measures
+# ------------------------------------------------------------------------------
+class FeedResponse:
+    def __init__(self, status, content, nbytes, elapsed):
+        self.status  = status       # HTTP status code
+        self.content = content      # body (bytes), content-encoding removed
+        self.nbytes  = nbytes       # bytes received on the wire
+        self.elapsed = elapsed      # request duration (s)
+
+
+# ------------------------------------------------------------------------------
+# Feed client
+# ------------------------------------------------------------------------------
+class FeedClient:
+    def __init__(self, connectTimeout=5, readTimeout=20, retries=2, backoff=0.5):
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.retries = retries
+        self.backoff = backoff
+        self.conns = {}             # (scheme, host, port) -> connection
+        self.headers = { 'Accept-Encoding': 'gzip, deflate',
+                         'Connection': 'keep-alive',
+                         'User-Agent': 'tracker.py' }
+
+    # get (or open) the persistent connection for this host
+    def connection(self, scheme, host, port):
+        import http.client
+        key = (scheme, host, port)
+        conn = self.conns.get(key)
+        if conn is None:
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(host, port, timeout=self.connectTimeout)
+            else:
+                conn = http.client.HTTPConnection(host, port, timeout=self.connectTimeout)
+            self.conns[key] = conn
+        return(conn)
+
+    def drop(self, key):
+        conn = self.conns.pop(key, None)
+        if conn is not None: conn.close()
+
+    def close(self):
+        for key in list(self.conns): self.drop(key)
+
+    # send GET url and return (key, response) once the headers are
+    # received, raises OSError/HTTPException when all retries failed
+    def open(self, url):
+        import http.client
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query: path += '?' + parts.query
+
+        attempt = 0
+        while True:
+            conn = self.connection(*key)
+            reused = conn.sock is not None
+            try:
+                if conn.sock is None:
+                    conn.connect()                          # connect timeout
+                conn.sock.settimeout(self.readTimeout)      # read timeout
+                conn.request('GET', path, headers=self.headers)
+                resp = conn.getresponse()
+                if resp.status >= 500:
+                    resp.read()
+                    raise http.client.HTTPException("server error "+str(resp.status))
+                return((key, resp))
+
+            except (OSError, http.client.HTTPException):
+                self.drop(key)
+                # an idle keep-alive connection closed by the server:
+                # retry at once on a fresh one
+                if reused: continue
+                if attempt >= self.retries: raise
+                delay = self.backoff * (2**attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+                time.sleep(delay)
+
+    # GET url, returns a FeedResponse
+    def get(self, url):
+        t0 = time.monotonic()
+        (key, resp) = self.open(url)
+        try:
+            raw = resp.read()
+        except Exception:
+            self.drop(key)
+            raise
+        if resp.will_close: self.drop(key)
+        content = decodeBody(raw, resp.getheader('Content-Encoding', ''))
+        return(FeedResponse(resp.status, content, len(raw), time.monotonic()-t0))
+
+    # GET url, yields the decoded body by chunks as it arrives
+    # (status in self.status, wire bytes in self.nbytes once done)
+    def stream(self, url, chunkSize=65536):
+        t0 = time.monotonic()
+        (key, resp) = self.open(url)
+        self.status = resp.status
+        self.nbytes = 0
+        dec = bodyDecoder(resp.getheader('Content-Encoding', ''))
+        done = 0
+        try:
+            while True:
+                raw = resp.read(chunkSize)
+                if not raw: break
+                self.nbytes += len(raw)
+                data = dec.decompress(raw) if dec else raw
+                if data: yield(data)
+            if dec:
+                data = dec.flush()
+                if data: yield(data)
+            done = 1
+        finally:
+            # connection reusable only if the body was fully read
+            if resp.will_close or not done: self.drop(key)
+            self.elapsed = time.monotonic()-t0
+
+
+# ------------------------------------------------------------------------------
+# remove content encoding
+# ------------------------------------------------------------------------------
+def decodeBody(raw, encoding):
+
+    encoding = encoding.strip().lower()
+    if encoding == 'gzip':
+        import gzip
+        return(gzip.decompress(raw))
+    if encoding == 'deflate':
+        import zlib
+        try:
+            return(zlib.decompress(raw))
+        except zlib.error:
+            return(zlib.decompress(raw, -zlib.MAX_WBITS))   # raw deflate
+    return(raw)
+
+# ------------------------------------------------------------------------------
+# incremental decoder for a content encoding (None: identity)
+# ------------------------------------------------------------------------------
+def bodyDecoder(encoding):
+
+    import zlib
+    encoding = encoding.strip().lower()
+    if encoding == 'gzip':
+        return(zlib.decompressobj(16+zlib.MAX_WBITS))
+    if encoding == 'deflate':
+        return(zlib.decompressobj())
+    return(None)
+
+
+# ------------------------------------------------------------------------------
+# compare startup time and per-poll latency with requests_html
+# ------------------------------------------------------------------------------
+def compare(url, n):
+
+    import subprocess
+    import os
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for (name, stmt) in [('feedclient', 'import feedclient; feedclient.FeedClient().get(%r)' % url),
+                         ('requests_html', 'from requests_html import HTMLSession; HTMLSession().get(%r)' % url)]:
+        t0 = time.monotonic()
+        ret = subprocess.run([sys.executable, '-c', stmt], cwd=here, capture_output=True)
+        dt = time.monotonic()-t0
+        if ret.returncode:
+            print("%-14s startup+first poll : not available" % name)
+        else:
+            print("%-14s startup+first poll : %6.0f ms" % (name, dt*1000))
+
+    clients = [('feedclient', FeedClient())]
+    try:
+        from requests_html import HTMLSession
+        clients.append(('requests_html', HTMLSession()))
+    except ImportError:
+        pass
+    for (name, client) in clients:
+        times = []
+        for i in range(n):
+            t0 = time.monotonic()
+            client.get(url)
+            times.append(time.monotonic()-t0)
+        times.sort()
+        print("%-14s poll latency       : median %6.1f ms  max %6.1f ms (n=%d)" % \
+            (name, times[len(times)//2]*1000, times[-1]*1000, n))
+
+
+# ------------------------------------------------------------------------------
+# -----------------------------
+#   MAIN PROGRAM
+# -----------------------------
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: %s <url> [-n <nbr of polls>]" % sys.argv[0])
+        exit(0)
+    n = 10
+    if '-n' in sys.argv: n = int(sys.argv[sys.argv.index('-n')+1])
+    compare(sys.argv[1], n)
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# history.py
+# bounded history of the last fixes of a pilot
+#
+# Fixed-size ring buffer backed by arrays (timestamps, lat, lon, alt, speed):
+# memory per pilot is set at creation and never grows.
+# A sliding window of 'span' seconds is maintained at each push (its start
+# only moves forward, O(1) amortized) for rules such as "moved less than
+# X m over the last N minutes".
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+from array import array
+
+NOSPEED = -1.0          # speed not reported
+
+
+class FixHistory:
+    __slots__ = ('cap', 'span', 'count', 'wseq', 'ts', 'lat', 'lon', 'alt', 'speed')
+
+    def __init__(self, cap=32, span=0):
+        self.cap = cap
+        self.span = span            # window length (s), 0: no window
+        self.count = 0              # fixes pushed since creation
+        self.wseq = 0               # sequence nbr of the first fix in the window
+        self.ts    = array('q', bytes(8*cap))
+        self.lat   = array('d', bytes(8*cap))
+        self.lon   = array('d', bytes(8*cap))
+        self.alt   = array('f', bytes(4*cap))
+        self.speed = array('f', bytes(4*cap))
+
+    def __len__(self):
+        return(min(self.count, self.cap))
+
+    def push(self, ts, lat, lon, alt, speed=None):
+        i = self.count % self.cap
+        self.ts[i] = ts
+        self.lat[i] = lat
+        self.lon[i] = lon
+        self.alt[i] = alt
+        self.speed[i] = NOSPEED if speed is None else speed
+        self.count += 1
+
+        # move the window start (oldest fix still in the buffer at least)
+        oldest = self.count - len(self)
+        if self.wseq < oldest: self.wseq = oldest
+        if self.span:
+            limit = ts - self.span
+            while self.wseq < self.count-1 and self.ts[self.wseq % self.cap] < limit:
+                self.wseq += 1
+
+    # k-th most recent fix (0: last one) as (ts, lat, lon, alt, speed)
+    def fix(self, k=0):
+        if k >= len(self): raise IndexError(k)
+        i = (self.count-1-k) % self.cap
+        sp = self.speed[i]
+        return((self.ts[i], self.lat[i], self.lon[i], self.alt[i], None if sp == NOSPEED else sp))
+
+    # fixes from the oldest to the last one
+    def fixes(self):
+        for k in range(len(self)-1, -1, -1):
+            yield(self.fix(k))
+
+    # oldest fix of the window
+    def windowStart(self):
+        return(self.fix(self.count-1-self.wseq))
+
+    # True when the window is fully observed: the buffer still holds
+    # a fix older than the window start
+    def covered(self):
+        return(self.span > 0 and self.wseq > self.count - len(self))
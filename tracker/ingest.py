@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# ingest.py
+# streaming ingestion of the FFVL tracker JSON payload
+#
+# The feed is an object { "<id>": { "pseudo": ..., "last_latitude": "45.3", ...}, ...}
+# (or a list of such objects). It is parsed incrementally from the byte
+# chunks received (memory bounded by the chunks, not the payload), and each
+# tracker gives one Fix record whose numeric fields are converted once, here.
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import re
+import json
+import codecs
+from collections import namedtuple
+
+
+# one position of a tracker, speed is None when not reported
+Fix = namedtuple('Fix', ['pseudo', 'lat', 'lon', 'alt', 'speed', 'ts'])
+
+WS = ' \t\n\r'
+# before a value: separator, and key in an object (group 1)
+NEXT = re.compile(r'[ \t\n\r]*,?[ \t\n\r]*(?:("(?:[^"\\]|\\.)*")[ \t\n\r]*:[ \t\n\r]*)?')
+NUMBER = '0123456789.eE+-'
+
+
+# ------------------------------------------------------------------------------
+# convert a raw feed record, None if unusable
+# ------------------------------------------------------------------------------
+def makeFix(el):
+
+    try:
+        speed = el.get('last_h_speed')
+        if speed is None or speed == '':
+            speed = None
+        else:
+            speed = int(float(speed))
+        return(Fix(el['pseudo'], float(el['last_latitude']), float(el['last_longitude']), \
+            int(float(el['last_altitude'])), speed, int(el['last_position_utc_timestamp_unix'])))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return(None)
+
+
+# ------------------------------------------------------------------------------
+# yield the tracker objects of the payload, from an iterable of byte chunks
+# ------------------------------------------------------------------------------
+def iterObjects(chunks):
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    eof = 0
+
+    # get more text, returns 0 at the end of the stream
+    def more():
+        nonlocal buf, pos, eof
+        if eof: return(0)
+        try:
+            data = utf8.decode(next(chunks))
+        except StopIteration:
+            data = utf8.decode(b'', final=True)
+            eof = 1
+        buf = buf[pos:] + data
+        pos = 0
+        return(1)
+
+    # first significant char
+    while True:
+        while pos < len(buf) and buf[pos] in WS: pos += 1
+        if pos < len(buf): break
+        if not more(): return
+    if buf[pos] == '[':
+        (closing, keyed) = (']', 0)
+    elif buf[pos] == '{':
+        (closing, keyed) = ('}', 1)
+    else:
+        raise ValueError("unexpected feed content")
+    pos += 1
+
+    # one match and one raw_decode per tracker (a number at the end of
+    # the text may be cut: decoded again with more text)
+    while True:
+        m = NEXT.match(buf, pos)
+        end = m.end()
+        c = buf[end:end+1]
+        if c == closing and not m.group(1):
+            return
+        if c and (m.group(1) or not keyed):
+            try:
+                (val, stop) = decoder.raw_decode(buf, end)
+                if eof or not isinstance(val, (int, float)) or \
+                    (stop < len(buf) and buf[stop] not in NUMBER):
+                    pos = stop
+                    yield(val)
+                    continue
+            except ValueError:
+                pass
+        if not more(): raise ValueError("invalid or truncated feed content")
+
+
+# ------------------------------------------------------------------------------
+# yield the Fix records of the payload (unusable records are counted in
+# stats['bad'] if a dict is given)
+# ------------------------------------------------------------------------------
+def iterFixes(chunks, stats=None):
+
+    for el in iterObjects(chunks):
+        fix = makeFix(el) if isinstance(el, dict) else None
+        if fix is None:
+            if stats is not None: stats['bad'] = stats.get('bad', 0) + 1
+            continue
+        yield(fix)
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# journal.py
+# crash-safe persistence of the pilot table
+#
+#   <file>           snapshot: { pseudo: state, ... } (written atomically)
+#   <file>.journal   append-only, one line per change: {"p": pseudo, "s": state}
+#                    ({"p": pseudo, "s": null} removes a pilot)
+#
+# Changes are appended and flushed at each commit, synced to disk
+# according to the sync policy ('always', 'cycle' or 'never'), and the
+# journal is compacted into a new snapshot when it grows too long.
+# Loading = read the snapshot, replay the journal (a torn last line,
+# from a crash during a write, is ignored).
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import os
+import json
+
+
+class Journal:
+    def __init__(self, path, sync='cycle', maxLines=5000):
+        self.path = path
+        self.jpath = path + '.journal'
+        self.sync = sync
+        self.maxLines = maxLines
+        self.fd = None
+        self.lines = 0          # entries in the journal file
+        self.pending = 0        # entries not synced yet
+
+    # read snapshot + journal, returns the table
+    def load(self):
+        table = {}
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'r') as in_file:
+                table = json.load(in_file)
+        self.lines = 0
+        torn = 0
+        if os.path.isfile(self.jpath):
+            with open(self.jpath, 'r') as in_file:
+                for line in in_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        torn += 1
+                        continue
+                    if entry['s'] is None:
+                        table.pop(entry['p'], None)
+                    else:
+                        table[entry['p']] = entry['s']
+                    self.lines += 1
+        self.torn = torn
+        return(table)
+
+    # append the new state of a pilot (None: pilot removed)
+    def record(self, pseudo, state):
+        if self.fd is None:
+            self.fd = open(self.jpath, 'a')
+        self.fd.write(json.dumps({'p': pseudo, 's': state}, separators=(',', ':')) + '\n')
+        self.lines += 1
+        self.pending += 1
+        if self.sync == 'always': self.flush(1)
+
+    # end of a batch of changes
+    # getTable: returns the full table (called only to compact)
+    def commit(self, getTable):
+        if self.lines > self.maxLines:
+            self.compact(getTable())
+        elif self.pending:
+            self.flush(self.sync != 'never')
+
+    def flush(self, dosync):
+        if self.fd is None: return()
+        self.fd.flush()
+        if dosync: os.fsync(self.fd.fileno())
+        self.pending = 0
+
+    # write the full table as the new snapshot, empty the journal
+    def compact(self, table):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as out_file:
+            json.dump(table, out_file, separators=(',', ':'))
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(tmp, self.path)
+        syncDir(self.path)
+        # the snapshot holds everything, the journal can go
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+        with open(self.jpath, 'w') as out_file:
+            pass
+        self.lines = 0
+        self.pending = 0
+
+    def close(self):
+        if self.fd is not None:
+            self.flush(self.sync != 'never')
+            self.fd.close()
+            self.fd = None
+
+
+# ------------------------------------------------------------------------------
+# make a rename durable
+# ------------------------------------------------------------------------------
+def syncDir(path):
+
+    try:
+        dfd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return()
+    try:
+        os.fsync(dfd)
+    except OSError:
+        pass
+    finally:
+        os.close(dfd)
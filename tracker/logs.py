@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# logs.py
+# log backend of the tracker
+#
+# Messages are put in a queue by the caller and written by a background
+# thread (logging.handlers.QueueListener): the tracking loop never waits
+# for the disk or the terminal.
+#   - levels: per-pilot traces are DEBUG and dropped (not even formatted)
+#     unless the level is DEBUG
+#   - lazy formatting: printlog("Step= %s", distm)
+#   - rotation by size (maxBytes) or time (when = 'midnight', 'H'...),
+#     the log file is kept between runs
+#   - optional compact JSON lines: {"t":..., "lvl":..., "msg":...}
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import sys
+import json
+import atexit
+import queue
+import logging
+import logging.handlers
+from datetime import datetime
+
+LOG = logging.getLogger('tracker')
+LOG.propagate = False
+listener = None
+current = ('INFO', 1)       # (level, console) of the last setup
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'t': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                 'lvl': record.levelname, 'msg': record.getMessage()}
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return(json.dumps(entry, separators=(',', ':'), ensure_ascii=False))
+
+
+# ------------------------------------------------------------------------------
+# (re)start the log backend
+# path    : log file ('' : no file)
+# level   : 'DEBUG', 'INFO', 'WARNING'...
+# maxBytes: size rotation (0: none)
+# backups : rotated files kept
+# when    : time rotation ('midnight', 'H', 'D'..., '' : none), wins over size
+# jsonl   : 1 for JSON lines in the file
+# console : 1 to copy the messages to stdout (plain text)
+# ------------------------------------------------------------------------------
+def setup(path, level='INFO', maxBytes=5000000, backups=5, when='', jsonl=0, console=1):
+
+    global listener, current
+
+    stop()
+    current = (level, console)
+    handlers = []
+    if path:
+        if when:
+            fh = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups, \
+                encoding='utf-8')
+        else:
+            fh = logging.handlers.RotatingFileHandler(path, maxBytes=maxBytes, backupCount=backups, \
+                encoding='utf-8')
+        fh.setFormatter(JsonFormatter() if jsonl else logging.Formatter('%(message)s'))
+        handlers.append(fh)
+    if console:
+        ch = logging.StreamHandler(sys.stdout)
+        ch.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(ch)
+
+    que = queue.SimpleQueue()
+    for h in LOG.handlers[:]:
+        LOG.removeHandler(h)
+    LOG.addHandler(logging.handlers.QueueHandler(que))
+    LOG.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    listener = logging.handlers.QueueListener(que, *handlers)
+    listener.start()
+
+# ------------------------------------------------------------------------------
+# write what is queued and stop the background thread
+# ------------------------------------------------------------------------------
+def stop():
+
+    global listener
+
+    if listener is not None:
+        listener.stop()
+        for h in listener.handlers:
+            h.close()
+        listener = None
+
+# messages still queued are written at exit
+atexit.register(stop)
@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# metrics.py
+# instrumentation of the tracking cycles
+#
+# Each cycle is split in timed stages:
+#   fetch    : waiting for the feed (network)
+#   decode   : payload decoding (JSON -> ingest.Fix)
+#   parse    : dispatch to the groups and update of the pilots
+#   evaluate : status of the pilots with a new log, timers due (log
+#              delay, eviction)
+#   persist  : pilot journal and feed cursor on disk
+#   render   : snapshot for the front end and GUI table update
+#   alert    : alert dispatch (queued, delivery is done by alerts.py)
+# with counts (records received and kept, payload bytes, pilots tracked,
+# alarms) and the memory of the process (RSS).
+# The last cycles are kept in memory (rolling history), shown by the GUI
+# status strip, logged, and served in Prometheus text format:
+#      curl http://127.0.0.1:9108/metrics
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+STAGES = ('fetch', 'decode', 'parse', 'evaluate', 'persist', 'render', 'alert')
+COUNTS = ('records', 'kept', 'bytes', 'pilots', 'alarms', 'rss')
+
+
+# memory of the process (bytes), 0 if unknown
+def rss():
+    try:
+        with open('/proc/self/statm', 'r') as in_file:
+            return(int(in_file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # peak, not current: the best we have without /proc (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return(peak if sys.platform == 'darwin' else peak * 1024)
+    except (ImportError, OSError):
+        return(0)
+
+
+# ------------------------------------------------------------------------------
+# one tracking cycle
+# ------------------------------------------------------------------------------
+class Cycle:
+    __slots__ = ('start', 'wall', 'period', 'duration', 'stages', 'counts')
+
+    def __init__(self, period=None):
+        self.start = time.perf_counter()
+        self.wall = time.time()
+        self.period = period            # refresh period (budget of the cycle)
+        self.duration = None
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(COUNTS, 0)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name, n):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def total(self):
+        return(self.duration if self.duration is not None else time.perf_counter()-self.start)
+
+    # the cycle takes more than the refresh period
+    def late(self):
+        return(bool(self.period) and self.total() > self.period)
+
+    def text(self):
+        total = self.total()
+        out = "cycle %.2fs" % total
+        if self.period:
+            out += " (%d%% of %ds)" % (100*total/self.period, self.period)
+        out += ": " + " ".join("%s %.3f" % (s, self.stages[s]) for s in STAGES)
+        c = self.counts
+        out += " | %d/%d logs, %d kB, %d pilots, %d alarms, RSS %d MB" % \
+            (c['kept'], c['records'], c['bytes']//1000, c['pilots'], c['alarms'], c['rss']//1000000)
+        return(out)
+
+
+# ------------------------------------------------------------------------------
+# rolling history of the cycles (thread safe)
+# size: cycles kept
+# ------------------------------------------------------------------------------
+class Metrics:
+    def __init__(self, size=360):
+        self.lock = threading.Lock()
+        self.cycles = deque(maxlen=size)
+        self.ncycles = 0
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        self.totalTime = 0.0
+
+    def resize(self, size):
+        with self.lock:
+            if size != self.cycles.maxlen:
+                self.cycles = deque(self.cycles, maxlen=size)
+
+    def begin(self, period=None):
+        return(Cycle(period))
+
+    # cycle done (render time may still be added by note())
+    def end(self, cycle):
+        cycle.duration = time.perf_counter() - cycle.start
+        cycle.counts['rss'] = rss()
+        with self.lock:
+            self.cycles.append(cycle)
+            self.ncycles += 1
+            self.totalTime += cycle.duration
+            for s in cycle.stages:
+                self.totals[s] = self.totals.get(s, 0.0) + cycle.stages[s]
+
+    # stage time spent after the end of the last cycle (render)
+    def note(self, stage, seconds):
+        with self.lock:
+            if not self.cycles: return()
+            cycle = self.cycles[-1]
+            cycle.add(stage, seconds)
+            cycle.duration += seconds
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            self.totalTime += seconds
+
+    def last(self):
+        with self.lock:
+            return(self.cycles[-1] if self.cycles else None)
+
+    def history(self):
+        with self.lock:
+            return(list(self.cycles))
+
+    # --------------------------------------------------------------------------
+    # Prometheus text exposition format (version 0.0.4)
+    # --------------------------------------------------------------------------
+    def prometheus(self):
+        with self.lock:
+            cycles = list(self.cycles)
+            (ncycles, totals, totalTime) = (self.ncycles, dict(self.totals), self.totalTime)
+        out = []
+        def metric(name, kind, help, samples):
+            out.append("# HELP %s %s" % (name, help))
+            out.append("# TYPE %s %s" % (name, kind))
+            for (labels, value) in samples:
+                out.append("%s%s %s" % (name, labels, repr(float(value)) if isinstance(value, float) else value))
+
+        metric('tracker_cycles_total', 'counter', "Tracking cycles done", [('', ncycles)])
+        metric('tracker_stage_seconds_total', 'counter', "Time spent in each stage of the cycles", \
+            [('{stage="%s"}' % s, totals.get(s, 0.0)) for s in STAGES])
+        durations = sorted(c.duration for c in cycles)
+        samples = []
+        for q in (0.5, 0.9, 0.99):
+            if durations:
+                samples.append(('{quantile="%s"}' % q, durations[min(len(durations)-1, int(q*len(durations)))]))
+        samples.append(('_sum', totalTime))
+        samples.append(('_count', ncycles))
+        out.append("# HELP tracker_cycle_seconds Duration of the tracking cycles (quantiles over the last %d)" \
+            % len(cycles))
+        out.append("# TYPE tracker_cycle_seconds summary")
+        for (labels, value) in samples:
+            out.append("tracker_cycle_seconds%s %s" % (labels, value))
+        if cycles:
+            last = cycles[-1]
+            metric('tracker_last_cycle_seconds', 'gauge', "Duration of each stage of the last cycle", \
+                [('{stage="%s"}' % s, last.stages.get(s, 0.0)) for s in STAGES])
+            metric('tracker_last_cycle_timestamp_seconds', 'gauge', "Start of the last cycle", [('', last.wall)])
+            metric('tracker_records', 'gauge', "Feed records of the last cycle", \
+                [('{kind="received"}', last.counts['records']), ('{kind="kept"}', last.counts['kept'])])
+            metric('tracker_payload_bytes', 'gauge', "Payload size of the last cycle", [('', last.counts['bytes'])])
+            metric('tracker_pilots', 'gauge', "Pilots tracked", [('', last.counts['pilots'])])
+            metric('tracker_alarms', 'gauge', "Pilots in alarm", [('', last.counts['alarms'])])
+        metric('process_resident_memory_bytes', 'gauge', "Resident memory size", [('', rss())])
+        return("\n".join(out) + "\n")
+
+
+# ------------------------------------------------------------------------------
+# HTTP endpoint: GET /metrics (local only by default)
+# ------------------------------------------------------------------------------
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, metrics, addr=('127.0.0.1', 9108)):
+        ThreadingHTTPServer.__init__(self, addr, MetricsHandler)
+        self.metrics = metrics
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="tracker-metrics", daemon=True).start()
+        return("http://%s:%d/metrics" % self.server_address[:2])
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# params.py
+# compiled parameters of the tracker
+#
+# config['parameters'] holds strings (as typed in the GUI). They are
+# checked and converted once, when the config is loaded, into a frozen
+# object: the engine reads plain attributes (P.VitMinDeco is an int)
+# and a bad value is reported at load time, not in the middle of a cycle.
+#
+# The schema is derived from the default parameters:
+#   radio       -> one of its list
+#   chkb        -> 0/1
+#   default int -> int, default float -> float, else str
+# unless a type is given explicitly (see schema).
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+
+class Params:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("parameters are read-only (" + name + ")")
+
+    def __delattr__(self, name):
+        raise AttributeError("parameters are read-only (" + name + ")")
+
+    def __repr__(self):
+        return("Params(" + ", ".join(k + "=" + repr(getattr(self, k)) for k in self.__slots__) + ")")
+
+
+# ------------------------------------------------------------------------------
+# schema of the parameters: { name: (kind, arg) }
+#   kind: 'int', 'float', 'str', 'bool', 'choice' (arg: allowed values),
+#         'coord' (float, None if blank; arg: max absolute value),
+#         'ints' (tuple of ints separated by spaces)
+# defparams: default parameters (config['parameters'] of the defaults)
+# types    : explicit kinds { name: (kind, arg) }
+# ------------------------------------------------------------------------------
+def schema(defparams, types=None):
+
+    sch = {}
+    for (name, elem) in defparams.items():
+        if types and name in types:
+            sch[name] = types[name]
+        elif elem.get('method') == 'radio':
+            sch[name] = ('choice', tuple(elem['list']))
+        elif elem.get('method') == 'chkb':
+            sch[name] = ('bool', None)
+        elif isInt(elem['def']):
+            sch[name] = ('int', 0)
+        elif isFloat(elem['def']):
+            sch[name] = ('float', 0)
+        else:
+            sch[name] = ('str', None)
+    return(sch)
+
+def isInt(s):
+    try:
+        int(s)
+        return(True)
+    except (TypeError, ValueError):
+        return(False)
+
+def isFloat(s):
+    try:
+        float(s)
+        return(True)
+    except (TypeError, ValueError):
+        return(False)
+
+
+# ------------------------------------------------------------------------------
+# convert one value, raises ValueError if it does not fit
+# ('int'/'float'/'ints' arg: minimum value)
+# ------------------------------------------------------------------------------
+def convert(kind, arg, val):
+
+    if kind == 'str':
+        return(str(val))
+    sval = str(val).strip()
+    if kind == 'int':
+        v = int(sval)
+        if v < arg: raise ValueError("less than " + str(arg))
+        return(v)
+    if kind == 'float':
+        v = float(sval)
+        if v != v or v < arg: raise ValueError("less than " + str(arg))
+        return(v)
+    if kind == 'bool':
+        if sval not in ('0', '1'): raise ValueError("0 or 1 expected")
+        return(int(sval))
+    if kind == 'choice':
+        if sval not in arg: raise ValueError("one of " + "/".join(arg) + " expected")
+        return(sval)
+    if kind == 'ints':
+        v = tuple(int(x) for x in sval.split())
+        if [x for x in v if x < arg]: raise ValueError("less than " + str(arg))
+        return(v)
+    if kind == 'coord':
+        if sval == '': return(None)
+        v = float(sval)
+        if not -arg <= v <= arg: raise ValueError("out of range")
+        return(v)
+    raise ValueError("unknown kind " + kind)
+
+
+# ------------------------------------------------------------------------------
+# compile the parameters
+# parameters: config['parameters'] ({ name: {'def','value'...} })
+# sch       : schema()
+# over      : values overriding 'value' (watch group), optional
+# returns (Params, errors): errors is a list of messages, a bad value is
+# replaced by its default
+# ------------------------------------------------------------------------------
+def compileParams(parameters, sch, over=None):
+
+    cls = classFor(tuple(sch))
+    obj = object.__new__(cls)
+    errors = []
+    for (name, (kind, arg)) in sch.items():
+        elem = parameters.get(name, {})
+        dflt = elem.get('def', '')
+        val = dflt
+        if len(str(elem.get('value', ''))): val = elem['value']
+        if over and name in over: val = over[name]
+        try:
+            v = convert(kind, arg, val)
+        except (TypeError, ValueError) as e:
+            errors.append(name + ": bad value '" + str(val) + "' (" + str(e) + ")")
+            try:
+                v = convert(kind, arg, dflt)
+            except (TypeError, ValueError):
+                v = None
+        object.__setattr__(obj, name, v)
+    return((obj, errors))
+
+
+# one class per set of parameter names (slots are fixed at class creation)
+CLASSES = {}
+
+def classFor(names):
+
+    if names not in CLASSES:
+        CLASSES[names] = type('Params', (Params,), {'__slots__': names})
+    return(CLASSES[names])
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# pilot.py
+# state of a tracked pilot (items of engine.PilotsStatus)
+#
+# Slotted record holding the domain state only, with typed fields:
+#   name, surname    : from the pilot list ('-' if unknown)
+#   takeoff, landed, cleared : flags (0/1)
+#   lat, lon, alt    : last position (float, float, int)
+#   postime          : timestamp of the last log (int)
+#   step             : move (m) from the previous log
+#   speed            : last horizontal speed reported (None: never)
+#   d2atter          : distance (km) to the landing spot at the first log
+#                      (None: spot undefined)
+#   new              : 1 until the second log
+#   spot             : nearest known landing spot (None: none in range)
+# evaluated by engine.checkPilot, not saved:
+#   status           : Status
+#   late             : 1 if the last log is older than delaiLogMax
+#
+# Texts and colors are chosen by the front end (tracker.py).
+# Saved as a list in FIELDS order; backups of older versions (dicts
+# with 'last_lat', 'TakeOff'... keys) are still read.
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+from enum import IntEnum
+
+
+class Status(IntEnum):
+    GROUND = 0          # not flying yet
+    FLYING = 1
+    ALERT  = 2          # landed, not cleared
+    SAFE   = 3          # cleared
+
+
+# saved fields, in order
+FIELDS = ('name', 'surname', 'takeoff', 'landed', 'cleared', 'lat', 'lon', 'alt', 'postime', \
+    'step', 'speed', 'd2atter', 'new', 'spot')
+
+# keys of the older dict backups
+OLDKEYS = { 'Name': 'name', 'Surname': 'surname', 'TakeOff': 'takeoff', 'Landed': 'landed', \
+    'Cleared': 'cleared', 'last_lat': 'lat', 'last_lon': 'lon', 'last_alt': 'alt', \
+    'last_postime': 'postime', 'last_dist': 'step', 'last_h_speed': 'speed', 'd2atter': 'd2atter', \
+    'new': 'new', 'spot': 'spot' }
+
+
+class Pilot:
+    __slots__ = FIELDS + ('status', 'late')
+
+    def __init__(self, name='-', surname='-', lat=0.0, lon=0.0, alt=0, postime=0, speed=None, d2atter=None):
+        self.name = name
+        self.surname = surname
+        self.takeoff = 0
+        self.landed = 0
+        self.cleared = 0
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.postime = postime
+        self.step = 0
+        self.speed = speed
+        self.d2atter = d2atter
+        self.new = 1
+        self.spot = None
+        self.status = Status.GROUND
+        self.late = 0
+
+    def copy(self):
+        other = Pilot.__new__(Pilot)
+        for k in Pilot.__slots__:
+            setattr(other, k, getattr(self, k))
+        return(other)
+
+    # saved form
+    def saved(self):
+        return([getattr(self, k) for k in FIELDS])
+
+    def __repr__(self):
+        return("Pilot(" + ", ".join("%s=%r" % (k, getattr(self, k)) for k in Pilot.__slots__) + ")")
+
+
+# ------------------------------------------------------------------------------
+# pilot from the saved form of this version, as sent by a shard process
+# (values already typed, see shards.py)
+# ------------------------------------------------------------------------------
+def fromList(values, status, late):
+
+    ps = Pilot.__new__(Pilot)
+    (ps.name, ps.surname, ps.takeoff, ps.landed, ps.cleared, ps.lat, ps.lon, ps.alt, ps.postime, \
+        ps.step, ps.speed, ps.d2atter, ps.new, ps.spot) = values
+    (ps.status, ps.late) = (Status(status), late)
+    return(ps)
+
+
+# ------------------------------------------------------------------------------
+# pilot from its saved form (list, or dict of an older version)
+# raises ValueError/TypeError/KeyError if unusable
+# ------------------------------------------------------------------------------
+def fromSaved(obj):
+
+    ps = Pilot()
+    if isinstance(obj, dict):
+        for (k, v) in obj.items():
+            if k in OLDKEYS: setattr(ps, OLDKEYS[k], v)
+    else:
+        for (k, v) in zip(FIELDS, obj):
+            setattr(ps, k, v)
+    # older backups hold strings, and '-' for unknown values
+    ps.lat = float(ps.lat)
+    ps.lon = float(ps.lon)
+    ps.alt = int(ps.alt)
+    ps.postime = int(ps.postime)
+    (ps.takeoff, ps.landed, ps.cleared, ps.new) = (int(ps.takeoff), int(ps.landed), int(ps.cleared), int(ps.new))
+    if ps.speed == '-': ps.speed = None
+    if ps.d2atter == '-': ps.d2atter = None
+    return(ps)
@@ -0,0 +1,350 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# replay.py
+# record and replay of the FFVL tracker feed
+#
+# recording: JSON lines, one per feed response (.gz: compressed)
+#      {"t": fetch time, "from": ..., "to": ..., "body": "<payload>"}
+#   made by the engine (FeedRecord parameter) or by:
+#      replay.py record -o day.jsonl.gz [-period 60] [-count N]
+#
+# stand-in of the FFVL API: serves the recorded positions back, at any
+# path, for from_utc_timestamp/to_utc_timestamp queries (latest position
+# of each tracker in the window, none after the replay clock):
+#      replay.py serve day.jsonl.gz [-port 8765] [-speed 10]
+#
+# replay through the engine, in-process, with an accelerated clock
+# (stand-in on localhost, cycles on the adaptive period of the engine
+# in recorded time, see engine.cyclePeriod, no waiting between cycles):
+#      replay.py run day.jsonl.gz [-home DIR] [-set Param=value ...]
+#                [-decisions out.jsonl] [-compare ref.jsonl]
+#   prints the cycle latency (fetch + parse), writes the alert decisions
+#   of each cycle, and compares them with those of another run.
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import gzip
+import json
+import time
+import bisect
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import ingest
+
+
+def openFile(path, mode):
+    if path.endswith('.gz'):
+        return(gzip.open(path, mode + 't', encoding='utf-8'))
+    return(open(path, mode, encoding='utf-8'))
+
+
+# ------------------------------------------------------------------------------
+# append feed responses to a recording
+# ------------------------------------------------------------------------------
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.fd = openFile(path, 'a')
+        self.lock = threading.Lock()
+
+    def write(self, t, frm, to, body):
+        if isinstance(body, bytes): body = body.decode('utf-8', errors='replace')
+        line = json.dumps({'t': t, 'from': frm, 'to': to, 'body': body}, separators=(',', ':'))
+        with self.lock:
+            self.fd.write(line + '\n')
+            self.fd.flush()
+
+    def close(self):
+        self.fd.close()
+
+# records of a recording file
+def readRecording(path):
+    with openFile(path, 'r') as in_file:
+        try:
+            for line in in_file:
+                try:
+                    yield(json.loads(line))
+                except ValueError:
+                    continue            # torn last line
+        except EOFError:
+            return                      # compressed file cut by a crash
+
+
+# ------------------------------------------------------------------------------
+# all the positions of a recording, per tracker and in time order
+# ------------------------------------------------------------------------------
+class Timeline:
+    def __init__(self):
+        self.ts = {}                    # pseudo -> [ts, ...] (sorted)
+        self.objs = {}                  # pseudo -> [raw record, ...]
+        self.start = None
+        self.end = None
+
+    def add(self, obj):
+        fix = ingest.makeFix(obj)
+        if fix is None: return()
+        tl = self.ts.setdefault(fix.pseudo, [])
+        ol = self.objs.setdefault(fix.pseudo, [])
+        i = bisect.bisect_right(tl, fix.ts)
+        if i and tl[i-1] == fix.ts: return()           # same log seen again
+        tl.insert(i, fix.ts)
+        ol.insert(i, obj)
+        if self.start is None or fix.ts < self.start: self.start = fix.ts
+        if self.end is None or fix.ts > self.end: self.end = fix.ts
+
+    def load(self, path):
+        for rec in readRecording(path):
+            for obj in ingest.iterObjects([rec['body'].encode('utf-8')]):
+                if isinstance(obj, dict): self.add(obj)
+        return(self)
+
+    # latest position of each tracker with frm <= ts <= min(to, now)
+    def query(self, frm, to=None, now=None):
+        hi = to
+        if now is not None and (hi is None or now < hi): hi = now
+        out = []
+        for p in self.ts:
+            tl = self.ts[p]
+            i = len(tl) if hi is None else bisect.bisect_right(tl, hi)
+            if i and tl[i-1] >= frm:
+                out.append(self.objs[p][i-1])
+        return(out)
+
+    def __len__(self):
+        return(sum(len(tl) for tl in self.ts.values()))
+
+
+# ------------------------------------------------------------------------------
+# replay clock: time = start + (real time elapsed) * speed, or set by hand
+# ------------------------------------------------------------------------------
+class ReplayClock:
+    def __init__(self, start, speed=0):
+        self.t = float(start)
+        self.speed = speed
+        self.real0 = time.monotonic()
+
+    def __call__(self):
+        if self.speed:
+            return(self.t + (time.monotonic()-self.real0) * self.speed)
+        return(self.t)
+
+    def set(self, t):
+        self.t = float(t)
+        self.real0 = time.monotonic()
+
+
+# ------------------------------------------------------------------------------
+# stand-in of the FFVL API
+# ------------------------------------------------------------------------------
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'           # keep-alive, as the real server
+
+    def do_GET(self):
+        q = parse_qs(urlparse(self.path).query)
+        try:
+            frm = int(q['from_utc_timestamp'][0])
+            to = int(q['to_utc_timestamp'][0]) if 'to_utc_timestamp' in q else None
+        except (KeyError, ValueError):
+            self.send_error(400, "from_utc_timestamp missing")
+            return
+        objs = self.server.timeline.query(frm, to, int(self.server.clock()))
+        body = json.dumps({str(i): o for (i, o) in enumerate(objs)}, separators=(',', ':')).encode()
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, timeline, clock, addr=('127.0.0.1', 0)):
+        ThreadingHTTPServer.__init__(self, addr, FeedHandler)
+        self.timeline = timeline
+        self.clock = clock
+        self.requests = 0
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return("http://%s:%d/api/?mode=json&from_utc_timestamp=" % self.server_address[:2])
+
+
+# ------------------------------------------------------------------------------
+# alert decisions of a replay (stands for alerts.Dispatcher)
+# ------------------------------------------------------------------------------
+class DecisionLog:
+    def __init__(self):
+        self.cycle = None
+        self.entries = []
+
+    def submit(self, group, alarms, channels, repeat=(), title=''):
+        self.entries.append({'t': self.cycle, 'group': group, 'alarms': sorted(alarms)})
+        return(0)
+
+    def stop(self):
+        pass
+
+
+# ------------------------------------------------------------------------------
+# record the live feed
+# ------------------------------------------------------------------------------
+def record(out, period, count):
+
+    import engine
+    engine.initEngine()
+    rec = Recorder(out)
+    frm = int(time.time()) - 60
+    n = 0
+    try:
+        while count == 0 or n < count:
+            t = int(time.time())
+            url = engine.P.ffvl_url + str(frm)
+            body = b''.join(engine.session.stream(url))
+            if engine.session.status == 200:
+                rec.write(t, frm, None, body)
+                frm = t - engine.P.FeedOverlap
+                n += 1
+                print("%d responses recorded (%d bytes)" % (n, len(body)))
+            time.sleep(period)
+    except KeyboardInterrupt:
+        pass
+    rec.close()
+
+
+# ------------------------------------------------------------------------------
+# serve a recording, clock starting at its first position
+# ------------------------------------------------------------------------------
+def serve(path, port, speed):
+
+    tl = Timeline().load(path)
+    clock = ReplayClock(tl.start or time.time(), speed)
+    server = FeedServer(tl, clock, ('127.0.0.1', port))
+    print("%d positions, %d trackers, serving on %s (x%g)" % (len(tl), len(tl.ts), server.start().split('?')[0], speed))
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+# ------------------------------------------------------------------------------
+# replay a recording through the engine
+# home     : HOME of the tracker config (None: fresh temporary one)
+# settings : { parameter: value } set before starting
+# returns (decisions, latencies)
+# ------------------------------------------------------------------------------
+def run(path, home=None, settings=None, timeline=None, quiet=True):
+
+    tl = timeline if timeline is not None else Timeline().load(path)
+    if tl.start is None:
+        print("empty recording")
+        return(([], []))
+    if home is None:
+        home = tempfile.mkdtemp(prefix='tracker-replay-')
+    os.environ['HOME'] = home
+
+    import engine
+    import logs
+    clock = ReplayClock(tl.start)
+    engine.Clock = clock
+    engine.initEngine()
+    if quiet:
+        logs.setup(engine.FILES['log'], level='WARNING', console=0)
+    server = FeedServer(tl, clock)
+    engine.config['parameters']['ffvl_url']['value'] = server.start()
+    for (k, v) in (settings or {}).items():
+        engine.config['parameters'][k]['value'] = v
+    engine.startSession()
+    engine.Alerts.stop()
+    decisions = DecisionLog()
+    engine.Alerts = decisions
+
+    latencies = []
+    t = tl.start
+    while t <= tl.end + engine.P.RefreshPeriod:
+        clock.set(t)
+        decisions.cycle = int(t)
+        t0 = time.perf_counter()
+        engine.fetchAndParse()
+        latencies.append(time.perf_counter()-t0)
+        with engine.stateLock:
+            engine.Period = engine.cyclePeriod()
+        t += engine.Period
+    server.shutdown()
+    engine.Clock = time.time
+    return((decisions.entries, latencies))
+
+def percentile(values, q):
+    if not values: return(0)
+    s = sorted(values)
+    return(s[min(len(s)-1, int(q*len(s)))])
+
+# differences between two decision lists, as text lines
+def compare(ref, new):
+    diffs = []
+    refd = {(e['t'], e['group']): e['alarms'] for e in ref}
+    newd = {(e['t'], e['group']): e['alarms'] for e in new}
+    for k in sorted(set(refd) | set(newd)):
+        if refd.get(k) != newd.get(k):
+            diffs.append("t=%s group=%s: %s -> %s" % (k[0], k[1], refd.get(k), newd.get(k)))
+    return(diffs)
+
+
+# ------------------------------------------------------------------------------
+# -----------------------------
+#   MAIN PROGRAM
+# -----------------------------
+# ------------------------------------------------------------------------------
+def option(name, default=None):
+    if name in sys.argv:
+        return(sys.argv[sys.argv.index(name)+1])
+    return(default)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ('record', 'serve', 'run'):
+        print("usage: %s record -o FILE [-period S] [-count N]" % sys.argv[0])
+        print("       %s serve FILE [-port P] [-speed X]" % sys.argv[0])
+        print("       %s run FILE [-home DIR] [-set Param=value ...] [-decisions OUT] [-compare REF]" % sys.argv[0])
+        exit(1)
+    cmd = sys.argv[1]
+    if cmd == 'record':
+        record(option('-o', 'feed.jsonl.gz'), int(option('-period', '60')), int(option('-count', '0')))
+    elif cmd == 'serve':
+        serve(sys.argv[2], int(option('-port', '8765')), float(option('-speed', '1')))
+    else:
+        settings = {}
+        for i in range(len(sys.argv)):
+            if sys.argv[i] == '-set':
+                (k, v) = sys.argv[i+1].split('=', 1)
+                settings[k] = v
+        t0 = time.perf_counter()
+        (decisions, lat) = run(sys.argv[2], option('-home'), settings)
+        total = time.perf_counter()-t0
+        print("%d cycles replayed in %.2fs" % (len(lat), total))
+        if lat:
+            print("cycle latency: mean %.1f ms  p50 %.1f ms  p95 %.1f ms  max %.1f ms" % \
+                (1000*sum(lat)/len(lat), 1000*percentile(lat, .5), 1000*percentile(lat, .95), 1000*max(lat)))
+        print("%d alarm decisions (%d with pilots)" % (len(decisions), len([d for d in decisions if d['alarms']])))
+        out = option('-decisions')
+        if out:
+            with open(out, 'w') as out_file:
+                for d in decisions: out_file.write(json.dumps(d) + '\n')
+        ref = option('-compare')
+        if ref:
+            with open(ref, 'r') as in_file:
+                refd = [json.loads(line) for line in in_file if line.strip()]
+            diffs = compare(refd, decisions)
+            print("decisions identical to " + ref if not diffs else "%d differences with %s:" % (len(diffs), ref))
+            for d in diffs[:50]: print("  " + d)
+            if diffs: exit(2)
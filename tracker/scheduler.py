@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# scheduler.py
+# cadence of the tracking cycles
+#
+# The cycles start on a grid anchored to a monotonic clock: the start of
+# the next cycle is the scheduled start of the previous one plus the
+# period, whatever the time the cycle took (no drift over the day, no
+# jump when the system clock is set).
+# A cycle longer than the period is not followed by a burst of late
+# cycles: the slots missed are coalesced into one cycle, started at once
+# and put back on the grid (the others are counted as skipped).
+# The period may change at each cycle (adaptive polling, see
+# engine.cyclePeriod), the grid then restarts from the last slot.
+#
+# Timers: deadlines of the pilots (log delay, eviction), only the ones
+# due are looked at in a cycle.
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import time
+import heapq
+
+
+class Scheduler:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.slot = None            # scheduled start of the current cycle
+        self.due = None             # scheduled start of the next one
+        self.skipped = 0            # slots skipped since the start
+
+    # a cycle starts
+    def begin(self):
+        self.slot = self.due if self.due is not None else self.clock()
+
+    # the cycle is done: seconds to wait before the next one
+    def delay(self, period):
+        now = self.clock()
+        due = self.slot + period
+        if now <= due:
+            self.due = due
+            return(due - now)
+        # overrun: one cycle now, for the last slot passed
+        passed = int((now - self.slot) // period)
+        self.due = self.slot + passed * period
+        self.skipped += passed - 1
+        return(0.0)
+
+
+# ------------------------------------------------------------------------------
+# deadlines per key (timer heap)
+# set() replaces the deadline of a key: the old entry stays in the heap
+# and is dropped when it comes out (lazy removal), the heap is rebuilt
+# when it holds too many of them
+# ------------------------------------------------------------------------------
+class Timers:
+    __slots__ = ('heap', 'due')
+
+    def __init__(self):
+        self.heap = []              # (deadline, key)
+        self.due = {}               # key -> deadline
+
+    def set(self, key, t):
+        self.due[key] = t
+        heapq.heappush(self.heap, (t, key))
+        if len(self.heap) > 4*len(self.due) + 64:
+            self.heap = [(t, k) for (k, t) in self.due.items()]
+            heapq.heapify(self.heap)
+
+    def cancel(self, key):
+        self.due.pop(key, None)
+
+    # keys whose deadline is before now (removed)
+    def expired(self, now):
+        out = []
+        heap = self.heap
+        while heap and heap[0][0] < now:
+            (t, key) = heapq.heappop(heap)
+            if self.due.get(key) == t:
+                del self.due[key]
+                out.append(key)
+        return(out)
+
+    def __len__(self):
+        return(len(self.due))
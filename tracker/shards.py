@@ -0,0 +1,361 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# shards.py
+# sharded tracking (Shards parameter): the pilots are shared between
+# several processes, for the feeds too big for one (Filtrage=Aucun on a
+# busy day, the per-pilot work is bound to one core by the GIL)
+#
+# The engine process fetches and decodes the feed, and sends the fixes of
+# each pilot to its shard (crc32 of the pseudo: a pilot always goes to the
+# same shard). Each shard process is an engine of its own: groups, pilot
+# tables, timers, journals (tracker.pilots.shardK) and log
+# (tracker.log.shardK), it evaluates its pilots and returns
+#   - the alarms of each group (merged and sent by the engine process)
+#   - the records changed in the cycle (dirty set of each group)
+# the engine process keeps a copy of all the records, for the GUI, the
+# dashboard and the cycle period (see engine.mergeShards).
+#
+# Transfer: compact binary batches on the pipes of the processes
+#   fixes  : pseudos + arrays of doubles/integers (array module)
+#   reports: pickled lists of the saved fields of the records changed
+# framed by their length (4 bytes).
+#
+# A shard process stopped (crash) is started again at the next cycle, from
+# its journal; one that does not answer within ShardTimeout seconds is
+# killed and started again at once (its fixes of the cycle are lost, the
+# feed overlap brings them back).
+#      shards.py K N     (started by the engine, not by hand)
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import math
+import zlib
+import time
+import struct
+import pickle
+import select
+import threading
+import subprocess
+from array import array
+import logs
+
+HEADER = struct.Struct('<cdII')         # kind, engine time, fixes, pseudos bytes
+FRAME  = struct.Struct('<I')
+
+
+# shard of a pilot
+def shardOf(pseudo, n):
+    return(zlib.crc32(pseudo.encode()) % n)
+
+# ------------------------------------------------------------------------------
+# framing of the messages on the pipes
+# ------------------------------------------------------------------------------
+def writeFrame(out, data):
+    out.write(FRAME.pack(len(data)))
+    out.write(data)
+    out.flush()
+
+def readFrame(inp):
+    head = inp.read(FRAME.size)
+    if len(head) < FRAME.size:
+        raise EOFError("pipe closed")
+    size = FRAME.unpack(head)[0]
+    data = inp.read(size)
+    if len(data) < size:
+        raise EOFError("pipe closed")
+    return(data)
+
+# same, from a file descriptor, before a deadline (time.monotonic)
+def readFrameBefore(fd, deadline):
+    head = readBytes(fd, FRAME.size, deadline)
+    return(readBytes(fd, FRAME.unpack(head)[0], deadline))
+
+def readBytes(fd, size, deadline):
+    out = []
+    while size > 0:
+        wait = deadline - time.monotonic()
+        if wait <= 0 or not select.select([fd], [], [], wait)[0]:
+            raise TimeoutError("no answer")
+        data = os.read(fd, min(size, 1 << 20))
+        if not data:
+            raise EOFError("pipe closed")
+        out.append(data)
+        size -= len(data)
+    return(b"".join(out))
+
+# ------------------------------------------------------------------------------
+# batch of fixes (ingest.Fix) <-> bytes
+# kind: b'c' cycle, b'x' clear (one pseudo, no fix), b'r' reset, b'q' quit
+# ------------------------------------------------------------------------------
+def encodeFixes(kind, now, fixes, pseudos=None):
+    if pseudos is None: pseudos = [f.pseudo for f in fixes]
+    names = "\0".join(pseudos).encode()
+    out = [HEADER.pack(kind, now, len(fixes), len(names)), names]
+    if fixes:
+        out.append(array('d', [f.lat for f in fixes]).tobytes())
+        out.append(array('d', [f.lon for f in fixes]).tobytes())
+        out.append(array('d', [math.nan if f.speed is None else f.speed for f in fixes]).tobytes())
+        out.append(array('q', [f.alt for f in fixes]).tobytes())
+        out.append(array('q', [f.ts for f in fixes]).tobytes())
+    return(b"".join(out))
+
+# returns (kind, now, fixes, pseudos)
+def decodeFixes(data):
+    import ingest
+    (kind, now, n, size) = HEADER.unpack_from(data)
+    pos = HEADER.size
+    names = data[pos:pos+size].decode()
+    pseudos = names.split("\0") if names else []
+    pos += size
+    cols = []
+    for code in ('d', 'd', 'd', 'q', 'q'):
+        col = array(code)
+        col.frombytes(data[pos:pos+8*n])
+        cols.append(col)
+        pos += 8*n
+    (lat, lon, speed, alt, ts) = cols
+    fixes = []
+    for i in range(n):
+        sp = speed[i]
+        fixes.append(ingest.Fix(pseudos[i], lat[i], lon[i], alt[i], None if sp != sp else int(sp), ts[i]))
+    return((kind, now, fixes, pseudos))
+
+
+# ------------------------------------------------------------------------------
+# engine side: the shard processes
+# n: number of shards, files: engine.FILES, conf: engine.config
+# (the shards log with the level and console of this process, logs.current)
+# timeout: seconds to wait for the answer of a shard, log: warnings
+# The exchanges are serialized by the pool (one caller at a time), the
+# callers do not hold engine.stateLock meanwhile.
+# reports (engine.mergeShards):
+#   (k, { group: alarms }, { group: (full, [(pseudo, saved, status, late)]) },
+#    stages, counts)
+#   (saved None: pilot removed, full: all the pilots of the shard)
+# ------------------------------------------------------------------------------
+class Pool:
+    def __init__(self, n, files, conf, now, timeout=60, log=print):
+        self.n = n
+        self.files = files
+        self.conf = conf
+        self.timeout = timeout
+        self.log = log
+        self.lock = threading.Lock()
+        self.procs = [None]*n
+        self.reports = [self.start(k, now) for k in range(n)]
+
+    # start shard k, returns its first report (whole tables)
+    def start(self, k, now):
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(k), str(self.n)], \
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.procs[k] = proc
+        self.send(k, json.dumps({'files': self.files, 'config': self.conf, 'now': now, \
+            'log': logs.current}).encode())
+        return(self.read(k))
+
+    # report of shard k, killed if it does not answer in time
+    def read(self, k):
+        proc = self.procs[k]
+        try:
+            return(pickle.loads(readFrameBefore(proc.stdout.fileno(), time.monotonic() + self.timeout)))
+        except TimeoutError:
+            self.kill(k)
+            raise RuntimeError("shard "+str(k)+" not answering after "+str(self.timeout)+"s, killed")
+        except (EOFError, OSError) as e:
+            self.kill(k)
+            raise RuntimeError("shard "+str(k)+" stopped: "+str(e))
+
+    def send(self, k, data):
+        try:
+            writeFrame(self.procs[k].stdin, data)
+        except OSError as e:
+            self.kill(k)
+            raise RuntimeError("shard "+str(k)+" stopped: "+str(e))
+
+    def kill(self, k):
+        proc = self.procs[k]
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+    # the shards stopped are started again (first reports)
+    def revive(self, now):
+        reports = []
+        for k in range(self.n):
+            if self.procs[k].poll() is not None:
+                try:
+                    reports.append(self.start(k, now))
+                except RuntimeError as e:
+                    self.log(str(e))
+        return(reports)
+
+    # the reports of the shards given, a shard failing is started again
+    # (its first report instead)
+    def collect(self, ks, now):
+        reports = []
+        failed = 0
+        for k in ks:
+            try:
+                reports.append(self.read(k))
+            except RuntimeError as e:
+                self.log(str(e))
+                failed = 1
+        if failed: reports.extend(self.revive(now))
+        return(reports)
+
+    # sends a batch to the shards given, a shard failing is left to collect
+    def post(self, ks, batches):
+        for (k, data) in zip(ks, batches):
+            try:
+                self.send(k, data)
+            except RuntimeError as e:
+                self.log(str(e))
+
+    # one cycle: fixes sent to their shards, all the shards at work at
+    # the same time, then their reports
+    def cycle(self, fixes, now):
+        with self.lock:
+            reports = self.revive(now)
+            parts = [[] for k in range(self.n)]
+            for f in fixes:
+                parts[shardOf(f.pseudo, self.n)].append(f)
+            ks = range(self.n)
+            self.post(ks, [encodeFixes(b'c', now, parts[k]) for k in ks])
+            return(reports + self.collect(ks, now))
+
+    # Clear/Undo of a pilot, by its shard
+    def clear(self, p, now):
+        with self.lock:
+            k = shardOf(p, self.n)
+            reports = self.revive(now)
+            self.post([k], [encodeFixes(b'x', now, [], [p])])
+            return(reports + self.collect([k], now))
+
+    # empty tables (all the groups)
+    def reset(self, now):
+        with self.lock:
+            reports = self.revive(now)
+            ks = range(self.n)
+            self.post(ks, [encodeFixes(b'r', now, []) for k in ks])
+            return(reports + self.collect(ks, now))
+
+    def stop(self):
+        with self.lock:
+            for proc in self.procs:
+                try:
+                    writeFrame(proc.stdin, encodeFixes(b'q', 0, []))
+                    proc.stdin.close()
+                except (OSError, ValueError):
+                    pass
+            for proc in self.procs:
+                try:
+                    proc.wait(5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+
+# ------------------------------------------------------------------------------
+# shard side: alarms of the cycle (stands for alerts.Dispatcher)
+# ------------------------------------------------------------------------------
+class Collector:
+    def __init__(self):
+        self.alarms = {}
+
+    def submit(self, group, alarms, channels, repeat=(), title=''):
+        self.alarms[group] = alarms
+        return(0)
+
+    def stop(self):
+        pass
+
+# records changed since the last report, for each group
+def report(engine, k, cycle=None):
+    recs = {}
+    for g in engine.Groups:
+        engine.selectGroup(g)
+        table = engine.PilotsStatus
+        full = engine.Dirty is None
+        items = []
+        for p in (table if full else engine.Dirty):
+            if p in table:
+                ps = table[p]
+                items.append((p, ps.saved(), int(ps.status), ps.late))
+            else:
+                items.append((p, None, 0, 0))
+        engine.Dirty = set()
+        recs[g] = (full, items)
+    engine.selectGroup(engine.DEFAULT)
+    (stages, counts) = ({}, {})
+    if cycle is not None: (stages, counts) = (cycle.stages, cycle.counts)
+    alarms = engine.Alerts.alarms
+    engine.Alerts.alarms = {}
+    return(pickle.dumps((k, alarms, recs, stages, counts), protocol=pickle.HIGHEST_PROTOCOL))
+
+# ------------------------------------------------------------------------------
+# shard process: an engine tracking the pilots of shard k (of n)
+# ------------------------------------------------------------------------------
+def shardMain(k, n):
+
+    # stdout is the pipe of the reports, prints go to stderr
+    inp = sys.stdin.buffer
+    out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    import engine
+    import metrics
+    import replay
+    init = json.loads(readFrame(inp))
+    engine.FILES = dict(init['files'])
+    engine.FILES['log'] = init['files']['log'] + ".shard" + str(k)
+    engine.ShardOf = (k, n)
+    engine.Clock = replay.ReplayClock(init['now'])
+    engine.loadConfig()
+    engine.config = init['config']
+    engine.P = engine.compileGroup(engine.config, engine.DEFAULT)[0]
+    engine.LogOverride = tuple(init['log'])      # level and console of the engine process
+    engine.initLog()
+    engine.Alerts = Collector()
+    with engine.stateLock:
+        engine.startShardSession(k)
+        writeFrame(out, report(engine, k))
+
+    while True:
+        try:
+            (kind, now, fixes, pseudos) = decodeFixes(readFrame(inp))
+        except EOFError:
+            break
+        if kind == b'q': break
+        engine.Clock.set(now)
+        cycle = None
+        try:
+            if kind == b'c':
+                engine.reloadConfig()
+                cycle = metrics.Cycle()
+                engine.Active.cycle = cycle
+                with engine.stateLock:
+                    engine.parseGroups(engine.dispatchFixes(fixes))
+            elif kind == b'x':
+                with engine.stateLock:
+                    if pseudos[0] in engine.PilotsStatus: engine.togglePilotClear(pseudos[0])
+            elif kind == b'r':
+                with engine.stateLock:
+                    engine.emptyGroups()
+        except Exception as e:
+            engine.warnlog("shard "+str(k)+" failure: "+str(e))
+        finally:
+            engine.Active.cycle = None
+        with engine.stateLock:
+            writeFrame(out, report(engine, k, cycle))
+    logs.stop()
+
+
+if __name__ == '__main__':
+    shardMain(int(sys.argv[1]), int(sys.argv[2]))
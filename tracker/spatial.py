@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# spatial.py
+# grid index of the landing spots
+#
+# Each spot is registered with a radius (km) in the cells of a lat/lon grid
+# covered by its bounding box. A position is first looked up in its cell:
+# no spot there means far from every spot, with no trigonometry at all.
+# Candidates are checked against their bounding box, and only those inside
+# get the exact distance (same haversine as engine.calcDistKm).
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+from math import floor, cos, radians, sin, atan2, sqrt
+
+KM_PER_DEG = 6373.0 * 3.141592653589793 / 180     # same earth radius as calcDistKm
+MARGIN = 1.01                                     # bounding boxes slightly larger
+MAXCELLS = 10000                                  # beyond: spot checked everywhere
+
+
+class SpotIndex:
+    def __init__(self, cell=0.5):
+        self.cell = cell            # grid step (deg)
+        self.grid = {}              # (ilat, ilon) -> [spot, ...]
+        self.everywhere = []        # spots with a huge radius
+        self.spots = {}             # name -> spot
+
+    # spot = [name, lat, lon, radius km, half height deg, half width deg]
+    # (distances are truncated to the km: the box covers radius+1 km)
+    def add(self, name, lat, lon, radius):
+        dlat = (radius+1) / KM_PER_DEG * MARGIN
+        maxlat = min(89.9, abs(lat) + dlat)
+        dlon = min(180, (radius+1) / (KM_PER_DEG * cos(radians(maxlat))) * MARGIN)
+        spot = [name, lat, lon, radius, dlat, dlon]
+        self.spots[name] = spot
+
+        (i0, i1) = (floor((lat-dlat)/self.cell), floor((lat+dlat)/self.cell))
+        (j0, j1) = (floor((lon-dlon)/self.cell), floor((lon+dlon)/self.cell))
+        if (i1-i0+1)*(j1-j0+1) > MAXCELLS:
+            self.everywhere.append(spot)
+            return()
+        for i in range(i0, i1+1):
+            for j in range(j0, j1+1):
+                # longitudes wrap around
+                jw = j % int(round(360/self.cell))
+                self.grid.setdefault((i, jw), []).append(spot)
+
+    def candidates(self, lat, lon):
+        key = (floor(lat/self.cell), floor(lon/self.cell) % int(round(360/self.cell)))
+        cands = self.grid.get(key)
+        if not self.everywhere: return(cands or ())
+        return((cands or []) + self.everywhere)
+
+    # spots whose circle holds this position: [(name, distkm), ...]
+    def query(self, lat, lon):
+        found = []
+        for (name, slat, slon, radius, dlat, dlon) in self.candidates(lat, lon):
+            if abs(lat-slat) > dlat: continue
+            dl = abs(lon-slon)
+            if min(dl, 360-dl) > dlon: continue
+            d = distKm(slat, slon, lat, lon)
+            if d <= radius:
+                found.append((name, d))
+        return(found)
+
+    # distance to spot 'name' if this position is in its circle, else None
+    def within(self, name, lat, lon):
+        (n, slat, slon, radius, dlat, dlon) = self.spots[name]
+        if abs(lat-slat) > dlat: return(None)
+        dl = abs(lon-slon)
+        if min(dl, 360-dl) > dlon: return(None)
+        d = distKm(slat, slon, lat, lon)
+        if d > radius: return(None)
+        return(d)
+
+    # nearest spot holding this position: (name, distkm), or None
+    def nearest(self, lat, lon, exclude=()):
+        best = None
+        for (name, d) in self.query(lat, lon):
+            if name in exclude: continue
+            if best is None or d < best[1]: best = (name, d)
+        return(best)
+
+
+# ------------------------------------------------------------------------------
+# same as engine.calcDistKm (km, truncated)
+# ------------------------------------------------------------------------------
+def distKm(x1, y1, x2, y2):
+
+    R = 6373.0
+    lat1 = radians(x1)
+    lon1 = radians(y1)
+    lat2 = radians(x2)
+    lon2 = radians(y2)
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return(int(R * c))
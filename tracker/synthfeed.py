@@ -0,0 +1,202 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# synthfeed.py
+# synthetic FFVL tracker feed, for scale tests
+#
+# Trackers around the configured spots (config['spots']), each one with
+# its own log period, following one of these scenarios:
+#   flight : takes off from a launch above the spot, flies (random walk,
+#            20-50 km/h, climbing/sinking), comes back and lands near the
+#            spot, then logs from the ground (GPS jitter, speed 0)
+#   early  : same, but lands after a few minutes (still far from the spot)
+#   lost   : signal lost in flight, no more logs (stale pilot)
+#   ground : never takes off
+# Everything is drawn from a seeded generator: same seed, same feed.
+#
+# output: a recording (see replay.py), one response per period holding
+# the last log of the trackers that logged during the period:
+#      synthfeed.py -o feed.jsonl.gz [-n 10000] [-hours 3] [-period 60]
+#                   [-seed 1] [-early 0.1] [-lost 0.05] [-ground 0.1]
+#                   [-config tracker.config]
+# then: replay.py run feed.jsonl.gz, or replay.py serve feed.jsonl.gz
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import sys
+import json
+import random
+from math import cos, sin, atan2, radians, pi
+
+KM_LAT = 111.0                  # km per degree of latitude
+T0 = 1751360400                 # default start: 2025-07-01 09:00 UTC
+
+
+class SynthPilot:
+    __slots__ = ('pseudo', 'rnd', 'scenario', 'every', 'nextlog', 'lat', 'lon', 'alt', 'speed', \
+        'heading', 'ground', 'tof', 'tland', 'tlost', 'spot', 'state')
+
+    def __init__(self, pseudo, spot, scenario, t0, duration, rnd):
+        self.pseudo = pseudo
+        self.rnd = rnd
+        self.scenario = scenario
+        self.spot = spot                # (lat, lon, alt)
+        self.every = rnd.choice([10, 30, 60, 60, 120])
+        self.nextlog = t0 + rnd.uniform(0, self.every)
+        self.ground = spot[2]
+        # launch: 2 to 8 km from the landing spot, 800 to 1500 m above
+        (dist, angle) = (rnd.uniform(2, 8), rnd.uniform(0, 2*pi))
+        self.lat = spot[0] + dist*cos(angle)/KM_LAT
+        self.lon = spot[1] + dist*sin(angle)/(KM_LAT*cos(radians(spot[0])))
+        self.alt = self.ground + rnd.uniform(800, 1500)
+        self.speed = 0
+        self.heading = rnd.uniform(0, 2*pi)
+        self.tof = t0 + rnd.uniform(0, duration/3)
+        self.tland = self.tof + rnd.uniform(duration/4, duration*2/3)
+        if scenario == 'early':
+            self.tland = self.tof + rnd.uniform(120, 900)
+        self.tlost = self.tof + rnd.uniform(300, duration/2) if scenario == 'lost' else None
+        self.state = 'launch'
+
+    # move from t-dt to t
+    def move(self, t, dt):
+        rnd = self.rnd
+        if self.scenario == 'ground' or t < self.tof:
+            return()
+        if self.state == 'launch': self.state = 'flying'
+        if self.state == 'flying' and t >= self.tland:
+            self.state = 'landed'
+            if self.scenario != 'early':
+                # lands near the spot
+                self.lat = self.spot[0] + rnd.uniform(-0.003, 0.003)
+                self.lon = self.spot[1] + rnd.uniform(-0.003, 0.003)
+            self.alt = self.ground
+            self.speed = 0
+        if self.state == 'landed':
+            return()
+        # flying: random walk, back towards the spot in the last part
+        self.speed = rnd.uniform(20, 50)
+        if t > self.tland - 900:
+            dy = (self.spot[0]-self.lat) * KM_LAT
+            dx = (self.spot[1]-self.lon) * KM_LAT*cos(radians(self.lat))
+            self.heading = (pi/2 - atan2(dy, dx)) % (2*pi)
+        else:
+            self.heading += rnd.gauss(0, 0.4)
+        km = self.speed * dt / 3600
+        self.lat += km*cos(self.heading)/KM_LAT
+        self.lon += km*sin(self.heading)/(KM_LAT*cos(radians(self.lat)))
+        self.alt = max(self.ground + 50, self.alt + rnd.gauss(0, 2) * dt)
+
+    # FFVL record if the tracker logs at time t, else None
+    def log(self, t):
+        if t < self.nextlog: return(None)
+        # last log slot before t (the feed holds the last position only)
+        k = int((t - self.nextlog) // self.every)
+        ts = int(self.nextlog + k*self.every)
+        self.nextlog += (k+1) * self.every
+        if self.tlost is not None and ts >= self.tlost: return(None)
+        rnd = self.rnd
+        (lat, lon, alt) = (self.lat, self.lon, self.alt)
+        if self.state != 'flying':
+            # GPS jitter on the ground
+            (lat, lon, alt) = (lat + rnd.gauss(0, 1.5e-5), lon + rnd.gauss(0, 1.5e-5), alt + rnd.gauss(0, 2))
+        rec = {'pseudo': self.pseudo,
+               'last_latitude': "%.6f" % lat,
+               'last_longitude': "%.6f" % lon,
+               'last_altitude': "%d" % alt,
+               'last_h_speed': "%d" % self.speed if rnd.random() > 0.1 else "",
+               'last_position_utc_timestamp_unix': str(ts)}
+        return(rec)
+
+
+# ------------------------------------------------------------------------------
+# generate a feed
+# n       : number of trackers
+# spots   : [(lat, lon, alt), ...]
+# mix     : share of each scenario { 'early', 'lost', 'ground' } (rest: flight)
+# yields (t, [records logged during (t-period, t]]) for each period
+# ------------------------------------------------------------------------------
+def cycles(n, spots, duration=3*3600, period=60, seed=1, mix=None, t0=T0):
+
+    mix = mix or {'early': 0.1, 'lost': 0.05, 'ground': 0.1}
+    rnd = random.Random(seed)
+    pilots = []
+    for i in range(n):
+        r = rnd.random()
+        scenario = 'flight'
+        for s in ('early', 'lost', 'ground'):
+            if r < mix.get(s, 0):
+                scenario = s
+                break
+            r -= mix.get(s, 0)
+        spot = spots[rnd.randrange(len(spots))]
+        pilots.append(SynthPilot("synth%05d" % i, spot, scenario, t0, duration, random.Random(rnd.random())))
+
+    t = t0 + period
+    while t <= t0 + duration:
+        out = []
+        for p in pilots:
+            p.move(t, period)
+            rec = p.log(t)
+            if rec is not None: out.append(rec)
+        yield((t, out))
+        t += period
+
+# payload as the FFVL server sends it
+def payload(records):
+    return(json.dumps({str(i): r for (i, r) in enumerate(records)}, separators=(',', ':')).encode())
+
+# spots of a tracker config file, or of the default config
+def configSpots(path=None):
+    spots = None
+    if path:
+        with open(path, 'r') as in_file:
+            spots = json.load(in_file).get('spots')
+    if spots is None:
+        import engine
+        engine.FILES = {'config': ''}
+        engine.loadConfig()
+        spots = engine.config['spots']
+    out = []
+    for sp in spots.values():
+        try:
+            out.append((float(sp['Latitude']), float(sp['Longitude']), float(sp.get('Altitude') or 0)))
+        except (KeyError, TypeError, ValueError):
+            continue            # coordinates undefined (custom spot)
+    return(out)
+
+# write a recording (replay.py format)
+def write(path, n, spots, duration, period, seed, mix):
+    import replay
+    rec = replay.Recorder(path)
+    nlogs = 0
+    for (t, records) in cycles(n, spots, duration, period, seed, mix):
+        rec.write(t, t - period, None, payload(records))
+        nlogs += len(records)
+    rec.close()
+    return(nlogs)
+
+
+# ------------------------------------------------------------------------------
+# -----------------------------
+#   MAIN PROGRAM
+# -----------------------------
+# ------------------------------------------------------------------------------
+def option(name, default):
+    if name in sys.argv:
+        return(sys.argv[sys.argv.index(name)+1])
+    return(default)
+
+if __name__ == '__main__':
+    out = option('-o', 'synthfeed.jsonl.gz')
+    n = int(option('-n', '1000'))
+    duration = int(float(option('-hours', '3')) * 3600)
+    period = int(option('-period', '60'))
+    seed = int(option('-seed', '1'))
+    mix = {s: float(option('-'+s, d)) for (s, d) in (('early', '0.1'), ('lost', '0.05'), ('ground', '0.1'))}
+    spots = configSpots(option('-config', None))
+    nlogs = write(out, n, spots, duration, period, seed, mix)
+    print("%s: %d trackers around %d spots, %d logs over %ds" % (out, n, len(spots), nlogs, duration))
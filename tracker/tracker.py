@@ -6,6 +6,9 @@
 # script to follow a list of pilots 
 #      and rises an alert when a pilot is not moving
 # 
+# GUI front end of engine.py (tracking engine)
+#      tracker.py              : start the GUI
+#      tracker.py --headless   : run the engine as a daemon, no GUI
 # 
 # Author: Pascal Caunegre
 # Date: 2024/07/29
@@ -19,7 +22,6 @@
 #    sudo apt install mpg321
 #    sudo apt install msmtp
 # 
-#    pip3 install requests_html
 #    pip3 install tplinkrouterc6u
 # 
 
@@ -28,18 +30,17 @@
 
 import sys
 import os
-from datetime import datetime
 import time
-import csv
-import json
-import re
-from math import *
-try:
-    from requests_html import HTMLSession
-except:
-    print("requests_html lib missing\nplease run:\n   pip3 install requests_html")
+import queue
+
+# daemon mode: no Tk, no X needed
+if __name__ == '__main__' and ('--headless' in sys.argv or '-headless' in sys.argv):
+    import engine
+    engine.runHeadless()
     exit(0)
-    
+
+import engine
+from engine import getParam, printlog, writeConfig, getSpotList, getCoord
     
 try:
     from tkinter import *
@@ -53,651 +54,29 @@ except:
     exit(0)
 
 
-# ------------------------------------------------------------------------------
-# load pilot list from input csv file
-# ------------------------------------------------------------------------------
-def loadPilotList():
-    
-    global FILES, PilotsFilter
-    
-    PilotsFilter = {}
-    if getParam('Filtrage') != 'Fichier':
-        printlog("not using pilot list to filter")
-        return()
-        
-    if FILES['pilotsFilter']=='' or FILES['pilotsFilter']=='select a file' or not os.path.isfile(FILES['pilotsFilter']):
-        printlog("pilot list undefined or missing")
-        return()
-    
-    with open(FILES['pilotsFilter'], newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in list(reader):
-            PilotsFilter[row['Pseudo']]={"Name": row['Prenom'], "Surname": row['Nom']}
-        csvfile.close()
-    
-    printlog(PilotsFilter)
-
-
-
-# ------------------------------------------------------------------------------
-# get info from FFVL tracker database
-# ------------------------------------------------------------------------------
-def fetchDatabase():
-    
-    now = int(time.time()-60); # take position from last minute 
-    url = getParam('ffvl_url')+str(now)
-
-    try:
-        ret = session.get(url)
-    except:
-        printlog('Request failure')
-        return('')
-    htmlContent = ret.content.decode('utf-8')
-            
-    l = json.loads(htmlContent)
-    return(l)
-
-
-# ------------------------------------------------------------------------------
-# parse data from database
-# update status for each pilot
-# ------------------------------------------------------------------------------
-def parseData(infolist):
-    
-    global PilotsStatus, PilotsFilter
-    alarm = 0
-    
-    # 1. recording pilot info from data received
-    for elem in infolist:
-        el = infolist[elem]
-        pseudo=el['pseudo']
-        (toofar,distkm) = isPilotTooFar(el)
-        
-        # filtering
-        if getParam('Filtrage') == 'Fichier':
-            # is this pilot in list ?
-            if not (pseudo in PilotsFilter): 
-                printlog(pseudo+" not in my list")
-                continue
-        
-        elif getParam('Filtrage') == 'Distance':
-            # is this pilot close enough ?
-            if toofar: continue
-            
-        # create new item if needed
-        if pseudo not in PilotsStatus: 
-            name='-'; surname='-'
-            # infos coming from filter file
-            printlog("==  ITEM  NEW===============================")
-            printlog(el)
-            if pseudo in PilotsFilter:
-                name = PilotsFilter[pseudo]['Name']
-                surname = PilotsFilter[pseudo]['Surname']
-            if 'last_h_speed' in el:
-                speed = int(el['last_h_speed'])
-            else:
-                speed = '-'
-            pilot = { "Name": name, "Surname": surname, "Cleared": 0, "Landed": 0, "TakeOff": 0,\
-                "last_alt": int(el['last_altitude']), "last_lat": el['last_latitude'], \
-                "last_lon": el['last_longitude'], "last_dist": 0, "last_h_speed": speed,\
-                "d2atter": distkm,\
-                "STtext": "-",\
-                "STcolor": defaultbg,\
-                "DTlog": "-",\
-                "DTcolor": defaultbg,\
-                "last_postime": el['last_position_utc_timestamp_unix'], "new": 1}
-        
-        # update an existing item
-        else:
-            pilot = PilotsStatus[pseudo]
-        
-            # evaluate status of this pilot
-            printlog("==  ITEM  ==================================")
-            printlog(el)
-            (pilot) = updatePilotInfo(pilot,el)
-        
-        # recording
-        PilotsStatus[pseudo] = pilot
-
-
-    # 2. now review all pilots shown in table to evaluate warnings
-    for p in PilotsStatus:
-        (pilot,al) = checkPilot(PilotsStatus[p])
-        PilotsStatus[p] = pilot
-        if al: printlog("ALARM ! Pilot "+p+" "+pilot['Name']+" "+pilot['Surname'])
-        alarm += al
-
-    # save infos in backup file
-    savePilotTable()
-    
-    # TO BE REVIEWED
-    if alarm: 
-        if getParam('AlerteSonore')=="1": sendSoundAlert()
-        if getParam('AlerteSMS')=="1":    sendSmsAlert()
-        if getParam('AlerteEmail')=="1":  sendEmailAlert()
-        
-    
-
-# ------------------------------------------------------------------------------
-# Accessories to send alert
-# ------------------------------------------------------------------------------
-def sendSoundAlert():
-    print("sendSoundAlert")
-    command=getParam('soundCmd')+execpath+"/sound.mp3"
-    print(command)
-    os.system(command)    
-    
-# ------------------------------------------------------------------------------
-def sendSmsAlert(mess):
-    numlist=getParam('TelPourAlerte').split(' ')
-    try:
-        from tplinkrouterc6u import (
-            TplinkRouterProvider,
-            TplinkRouter,
-            TplinkC1200Router,
-            TPLinkMRClient,
-            TPLinkDecoClient,
-            Connection
-        )
-        from logging import Logger
-    except:
-        print('Cannot work with TPLink router for sending SMS')
-        return()
-
-    try:
-        router = TplinkRouterProvider.get_client('192.168.1.1','tplPc1unegr-')
-        router.authorize()
-        for num in numlist:
-            print("sendSmsdAlert to: "+num)
-            router.send_sms(num,mess)
-        router.logout()
-    except:
-        print('Cannot work with TPLink router for sending SMS')
-    
-       
-
-# ------------------------------------------------------------------------------
-def sendEmailAlert(mess):
-    print("sendEmailAlert")
-    from email.message import EmailMessage
-    from email.utils import make_msgid
-    for dest in getParam('EmailPourAlerte').split(' '):
-        horl = datetime.now()
-        dt_string = horl.strftime("%H:%M:%S")
-        mfile = "/tmp/msg"+dt_string
-        message = "To: " + dest + "\n"
-        message += "Subject: " + mess + "\n"
-        message += mess + "\n"
-        f = open(mfile,'w')
-        print(message, file=f)
-        f.close()
-        command="cat " + mfile + " | msmtp " + dest + " "
-        print("Email command: %s" % command)
-        os.system(command)
-
-
-# ------------------------------------------------------------------------------
-# update info of a pilot
-# ps : info list of pilot
-# cur: current position
-# 
-# TakeOff : take off or not
-# Landed  : has landed (no more moving after take off)
-# 
-# ------------------------------------------------------------------------------
-def updatePilotInfo(ps,cur):
-    
-    tof = 0; lan = 0; 
-    # rough distance calculation (in meter) from gps dec coord and altitude    
-    distm = calcDistm(ps['last_lat'], ps['last_lon'], ps['last_alt'], \
-        cur['last_latitude'], cur['last_longitude'], cur['last_altitude'])
-    printlog("Step= "+str(distm))
-    
-    deltaTime=int(cur['last_position_utc_timestamp_unix'])-int(ps['last_postime'])
-    printlog("DeltaT= "+str(deltaTime))
-
-    if ps['new']:            
-        #first log, do not check.
-        ps.update({"new": 0})
-        printlog("first log, skip check")
-        deltat = "-"
-        DTcolor = defaultbg
-        STtext="-"
-        STcolor = defaultbg
-    else:   
-        if deltaTime==0:
-            printlog("log not new, skip check")
-        else:
-            # if speed is available, use speed to detect takeoff           
-            if 'last_h_speed' in cur:
-                
-                last_h_speed = int(cur['last_h_speed'])
-                ps.update({"last_h_speed": last_h_speed})
-                printlog("Speed= "+str(last_h_speed))
-                # detect takeoff: speed of 10km/h
-                if ps['TakeOff']==0:
-                    if (last_h_speed > int(getParam('VitMinDeco'))): tof = 1
-                        
-            # in addition use distance from last record
-            # detect takeoff: move of 10m
-            if ps['TakeOff']==0:
-                if (distm > int(getParam('StepMinDeco'))): tof = 1
-            
-            else:
-                if (distm < int(getParam('StepMaxPose'))): lan = 1
-                
-                # sometimes step is null but speed is not
-                if 'last_h_speed' in cur:
-                    if last_h_speed > int(getParam('VitMinDeco')): lan = 0
-            
-            if tof:
-                ps.update({'TakeOff': 1})
-                printlog("Pilot TakeOff "+cur['pseudo'])
-             
-            if lan:
-
-                ps.update({'Landed': 1})
-                printlog("Pilot Landed "+cur['pseudo'])
-
-
-    ps.update({  "last_lat": cur['last_latitude'],\
-                 "last_lon": cur['last_longitude'],\
-                 "last_dist": distm,\
-                 "last_alt": int(cur['last_altitude']),\
-                 "last_postime": cur['last_position_utc_timestamp_unix'] })
-                 
-                 
-    return(ps)       
-
-
-# -----------------------------------------------
-# check a pilot (monitors status, log delay...)
-# evaluate pilot or log time warnings            
-# 
-# -----------------------------------------------
-def checkPilot(ps):
-
-    alarm = 0
-    ps['STtext'] = '-'
-    ps['STcolor'] = defaultbg
-    if ps['TakeOff']:
-        ps['STtext']  = 'En vol'
-        ps['STcolor'] = 'green'
-    
-    if (ps['TakeOff'] and ps['Landed'] and (not ps['Cleared'])):
-        ps['STtext']  = 'ALERT'
-        ps['STcolor'] = 'red'
-    
-    if ps['Cleared']:
-        ps['STtext']  = 'Safe'
-        ps['STcolor'] = defaultbg
-
-    # delta time between now and last log
-    now = int(time.time())  
-    deltat = now-int(ps['last_postime'])
-    ps['DTlog'] = deltat
-    if (deltat > int(getParam('delaiLogMax'))): 
-        ps['DTcolor'] = 'yellow'
-    else:    
-        ps['DTcolor'] = defaultbg
-
-    # pilot landed but not cleared
-    if (ps['Landed'] and ps['Cleared']==0):
-        alarm = 1
-
-    return((ps,alarm))       
-
-
 # -----------------------------------------------
-# check whether pilot is close to the playground
-# returns boolean + distance to landing
-# -----------------------------------------------
-def isPilotTooFar(elem):
-   
-    lat = getParam('Latitude').strip()
-    lon = getParam('Longitude').strip() 
-    if len(lon) and len(lat):
-        distkm = calcDistKm(lat, lon, elem['last_latitude'], elem['last_longitude'])
-        if distkm > float(getParam('MaxDistance')):
-            printlog(elem['pseudo']+" pilot too far "+str(int(distkm)))
-            return((1,distkm))
-        else:
-            return((0,distkm))
-    else:
-        # center point not defined, so no filtering
-        return((0,"-"))
-
- 
-# -----------------------------------------------
-# distance calc between 2 gps coordinates
-# in decimal degrees and z in meter, for small distances
-# return in m
-# -----------------------------------------------
-def calcDistm(x1,y1,z1,x2,y2,z2):
-
-    k1 = 111000           # 1 deg is roughly 111km
-    k2 = 111000*cos(6.3*float(x1)/360)   # 1 deg is roughly 111km at equator
-    dist= sqrt(\
-        ((float(x1)-float(x2))*k1)**2 +\
-        ((float(y1)-float(y2))*k2)**2 +\
-         (float(z1)-float(z2))**2 )
-    return(int(dist))
-
-
-# -----------------------------------------------
-# distance calc between 2 lat/lon coordinates
-# in decimal degrees, for long distance
-# return in km
-# -----------------------------------------------
-def calcDistKm(x1,y1,x2,y2):
-
-    R = 6373.0
-    lat1 = radians(float(x1))
-    lon1 = radians(float(y1))
-    lat2 = radians(float(x2))
-    lon2 = radians(float(y2))
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    distance = R * c
-    return(int(distance))
-    
-# -----------------------------------------------
-# load pilot table from backup file
-# -----------------------------------------------
-def loadPilotTable():   
-    
-    global FILES, PilotsStatus
-    
-    if os.path.isfile(FILES['pilotsStatus']):
-        with open(FILES['pilotsStatus'], 'r') as in_file:
-            content = in_file.read()
-            in_file.close()
-            if len(content):
-                PilotsStatus = json.loads(content)
-            else:
-                PilotsStatus = {}
-    else:
-        PilotsStatus = {}
-
-   
-# -----------------------------------------------
-# save pilot table in backup file
-# -----------------------------------------------
-def savePilotTable():   
-    
-    global FILES, PilotsStatus
-    
-    with open(FILES['pilotsStatus'], 'w') as out_file:
-        json.dump(PilotsStatus, out_file, indent = 4, sort_keys=True)
-        out_file.close()      
-    
-        
-        
-# # # -----------------------------------------------
-# # # Calculate status
-# # # -----------------------------------------------
-# # def calcStatus(elem):
-# # 
-# #     print("Calc")
-# #     print(elem)
-# #     status = '-'
-# #     color = defaultbg         # default color #d9d9d9
-# #     if elem['TakeOff']:
-# #         status='En vol'
-# #         color='green'
-# #     if (elem['TakeOff'] and elem['Landed'] and (not elem['Cleared'])):
-# #         status='ALERT'
-# #         color='red'
-# #     if elem['Cleared']:
-# #         status='Safe'
-# #         color=defaultbg
-# # 
-# #     # delta time between now and last log
-# #     now = int(time.time())  
-# #     deltat = now-int(elem['last_postime'])
-# #     color2 = defaultbg
-# #     if (deltat > int(getParam('delaiLogMax'))): color2="yellow"
-# #     
-# #     return((status,color,deltat,color2))
-
-
-# -----------------------------------------------
-# clear pilot status
+# clear pilot status (Clear/Undo button)
 # -----------------------------------------------
 def clearPilotStatus(p):   
     
-    global PilotsStatus
+    global PilotsView
     
-    elem=PilotsStatus[p]        
-
-    if elem['Cleared']:
-        if elem['Landed']:
-            elem['Cleared']=0
-            elem['Landed']=0
-        
-    else:
-        if elem['Landed']: elem['Cleared']=1
-        else: elem['Landed']=1
-
-    # now reevaluate status and store
-    (elem,al)=checkPilot(elem)
-    PilotsStatus[p]=elem
-    savePilotTable()
+    PilotsView = engine.clearPilotStatus(p)
     
-    # refresh display
-    refreshPilotLine(p)
-    # updatePilotTable()
+    # refresh display (the order changes with the status)
+    updatePilotTable()
         
 # -----------------------------------------------
 # locate pilot on map
 # -----------------------------------------------
 def locatePilot(p):   
     
-    global PilotsStatus
-    
-    lat = PilotsStatus[p]['last_lat']
-    lon = PilotsStatus[p]['last_lon']
+    lat = PilotsView['pilots'][p].lat
+    lon = PilotsView['pilots'][p].lon
     url = "https://www.spotair.mobi/?lat="+str(lat)+"&lng="+str(lon)+"&zoom=15&layers=ltffvl"
     command = 'firefox  --new-window \"'+url+'\" &'
     printlog(command)    
     os.system(command)
-    
-
-
-
-# ----------------------------------------------------------
-# 
-# proc loadConfig
-#   read from the config file
-# 
-# ----------------------------------------------------------
-def loadConfig():
-
-    global FILES, config
-
-    f = FILES['config']
-    if (os.path.isfile(f) and os.path.getsize(f)>0):
-        # read the config file
-        with open(f, 'r') as in_file:
-            config = json.load(in_file)
-            in_file.close()
-    
-    else:
-        config = \
-{
-    "parameters": {
-        "Filtrage": {
-            "method": "radio",
-            "list": ["Fichier", "Distance", "Aucun"],
-            "descr": "Filtrage par fichier, par la distance a l'atterrissage, ou pas de filtre",
-            "def": "Aucun",
-            "value": "Aucun"
-        },
-        "MaxDistance": {
-            "method": "entry",
-            "descr": "Filtrage des pilotes a une distance inferieure a cette valeur en km",
-            "def": "50",
-            "value": "50"
-        },
-        "VitMinDeco": {
-            "method": "entry",
-            "descr": "Vitesse minimale pour detecter le deco (si vitesse reportee)",
-            "def": "10",
-            "value": "10"
-        },
-        "StepMinDeco": {
-            "method": "entry",
-            "descr": "Variation de position (en m) minimale pour detecter le mode vol",
-            "def": "10",
-            "value": "10"
-        },
-        "StepMaxPose": {
-            "method": "entry",
-            "descr": "Variation de position (en m) maximale pour detecter le mode sol",
-            "def": "5",
-            "value": "5"
-        },
-        "delaiLogMax": {
-            "method": "entry",
-            "descr": "Delai (s) depuis le dernier log au-dela duquel on emet un Warning",
-            "def": "300",
-            "value": "300"
-        },
-        "AlerteSonore": {
-            "method": "chkb",
-            "descr": "Emettre l'alerte par un son",
-            "def": "0",
-            "value": "0"
-        },
-        "AlerteSMS": {
-            "method": "chkb",
-            "descr": "Emettre l'alerte par un SMS",
-            "def": "0",
-            "value": "0"
-        },
-        "AlerteEmail": {
-            "method": "chkb",
-            "descr": "Emettre l'alerte par un email",
-            "def": "0",
-            "value": "0"
-        },
-        "TelPourAlerte": {
-            "method": "entry",
-            "descr": "Nos de Tel auxquels envoyer un SMS d'alerte",
-            "def": "",
-            "value": ""
-        },
-        "EmailPourAlerte": {
-            "method": "entry",
-            "descr": "Email(s) auxquels envoyer une alerte",
-            "def": "",
-            "value": ""
-        },
-        "RefreshPeriod": {
-            "method": "entry",
-            "descr": "Periode de recuperation des donnees de tracking (s)",
-            "def"  : "60",
-            "value": "60"
-        },
-        "Editeur": {
-            "method": "entry",
-            "descr": "Outil pour editer les fichiers texte",
-            "def": "nedit",
-            "value": "nedit"
-        },
-        "soundCmd": {
-            "visib": 0,
-            "descr": "Tool to play sound",
-            "def": "mpg321 --frames 50 ",
-            "value": "mpg321 --frames 50 "
-        },
-        "pilotfile": {
-            "visib": 0,
-            "descr": "Fichier csv des pilotes",
-            "def": "select a file",
-            "value": "select a file"
-        },
-        "ffvl_url": {
-            "visib": 0,
-            "descr": "URL data",
-            "def"  : "https://data.ffvl.fr/api/?mode=json&key=79ef8d9f57c10b394b8471deed5b25e7&ffvl_tracker_key=all&from_utc_timestamp=",
-            "value": "https://data.ffvl.fr/api/?mode=json&key=79ef8d9f57c10b394b8471deed5b25e7&ffvl_tracker_key=all&from_utc_timestamp="
-        },
-        "spot": {
-            "visib": 0,
-            "descr": "Pre-selection du spot",
-            "def": "custom",
-            "value": "custom"
-        },
-        "Latitude": {
-            "visib": 0,
-            "descr": "Latitude du spot",
-            "def": "",
-            "value": " "
-        },
-        "Longitude": {
-            "visib": 0,
-            "descr": "Longitude du spot",
-            "def": "",
-            "value": " "
-        },
-        "Altitude": {
-            "visib": 0,
-            "descr": "Altitude du spot",
-            "def": "",
-            "value": " "
-        }
-    },
-    "spots": {
-        "custom": {
-            "Longitude":  "",
-            "Latitude":  "",
-            "Altitude":  "",
-            "descr": "Spot custom"
-        },    
-        "Arbas Attero": {
-            "Longitude":  0.904557,
-            "Latitude":  42.990937,
-            "Altitude":  420,
-            "descr": "Atterrissage Arbas"
-        },
-        "Val Louron Attero": {
-            "Longitude":  0.405442,
-            "Latitude":  42.802246,
-            "Altitude":  951,
-            "descr": "Atterrissage VL"
-        },
-        "Doussard": {
-            "Longitude":  6.222322,
-            "Latitude":  45.781463,
-            "Altitude":  466,
-            "descr": "Atterrissage Anncey"
-        },
-        "Lumbin": {
-            "Longitude":  5.906357,
-            "Latitude":  45.302509,
-            "Altitude":  230,
-            "descr": "Atterrissage St Hil"
-        }
-    }
-        }
-    
-# ----------------------------------------------------------
-# 
-# proc writeConfig
-#   store confid into config file
-# 
-# ----------------------------------------------------------
-def writeConfig():
-
-    global FILES, config
-
-    # write the status file
-    with open(FILES['config'], 'w') as out_file:
-        json.dump(config, out_file, indent = 4, sort_keys=True)
-        out_file.close()
 
 # -----------------------------------------------
 # extract params from GUI and store them into
@@ -705,7 +84,7 @@ def writeConfig():
 # -----------------------------------------------   
 def saveParam():   
     
-    global config       
+    config = engine.config       
 
     for el in widgets['paramTab']:
         item = config['parameters'][el]
@@ -714,104 +93,86 @@ def saveParam():
         print("par extract "+el+" = "+item['value'])
     
     writeConfig()
-    
-# -----------------------------------------------
-# Utility to get a param value
-#    if param is not saved, get default from config
-# -----------------------------------------------   
-def getParam(parname):   
-
-    global config
-    
-    elem = config['parameters'][parname]
-    val = elem['def']
-    if len(elem['value']): val = elem['value']
-    return(val)
-    
-# -----------------------------------------------
-# fetch data and parse
-# -----------------------------------------------
-def fetchAndParse():
-
-    printlog('\n' + '+'*50 + '\n')
-    # begin to grab info
-    infolist = fetchDatabase()
-    if infolist is None: 
-        printlog("fetch is void")    
-    else:
-        # filter and parse data
-        parseData(infolist)
 
 # -----------------------------------------------
 # Manage starting process
 # -----------------------------------------------
 def processStart():
     
+    global PilotsView
+    
     saveParam()
     
-    #1. load the pilot filter (if any)
-    loadPilotList()
+    if engine.worker is not None and engine.worker.is_alive():
+        printlog("tracking already running")
+        return()
     
-    #2. load the pilot status (if any) in case of restart after a crash
-    loadPilotTable()
+    #1. load the pilot filter and the pilot status (if any)
+    #   in case of restart after a crash
+    PilotsView = engine.startSession()
         
-#     #3. begin to grab info
-#     fetchAndParse()    
-    
-    #4. create pilot table and open panel
+    #2. create pilot table and open panel
     createPilotsPanel(nb)
     nb.select(1)  
     
-    #5. start the recurrent updater
+    #3. start the background worker and the GUI updater
+    engine.startWorker(publishSnapshot)
     generalUpdater()
 
 # -----------------------------------------------
-# Recurrent process
+# called by the engine worker thread
+# -----------------------------------------------
+def publishSnapshot(kind, data):
+
+    snapQueue.put((kind, data))
+
+# -----------------------------------------------
+# Recurrent GUI process: drain the queue and 
+# render the last snapshot (never blocks)
 # -----------------------------------------------
 def generalUpdater():   
     
-    widgets['dateLabel'].configure(bg='red')
-    root.update()
-    fetchAndParse()
-    updatePilotTable()
-    widgets['dateLabel'].configure(bg='blue')
-    root.after(int(getParam('RefreshPeriod'))*1000,generalUpdater)
+    global PilotsView
+    
+    snap = None
+    try:
+        while True:
+            (kind, data) = snapQueue.get_nowait()
+            if kind == 'busy':
+                widgets['dateLabel'].configure(bg='red')
+            else:
+                snap = data
+    except queue.Empty:
+        pass
+    
+    if snap is not None:
+        PilotsView = snap
+        t0 = time.perf_counter()
+        updatePilotTable()
+        engine.Metrics.note('render', time.perf_counter()-t0)
+        widgets['dateLabel'].configure(bg='blue')
+        updateStatusStrip()
+    root.after(GUI_POLL_MS, generalUpdater)
+
+# -----------------------------------------------
+# status strip: stages of the last cycle (metrics.py),
+# red when the cycle takes more than the refresh period
+# -----------------------------------------------
+def updateStatusStrip():   
     
+    cycle = engine.Metrics.last()
+    if cycle is not None:
+        widgets['statusStrip'].configure(text=cycle.text(), fg='red' if cycle.late() else 'black')
+
 # -----------------------------------------------
 # reset pilot status file
 # -----------------------------------------------
 def resetPilotStatus ():
     
-    global PilotsStatus
+    global PilotsView
     
-    PilotsStatus = {}
-    savePilotTable()  
-
-
-# ------------------------------------------------------------------------------
-# orders the list of ID wrt to criteria (alert first, alphabetic...)
-# ------------------------------------------------------------------------------
-def pilotOrdering():   
+    PilotsView = engine.resetPilotStatus()
 
-    global PilotsStatus
-    
-    alertlist = list()
-    warnlist = list()
-    traillist = list()
-    
-    for p in PilotsStatus:
-        item = PilotsStatus[p]
-        if item['STtext'] == "ALERT":
-            alertlist.append(p)
-        elif item['DTcolor'] == "yellow":
-            warnlist.append(p)
-        else:
-            traillist.append(p)
-    
-    return(alertlist+warnlist+traillist)
-    
-    
-       
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # GUI functions
@@ -920,102 +281,179 @@ def createPilotsPanel(nb):
     nb.add(frame, text="Status pilotes", padding='2mm')
     Label(frame, relief='groove', font=font_title, bd=1, bg='#d9d98c', text="STATUS PILOTES",width=1000).pack(side='top', padx=2, pady=2)
     
-    dateLabel=Label(frame, font=font_def, bd=1, text=dt_string)
+    dateLabel=Label(frame, font=font_def, bd=1, text=PilotsView['time'])
     dateLabel.pack(side='top')
     widgets['dateLabel']=dateLabel
 
-    canv = Canvas(frame, width=600, height=300, scrollregion=(0, 0, 600, 1200))
-    canv.pack(side='left',fill='both', expand=1)
-    widgets['canvas']=canv
+    statusStrip=Label(frame, font=font_ital, bd=1, relief='sunken', anchor='w', text="-")
+    statusStrip.pack(side='bottom', fill='x')
+    widgets['statusStrip']=statusStrip
 
-    sb = Scrollbar(frame,orient='vertical', width=20, command=canv.yview)
+    sb = Scrollbar(frame,orient='vertical', width=20, command=scrollPilotTable)
     sb.pack(side='right',fill='y')
 
-    canv.configure(yscrollcommand=sb.set)
+    body = tk.Frame(frame)
+    body.pack(side='left',fill='both', expand=1)
+    body.grid_propagate(False)      # the table adapts to the window, not the reverse
     
-    createPilotTable(canv)
+    createPilotTable(body, sb)
     
 
 
 # ------------------------------------------------------------------------------
 # PILOT PANEL
 # ------------------------------------------------------------------------------
+# The table is virtualized: only the visible lines exist as widgets.
+# A pool of line slots is created once, each slot shows the pilot at
+# position first+i of the ordered snapshot, and only the cells whose
+# value changed are reconfigured. Scrolling moves 'first', no widget 
+# is ever destroyed.
+# ------------------------------------------------------------------------------
+# status of the pilots: (text, color), None: background color
+STATUS_SHOWN = { engine.Status.GROUND: ('-', None),
+                 engine.Status.FLYING: ('En vol', 'green'),
+                 engine.Status.ALERT:  ('ALERT', 'red'),
+                 engine.Status.SAFE:   ('Safe', None) }
+
+PILOT_COLUMNS = [['Pseudo',25], ['Prenom',15], ['Nom',15], ['Alti',10], ['Step (m)',10], \
+    ['VitHz',7], ['Dist (km)',10],['Status',15], ['Dernier log',10], ['Clairance',10], ['Loc',10]]
+
 # ------------------------------------------------------------------------------
-# Create pilots table
+# Create pilots table (header + empty slot pool)
 # ------------------------------------------------------------------------------
-def createPilotTable(parent):   
-    
-    global PilotsStatus
-    
-    # first create a scrollable container
-    pilottabframe=tk.Frame(parent)
-    parent.create_window((0,25), window=pilottabframe, anchor='nw')    
-    widgets['panel']['pilot'] = pilottabframe
-
-    lat = getParam('Latitude')
-    lon = getParam('Longitude')   
-    if len(lat) and len(lon): 
-        distcol = 1
-    else: 
-        distcol = 0
+def createPilotTable(parent, sb):   
     
+    tab = { 'frame': parent, 'sb': sb, 'slots': [], 'nvis': 0, 'first': 0, 'rowOf': {}, 'rowH': 0 }
+    widgets['table'] = tab
+
     # header creation
     colInd=0
-    for (header,width) in [['Pseudo',25], ['Prenom',15], ['Nom',15], ['Alti',10], \
-            ['Step (m)',10], ['VitHz',7], ['Dist (km)',10],['Status',15], ['Dernier log',10], ['Clairance',10], ['Loc',10]]:
-        Cell(parent,x=colInd,y=0, w=width, defval=header, options=optionsH)   
+    for (header,width) in PILOT_COLUMNS:
+        c = Cell(parent,x=colInd,y=0, w=width, defval=header, options=optionsH)   
+        bindWheel(c.entry)
         colInd+=1
     
-    # table body
-    rownbr=0
-    for p in pilotOrdering():
-        rownbr+=1
-        elem=PilotsStatus[p]
-        addLineInTable(rownbr, p, elem)
-    widgets['panel']['rownb'] = rownbr    
-
-    horl = datetime.now()
-    dt_string = horl.strftime("%H:%M:%S")
-    widgets['dateLabel'].configure(text=dt_string)
-
+    parent.bind('<Configure>', resizePilotTable)
+    bindWheel(parent)
+    ensureSlots(1)
+    
     
 # -----------------------------------------------
-# Create line of the table
+# Create line slots up to n (never destroyed)
 # -----------------------------------------------
-def addLineInTable(rownbr, p, elem):   
+def ensureSlots(n):   
     
-    f = widgets['panel']['pilot']
-        
-    Cell(f, x=0,y=rownbr, w=25, defval=p,               options=optionsC, bgc=defaultbg) 
-    Cell(f, x=1,y=rownbr, w=15, defval=elem['Name'],    options=optionsC, bgc=defaultbg ) 
-    Cell(f, x=2,y=rownbr, w=15, defval=elem['Surname'], options=optionsC, bgc=defaultbg ) 
-    c=Cell(f, x=3,y=rownbr, w=10, defval=elem['last_alt'], options=optionsC, bgc=defaultbg ) 
-    widgets['pilotAlt'][p]=c   # keep an handle to change the status later
-    c=Cell(f, x=4,y=rownbr, w=10, defval=elem['last_dist'], options=optionsC, bgc=defaultbg ) 
-    widgets['pilotStep'][p]=c   # keep an handle to change the status later
-    c=Cell(f, x=5,y=rownbr, w=7, defval=elem['last_h_speed'], options=optionsC, bgc=defaultbg ) 
-    widgets['pilotHs'][p]=c   # keep an handle to change the status later
-    c=Cell(f, x=6,y=rownbr, w=10, defval=elem['d2atter'], options=optionsC, bgc=defaultbg ) 
-    widgets['pilotDist'][p]=c   # keep an handle to change the status later
-    c=Cell(f, x=7,y=rownbr, w=15, defval=elem['STtext'],        options=optionsC, bgc=elem['STcolor'] ) 
-    widgets['pilotStat'][p]=c   # keep an handle to change the status later
-    c=Cell(f, x=8,y=rownbr, w=10, defval=elem['DTlog'],        options=optionsC, bgc=elem['DTcolor'] ) 
-    widgets['pilotRTim'][p]=c
-    Cell(f, x=9,y=rownbr, w=10, wtype="clearb",defval="Clear/Undo",pid=p, options=optionsC, bgc=defaultbg ) 
-    Cell(f, x=10,y=rownbr, w=10, wtype="locb",defval="Voir",pid=p, options=optionsC, bgc=defaultbg ) 
+    tab = widgets['table']
+    f = tab['frame']
+    
+    while len(tab['slots']) < n:
+        rownbr = len(tab['slots'])+1
+        cells = []
+        colInd = 0
+        for (header,width) in PILOT_COLUMNS[:9]:
+            cells.append(Cell(f, x=colInd,y=rownbr, w=width, defval='', options=optionsC, bgc=defaultbg))
+            colInd+=1
+        cells.append(Cell(f, x=9,y=rownbr, w=10, wtype="clearb",defval="Clear/Undo", options=optionsC, bgc=defaultbg ))
+        cells.append(Cell(f, x=10,y=rownbr, w=10, wtype="locb",defval="Voir", options=optionsC, bgc=defaultbg ))
+        for c in cells:
+            bindWheel(c.entry)
+            c.entry.grid_remove()
+        tab['slots'].append({ 'cells': cells, 'vals': [None]*9, 'pid': None, 'rec': None, 'shown': 0 })
+        if not tab['rowH']:
+            tab['rowH'] = cells[0].entry.winfo_reqheight() + 2
+
+# -----------------------------------------------
+# values displayed on a line, (text,color) for
+# colored cells (elem: pilot.Pilot)
+# -----------------------------------------------
+def pilotLineValues(p, elem):   
+    
+    (sttext, stcolor) = STATUS_SHOWN[elem.status]
+    return([p, elem.name, elem.surname, elem.alt, elem.step, \
+        shown(elem.speed), shown(elem.d2atter), (sttext, stcolor or defaultbg), logDelay(elem)])
 
+# seconds since the last log (changes with time only)
+def logDelay(elem):   
+    
+    return((PilotsView['now']-elem.postime, 'yellow' if elem.late else defaultbg))
 
+# unknown values are shown as '-'
+def shown(v):   
+    
+    return('-' if v is None else v)
 
 # -----------------------------------------------
-# table update
+# show pilot p in a slot, only changed cells
+# are reconfigured (same record as the last time:
+# not in the dirty set of the engine, only the 
+# log delay may change)
+# -----------------------------------------------
+def fillSlot(slot, p):   
+    
+    elem = PilotsView['pilots'][p]
+    if slot['pid'] == p and slot['rec'] is elem:
+        (first, vals) = (8, [logDelay(elem)])
+    else:
+        (first, vals) = (0, pilotLineValues(p, elem))
+    slot['rec'] = elem
+    for i in range(first, first+len(vals)):
+        v = vals[i-first]
+        if slot['vals'][i] == v: continue
+        slot['vals'][i] = v
+        cell = slot['cells'][i]
+        if isinstance(v, tuple):
+            cell.sv.set(v[0])
+            cell.entry.configure(bg=v[1])
+        else:
+            cell.sv.set(v)
+    slot['pid'] = p
+    slot['cells'][9].pid = p
+    slot['cells'][10].pid = p
+    
+    if not slot['shown']:
+        for c in slot['cells']: c.entry.grid()
+        slot['shown'] = 1
+
+# -----------------------------------------------
+# hide an unused slot
+# -----------------------------------------------
+def hideSlot(slot):   
+    
+    if slot['shown']:
+        for c in slot['cells']: c.entry.grid_remove()
+        slot['shown'] = 0
+    slot['pid'] = None
+    slot['rec'] = None
+
+# -----------------------------------------------
+# table update (from the last snapshot)
 # -----------------------------------------------
 def updatePilotTable():   
 
-    # first destroy
-    widgets['panel']['pilot'].destroy()
+    tab = widgets['table']
+    order = PilotsView['order']
+    total = len(order)
+    nvis = tab['nvis']
+    
+    first = min(tab['first'], total-nvis)
+    first = max(first, 0)
+    tab['first'] = first
+    
+    tab['rowOf'] = {}
+    for i in range(len(tab['slots'])):
+        slot = tab['slots'][i]
+        if i < nvis and first+i < total:
+            p = order[first+i]
+            fillSlot(slot, p)
+            tab['rowOf'][p] = slot
+        else:
+            hideSlot(slot)
     
-    # rebuild
-    createPilotTable(widgets['canvas'])
+    if total:
+        tab['sb'].set(first/total, min(1, (first+nvis)/total))
+    else:
+        tab['sb'].set(0, 1)
+    widgets['dateLabel'].configure(text=PilotsView['time'])
 
 
 # -----------------------------------------------
@@ -1023,50 +461,49 @@ def updatePilotTable():
 # -----------------------------------------------
 def refreshPilotLine(p):   
     
-    elem=PilotsStatus[p]
-    widgets['pilotStat'][p].sv.set(elem['STtext'])             # change the content of this widget
-    widgets['pilotStat'][p].entry.configure(bg=elem['STcolor'])   # change the color of this widget
-    widgets['pilotRTim'][p].sv.set(elem['DTlog'])
-    widgets['pilotRTim'][p].entry.configure(bg=elem['DTcolor'])
-    widgets['pilotAlt'][p].sv.set(elem['last_alt'])
-    widgets['pilotHs'][p].sv.set(elem['last_h_speed'])
-    widgets['pilotStep'][p].sv.set(elem['last_dist'])
-    widgets['pilotDist'][p].sv.set(elem['d2atter'])
-
-
-# # -----------------------------------------------
-# # table update
-# # -----------------------------------------------
-# def updatePilotTable():   
-#     
-#     global PilotsStatus
-#     
-#     horl = datetime.now()
-#     dt_string = horl.strftime("%H:%M:%S")
-#     widgets['dateLabel'].configure(text=dt_string)
-# 
-#     for p in PilotsStatus:
-#         elem=PilotsStatus[p]
-#         
-#         if p in widgets['pilotStat']:
-#             # update existing line in the table
-#             widgets['pilotStat'][p].sv.set(elem['STtext'])             # change the content of this widget
-#             widgets['pilotStat'][p].entry.configure(bg=elem['STcolor'])   # change the color of this widget
-#             widgets['pilotRTim'][p].sv.set(elem['DTlog'])
-#             widgets['pilotRTim'][p].entry.configure(bg=elem['DTcolor'])
-#             widgets['pilotAlt'][p].sv.set(elem['last_alt'])
-#             widgets['pilotHs'][p].sv.set(elem['last_h_speed'])
-#             widgets['pilotStep'][p].sv.set(elem['last_dist'])
-#             widgets['pilotDist'][p].sv.set(elem['d2atter'])
-#         else:   
-#             # add a new line in the table
-#             rownbr = widgets['panel']['rownb']+1
-#             widgets['panel']['rownb'] = rownbr
-#             addLineInTable(rownbr, p, elem)
-# 
-#     maxscroll=widgets['panel']['rownb']*30
-#     widgets['canvas'].configure(scrollregion=(0, 0, 600, maxscroll))
-        
+    tab = widgets['table']
+    if p in tab['rowOf']:
+        fillSlot(tab['rowOf'][p], p)
+
+
+# -----------------------------------------------
+# window resized: adapt the number of visible lines
+# -----------------------------------------------
+def resizePilotTable(event):   
+
+    tab = widgets['table']
+    rowH = max(tab['rowH'], 1)
+    nvis = max(1, int(event.height/rowH) - 1)       # minus header line
+    if nvis == tab['nvis']: return()
+    ensureSlots(nvis)
+    tab['nvis'] = nvis
+    updatePilotTable()
+
+# -----------------------------------------------
+# scrollbar callback ('moveto' x / 'scroll' n units|pages)
+# -----------------------------------------------
+def scrollPilotTable(*args):   
+
+    tab = widgets['table']
+    total = len(PilotsView['order'])
+    if args[0] == 'moveto':
+        first = int(float(args[1])*total)
+    else:
+        step = int(args[1])
+        if args[2] == 'pages': step = step*tab['nvis']
+        first = tab['first']+step
+    tab['first'] = max(first, 0)
+    updatePilotTable()
+
+# -----------------------------------------------
+# mouse wheel on the table
+# -----------------------------------------------
+def bindWheel(w):   
+
+    w.bind('<Button-4>', lambda e: scrollPilotTable('scroll', -3, 'units'))
+    w.bind('<Button-5>', lambda e: scrollPilotTable('scroll', 3, 'units'))
+    w.bind('<MouseWheel>', lambda e: scrollPilotTable('scroll', -3 if e.delta > 0 else 3, 'units'))
+
 # ------------------------------------------------------------------------------
 # OPTIONS PANEL
 # ------------------------------------------------------------------------------
@@ -1075,7 +512,7 @@ def refreshPilotLine(p):
 # -----------------------------------------------
 def createParametersPanel(nb):   
     
-    global FILES, config
+    FILES = engine.FILES
     
     frame=ttk.Frame(nb)
     frame.pack()
@@ -1161,7 +598,7 @@ def createParametersPanel(nb):
 # -----------------------------------------------
 def createParamsTable(parent):
     
-    global config
+    config = engine.config
     
     # store this object for future destroy/refresh
     widgets['paramsparentframe']=parent
@@ -1253,7 +690,7 @@ def updSpotEntry(W):
 # -----------------------------------------------
 def saveSpot():
     
-    global config
+    config = engine.config
     
     userInput = simpledialog.askstring(title="Renommer ce spot",
                 prompt="Nom du spot:")
@@ -1274,7 +711,7 @@ def saveSpot():
 # -----------------------------------------------
 def selectFile():
 
-    global FILES
+    FILES = engine.FILES
     
     ret = filedialog.askopenfilename()
     if len(ret):
@@ -1287,74 +724,11 @@ def selectFile():
 # -----------------------------------------------
 def editFile():
 
-    global FILES
+    FILES = engine.FILES
     
     command = getParam('Editeur') + ' ' + FILES['pilotsFilter']
     os.system(command)
 
-
-# -----------------------------------------------
-# utility for drop down list
-# -----------------------------------------------
-def getSpotList():
-    
-    global config
-    
-    outlist = []
-    for elem in config['spots']:
-        outlist.append(elem)
-    return(outlist)
-
-# -----------------------------------------------
-# return coord (lat lon alt) of a spot
-# -----------------------------------------------
-def getCoord(spot):
-    
-    global config
-    
-    if spot in config['spots']:
-        return(config['spots'][spot])
-    else:
-        return()
-
-
-# -----------------------------------------------
-# manage log messages
-# -----------------------------------------------
-def printlog(mess):
-
-    global FILES
-    print(mess,file=FILES['logFD'], flush=True)
-    print(mess, flush=True)
-    
-    
-# -----------------------------------------------
-# initiate working dirs
-# -----------------------------------------------
-def initDirs():
-    
-    global FILES
-    
-    toolHomeDir = os.environ['HOME'] + "/.config/tracker"
-    logFile     = toolHomeDir + "/tracker.log"
-    FILES = {}
-    FILES['config']  = toolHomeDir + "/tracker.config"
-    FILES['pilotsStatus'] = toolHomeDir + "/tracker.pilots"
-    FILES['pilotsFilter'] = "select a file"
-
-    # toolHomeDir
-    if not os.path.isdir(toolHomeDir):
-        print("toolHomeDir does not exist, creating : "+toolHomeDir)
-        try: os.makedirs(toolHomeDir)
-        except: 
-            print("Cannot write to "+toolHomeDir)
-            exit(1)
-    else: print("toolHomeDir : "+toolHomeDir)
-
-    FILES['logFD'] = open(logFile,'w')
-
-
-
 # -----------------------------------------------
 # -----------------------------------------------
 # def getgeom(W):
@@ -1364,13 +738,8 @@ def initDirs():
 #     printlog("The height of Tkinter window:", root.winfo_height())     
 #     printlog("Screen")
 #     printlog("The width of Tkinter window:", root.winfo_screenwidth())
-#     printlog("The height of Tkinter window:", root.winfo_screenheight())     
+#     printlog("The height of Tkinter window:", root.winfo_screenheight())
 
-
-
-
-
-    
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # -----------------------------
@@ -1378,14 +747,8 @@ def initDirs():
 # -----------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
-# def
-execpath=os.path.dirname(sys.argv[0])
-
-# init
-initDirs()
-
-dt_string = datetime.now().strftime("%H:%M:%S")
-printlog('='*80+'\nStarting '+dt_string)
+# init (dirs, log, config)
+engine.initEngine()
 
 geometry = "1400x700"
 root = tk.Tk()
@@ -1413,23 +776,18 @@ optionsDescr = {'font': font_def, 'bd': 1, 'relief': 'groove', 'anchor': 'w' }
 # Panels creation
 # -----------------------------------------------
 widgets = {} 
-widgets['pilotStat']= {}       # status widgets
-widgets['pilotRTim']= {}       # refresh date widgets
-widgets['pilotAlt'] = {} 
-widgets['pilotHs']  = {} 
-widgets['pilotStep']= {} 
-widgets['pilotDist']= {}
-widgets['panel']    = {} 
+widgets['table']    = {}       # virtualized pilot table (slots)
 widgets['dateLabel'] = {} 
+widgets['statusStrip'] = {} 
 # widgets['saveButtonParam'] = {} 
 widgets['paramTab'] = {}
 widgets['filesel'] = {}
 widgets['strvar'] = {}
-widgets['canvas'] = {}
-
-loadConfig()
 
-session = HTMLSession()
+# GUI side of the engine worker
+PilotsView   = engine.makeSnapshot()  # last snapshot rendered by the GUI
+snapQueue    = queue.Queue()          # worker -> GUI messages
+GUI_POLL_MS  = 200
 
 createParametersPanel(nb)
 
@@ -0,0 +1,316 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# webapi.py
+# read-only HTTP/JSON API and live dashboard of the pilot table (default
+# group), served by the engine (WebPort parameter) to the field LAN:
+#
+#   GET /                 dashboard page (phones: retrieve drivers, marshals)
+#   GET /api/pilots       pilot table { "version", "order", "pilots" }
+#                         (ETag, If-None-Match: 304 when unchanged)
+#   GET /api/pilots/NAME  one pilot (ETag, If-None-Match)
+#   GET /api/events       Server-Sent Events:
+#                           snapshot : whole table (at connection, or when
+#                                      the client is too far behind)
+#                           diff     : pilots changed, pilots removed, new
+#                                      order (if changed)
+#                           tick     : engine time of a cycle without changes
+#                         event ids are versions (Last-Event-ID: resumes)
+#
+# A pilot: its saved fields (pilot.FIELDS), 'status' (GROUND, FLYING, ALERT,
+# SAFE) and 'late'; the log delay is computed by the client from 'now'.
+# Fed by engine.makeSnapshot: only the pilots of the dirty set are encoded
+# again, one encoding for all the clients (no request to the FFVL API).
+#      curl -H 'If-None-Match: "12"' http://HOST:8080/api/pilots
+#
+# Author: Pascal Caunegre
+# Licence: CC-BY-NC-SA
+# ------------------------------------------------------------------------------
+
+import json
+import threading
+from collections import deque
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pilot
+
+KEEPALIVE  = 15             # seconds between SSE keep-alive comments
+MAXCLIENTS = 64             # SSE connections at once
+EVENTS     = 256            # diffs kept for the clients behind
+
+
+# JSON text of a pilot record
+def pilotJson(rec):
+    d = {}
+    for k in pilot.FIELDS:
+        d[k] = getattr(rec, k)
+    d['status'] = rec.status.name
+    d['late'] = rec.late
+    return(json.dumps(d, separators=(',', ':'), default=plain))
+
+# numpy scalars (kinematics.py) as Python values
+def plain(v):
+    if hasattr(v, 'item'): return(v.item())
+    raise TypeError(repr(v))
+
+
+# ------------------------------------------------------------------------------
+# HTTP requests
+# ------------------------------------------------------------------------------
+class WebHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        srv = self.server
+        if path in ('/', '/index.html'):
+            self.reply(200, DASHBOARD.encode(), 'text/html; charset=utf-8')
+        elif path == '/api/pilots':
+            (etag, body) = srv.table()
+            self.replyJson(etag, body)
+        elif path.startswith('/api/pilots/'):
+            (etag, body) = srv.one(unquote(path[len('/api/pilots/'):]))
+            if body is None:
+                self.send_error(404)
+                return
+            self.replyJson(etag, body)
+        elif path == '/api/events':
+            self.events()
+        else:
+            self.send_error(404)
+
+    def replyJson(self, etag, body):
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.reply(200, body, 'application/json', etag)
+
+    def reply(self, code, body, ctype, etag=None):
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        if etag: self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # --------------------------------------------------------------------------
+    # Server-Sent Events stream (one thread per client)
+    # --------------------------------------------------------------------------
+    def events(self):
+        srv = self.server
+        if not srv.enter():
+            self.send_error(503, "too many clients")
+            return
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            seen = self.headers.get('Last-Event-ID')
+            seen = int(seen) if seen and seen.isdigit() else None
+            ticks = None
+            while True:
+                (out, seen, ticks) = srv.next(seen, ticks)
+                if out is None: break
+                self.wfile.write(out)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            srv.leave()
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+# ------------------------------------------------------------------------------
+# server: last state of the table, encoded, and the recent diffs
+# addr: (address, port)
+# ------------------------------------------------------------------------------
+class WebServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr=('0.0.0.0', 8080)):
+        ThreadingHTTPServer.__init__(self, addr, WebHandler)
+        self.cond = threading.Condition()
+        self.version = 0            # version of the table (changes only)
+        self.ticks = 0              # snapshots received
+        self.now = 0                # engine time of the last snapshot
+        self.records = {}           # pseudo -> (record, JSON text, version)
+        self.order = ()
+        self.body = None            # /api/pilots of the version (made on demand)
+        self.diffs = deque(maxlen=EVENTS)    # (version, SSE event)
+        self.clients = 0
+        self.closing = False
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="tracker-web", daemon=True).start()
+        return("http://%s:%d/" % self.server_address[:2])
+
+    def stop(self):
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        self.shutdown()
+        self.server_close()
+
+    # --------------------------------------------------------------------------
+    # new snapshot (engine.makeSnapshot, stateLock held: dirty pilots only)
+    # --------------------------------------------------------------------------
+    def publish(self, snap):
+        pilots = snap['pilots']
+        dirty = snap['dirty']
+        with self.cond:
+            full = dirty is None or self.ticks == 0
+            if full:
+                changed = [p for p in pilots if p not in self.records or self.records[p][0] is not pilots[p]]
+                removed = [p for p in self.records if p not in pilots]
+            else:
+                changed = [p for p in dirty if p in pilots]
+                removed = [p for p in dirty if p not in pilots and p in self.records]
+            order = snap['order']
+            neworder = order is not self.order and order != self.order
+            self.ticks += 1
+            self.now = snap['now']
+            if changed or removed or neworder:
+                self.version += 1
+                for p in changed:
+                    self.records[p] = (pilots[p], pilotJson(pilots[p]), self.version)
+                for p in removed:
+                    del self.records[p]
+                self.order = order
+                self.body = None
+                if full:
+                    self.diffs.clear()
+                else:
+                    data = '{"version":%d,"now":%d,"pilots":{%s},"removed":%s' % (self.version, self.now, \
+                        ",".join(json.dumps(p)+":"+self.records[p][1] for p in changed), json.dumps(removed))
+                    if neworder: data += ',"order":' + json.dumps(order)
+                    self.diffs.append((self.version, event('diff', data+'}', self.version)))
+            self.cond.notify_all()
+
+    # /api/pilots: (ETag, body)
+    def table(self):
+        with self.cond:
+            if self.body is None:
+                self.body = ('{"version":%d,"order":%s,"pilots":{%s}}' % (self.version, json.dumps(self.order), \
+                    ",".join(json.dumps(p)+":"+r[1] for (p, r) in self.records.items()))).encode()
+            return(('"%d"' % self.version, self.body))
+
+    # /api/pilots/NAME: (ETag, body), body None if unknown
+    def one(self, p):
+        with self.cond:
+            if p not in self.records: return((None, None))
+            (rec, text, version) = self.records[p]
+            return(('"%d"' % version, text.encode()))
+
+    # --------------------------------------------------------------------------
+    # next events of an SSE client, waiting for them
+    # seen : last version sent (None: nothing yet), ticks: last tick sent
+    # returns (events, seen, ticks), events None when the server stops
+    # --------------------------------------------------------------------------
+    def next(self, seen, ticks):
+        with self.cond:
+            if ticks is not None:
+                self.cond.wait_for(lambda: self.ticks != ticks or self.closing, KEEPALIVE)
+            if self.closing: return((None, seen, ticks))
+            if self.ticks == ticks:
+                return((b": keepalive\n\n", seen, ticks))
+            out = []
+            if seen != self.version:
+                first = self.diffs[0][0] if self.diffs else None
+                if seen is None or first is None or seen < first-1 or seen > self.version:
+                    # first events, or too far behind: the whole table
+                    (etag, body) = self.table()
+                    data = '{"now":%d,' % self.now + body.decode()[1:]
+                    out.append(event('snapshot', data, self.version))
+                else:
+                    out.extend(ev for (v, ev) in self.diffs if v > seen)
+            else:
+                out.append(event('tick', '{"now":%d}' % self.now))
+            return((b"".join(out), self.version, self.ticks))
+
+    def enter(self):
+        with self.cond:
+            if self.clients >= MAXCLIENTS or self.closing: return(False)
+            self.clients += 1
+            return(True)
+
+    def leave(self):
+        with self.cond:
+            self.clients -= 1
+
+# SSE event (data on one line)
+def event(kind, data, id=None):
+    out = "event: %s\n" % kind
+    if id is not None: out += "id: %d\n" % id
+    return((out + "data: " + data + "\n\n").encode())
+
+
+# ------------------------------------------------------------------------------
+# dashboard (one page, no external resources)
+# ------------------------------------------------------------------------------
+DASHBOARD = """<!DOCTYPE html>
+<html lang="fr"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>tracker</title>
+<style>
+body { font-family: sans-serif; margin: 0.5em; }
+table { border-collapse: collapse; width: 100%; font-size: 0.9em; }
+th, td { border: 1px solid #ccc; padding: 0.2em 0.4em; text-align: left; }
+.ALERT { background: red; color: white; font-weight: bold; }
+.FLYING { background: #7c7; }
+.late { background: yellow; }
+#state { color: gray; }
+</style></head><body>
+<div>tracker <span id="time"></span> <span id="state">connexion...</span></div>
+<table><thead><tr><th>Pseudo</th><th>Prenom</th><th>Nom</th><th>Alti</th><th>Dist (km)</th>
+<th>Status</th><th>Dernier log</th><th>Loc</th></tr></thead><tbody id="rows"></tbody></table>
+<script>
+var pilots = {}, order = [], now = 0;
+var SHOWN = { GROUND: '-', FLYING: 'En vol', ALERT: 'ALERT', SAFE: 'Safe' };
+function cell(text, cls) {
+  var td = document.createElement('td');
+  td.textContent = (text === null || text === undefined) ? '-' : text;
+  if (cls) td.className = cls;
+  return td;
+}
+function render() {
+  var body = document.createElement('tbody');
+  body.id = 'rows';
+  order.forEach(function (p) {
+    var r = pilots[p];
+    if (!r) return;
+    var tr = document.createElement('tr');
+    [p, r.name, r.surname, r.alt, r.d2atter].forEach(function (v) { tr.appendChild(cell(v)); });
+    tr.appendChild(cell(SHOWN[r.status], r.status));
+    tr.appendChild(cell(now - r.postime, r.late ? 'late' : ''));
+    var td = document.createElement('td'), a = document.createElement('a');
+    a.href = 'https://www.spotair.mobi/?lat=' + r.lat + '&lng=' + r.lon + '&zoom=15&layers=ltffvl';
+    a.target = '_blank'; a.textContent = 'Voir';
+    td.appendChild(a); tr.appendChild(td);
+    body.appendChild(tr);
+  });
+  document.getElementById('rows').replaceWith(body);
+  document.getElementById('time').textContent = new Date(now * 1000).toLocaleTimeString();
+}
+var es = new EventSource('api/events');
+es.addEventListener('snapshot', function (e) {
+  var d = JSON.parse(e.data);
+  pilots = d.pilots; order = d.order; now = d.now; render();
+});
+es.addEventListener('diff', function (e) {
+  var d = JSON.parse(e.data);
+  for (var p in d.pilots) pilots[p] = d.pilots[p];
+  d.removed.forEach(function (p) { delete pilots[p]; });
+  if (d.order) order = d.order;
+  now = d.now; render();
+});
+es.addEventListener('tick', function (e) { now = JSON.parse(e.data).now; render(); });
+es.onopen = function () { document.getElementById('state').textContent = ''; };
+es.onerror = function () { document.getElementById('state').textContent = 'deconnecte'; };
+</script></body></html>
+"""